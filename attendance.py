@@ -1,11 +1,51 @@
 from flask import Blueprint, request, jsonify, current_app
-from src.models.user import db, User, Child, Attendance
+from src.models.user import db, User, Child, Attendance, ChildPresence, AttendanceDailyRollup, DailyUpdate, local_day, local_today
 from src.routes.auth import token_required, admin_required
-from datetime import datetime, date
-from sqlalchemy import and_, func
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy import and_, func, case
+from sqlalchemy.exc import IntegrityError
+from collections import defaultdict
+from src.utils.pagination import get_page_args, paginate, InvalidCursor
+from src.utils.serialization import RowSerializer, prefixed, json_response
+from src.utils.outbox import enqueue_notification
+from src.utils.live_events import publish_event, latest_event_id
+from src.utils.child_index import qr_index
+from src.utils import attendance_analytics
+import bisect
+import click
 
 attendance_bp = Blueprint('attendance', __name__)
 
+BATCH_SCAN_LIMIT = 500
+MAX_HISTORY_DAYS = 731
+# أقصى فرق مسموح بين وقت المسح في الجهاز ووقت الخادم
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def announce_attendance(child, attendance):
+    """نشر حدث مباشر وإشعار لولي الأمر، يحفظان مع نفس المعاملة"""
+    publish_event(attendance.status, child, {
+        'child_id': child.id,
+        'child_name': child.name,
+        'current_status': 'present' if attendance.status == 'check_in' else 'absent',
+        'last_action_time': attendance.timestamp.isoformat(),
+        'attendance': attendance.to_dict()
+    })
+    
+    # إشعار ولي الأمر يرسله عامل الإشعارات
+    enqueue_notification(child.parent_id, child.id, 'attendance', {
+        'attendance_id': attendance.id,
+        'child_name': child.name,
+        'status': attendance.status,
+        'timestamp': attendance.timestamp.isoformat()
+    })
+
+def parse_scan_timestamp(value):
+    """وقت المسح من الجهاز بصيغة ISO، ويحول إلى UTC بدون منطقة زمنية مثل بقية السجلات"""
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
 @attendance_bp.route('/scan-qr', methods=['POST'])
 @token_required
 def scan_qr_code(current_user):
@@ -21,23 +61,19 @@ def scan_qr_code(current_user):
         if not qr_code:
             return jsonify({'message': 'QR code is required'}), 400
         
-        # البحث عن الطفل بواسطة QR Code
-        child = Child.query.filter_by(qr_code=qr_code, is_approved=True, is_active=True).first()
+        # البحث عن الطفل بواسطة QR Code من الفهرس في الذاكرة (الرمز غير الصالح يرفض دون استعلام،
+        # والموجود يؤكد باستعلام بالمفتاح الأساسي)
+        child = qr_index.lookup(qr_code)
         
         if not child:
             return jsonify({'message': 'Invalid QR code or child not approved'}), 404
         
         # التحقق من آخر حالة حضور للطفل اليوم
-        today = date.today()
-        last_attendance = Attendance.query.filter(
-            and_(
-                Attendance.child_id == child.id,
-                func.date(Attendance.timestamp) == today
-            )
-        ).order_by(Attendance.timestamp.desc()).first()
+        today = local_today()
+        presence = ChildPresence.query.get(child.id)
         
         # تحديد نوع العملية (دخول أم خروج)
-        if not last_attendance or last_attendance.status == 'check_out':
+        if not presence or presence.current_status(today) == 'absent':
             # الطفل غير موجود أو خرج، فهذا دخول
             status = 'check_in'
             message = f'{child.name} تم تسجيل دخوله بنجاح'
@@ -55,9 +91,23 @@ def scan_qr_code(current_user):
         )
         
         db.session.add(attendance)
-        db.session.commit()
+        db.session.flush()
         
-        # إرسال إشعار لولي الأمر (TODO: تنفيذ الإشعارات)
+        # أول دخول للطفل اليوم يزيد عدد الحاضرين في الملخص اليومي
+        first_check_in = status == 'check_in' and (not presence or presence.day != today)
+        
+        # عدد المسجلين يحسب عند أول مسح في اليوم فقط، ويتجاهل إذا سبقنا مسح متزامن بإنشاء الملخص
+        total_enrolled = 0
+        if not db.session.query(AttendanceDailyRollup.day).filter(AttendanceDailyRollup.day == attendance.day).first():
+            total_enrolled = Child.query.filter(Child.roster_filter()).count()
+        AttendanceDailyRollup.record(attendance, first_check_in, total_enrolled)
+        
+        # تحديث حالة الطفل في نفس المعاملة
+        ChildPresence.record(attendance)
+        
+        announce_attendance(child, attendance)
+        
+        db.session.commit()
         
         return jsonify({
             'message': message,
@@ -70,6 +120,153 @@ def scan_qr_code(current_user):
         db.session.rollback()
         return jsonify({'message': f'Failed to process QR scan: {str(e)}'}), 500
 
+@attendance_bp.route('/scan-qr/batch', methods=['POST'])
+@token_required
+def scan_qr_code_batch(current_user):
+    """رفع عمليات مسح مخزنة في جهاز غير متصل دفعة واحدة (الموظفين فقط)"""
+    try:
+        if current_user.role not in ['staff', 'admin']:
+            return jsonify({'message': 'Only staff can scan QR codes'}), 403
+        
+        data = request.get_json() or {}
+        scans = data.get('scans')
+        
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'message': 'scans list is required'}), 400
+        
+        if len(scans) > BATCH_SCAN_LIMIT:
+            return jsonify({'message': f'At most {BATCH_SCAN_LIMIT} scans per batch'}), 400
+        
+        # التحقق من كل عملية مسح، والنتائج بنفس ترتيب الطلب
+        results = [None] * len(scans)
+        valid = []
+        latest_allowed = datetime.utcnow() + MAX_CLOCK_SKEW
+        for index, scan in enumerate(scans):
+            key = scan.get('idempotency_key') if isinstance(scan, dict) else None
+            qr_code = scan.get('qr_code') if isinstance(scan, dict) else None
+            # الأنواع تتحقق هنا قبل استخدامها مفاتيح في الفهرس والاستعلام
+            if not isinstance(key, str) or not key or len(key) > 64 or not isinstance(qr_code, str) or not qr_code:
+                results[index] = {'idempotency_key': key if isinstance(key, str) else None, 'result': 'invalid',
+                                  'message': 'idempotency_key and qr_code are required strings'}
+                continue
+            try:
+                timestamp = parse_scan_timestamp(scan['timestamp'])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                results[index] = {'idempotency_key': key, 'result': 'invalid', 'message': 'Invalid timestamp'}
+                continue
+            if timestamp > latest_allowed:
+                results[index] = {'idempotency_key': key, 'result': 'invalid', 'message': 'Timestamp is in the future'}
+                continue
+            valid.append((timestamp, index, key, scan))
+        
+        # المفاتيح المسجلة سابقاً (إعادة إرسال) في استعلام واحد
+        keys = {key for _, _, key, _ in valid}
+        recorded = dict(db.session.query(Attendance.idempotency_key, Attendance.id).filter(
+            Attendance.idempotency_key.in_(keys)
+        ).all()) if keys else {}
+        
+        # جميع الأطفال من الفهرس في الذاكرة، مؤكدين باستعلام واحد
+        children = qr_index.lookup_many(scan['qr_code'] for _, _, _, scan in valid)
+        
+        pending = []
+        seen_keys = set()
+        for timestamp, index, key, scan in valid:
+            if key in recorded or key in seen_keys:
+                results[index] = {'idempotency_key': key, 'result': 'duplicate', 'attendance_id': recorded.get(key)}
+                continue
+            seen_keys.add(key)
+            child = children.get(scan['qr_code'])
+            if not child:
+                results[index] = {'idempotency_key': key, 'result': 'invalid_qr', 'message': 'Invalid QR code or child not approved'}
+                continue
+            pending.append((timestamp, index, key, scan, child))
+        
+        if pending:
+            # السجلات الموجودة لنفس الأطفال والأيام لتحديد تسلسل الدخول والخروج
+            child_ids = {child.id for *_, child in pending}
+            days = {local_day(timestamp) for timestamp, *_ in pending}
+            timelines = defaultdict(list)
+            for child_id, day, timestamp, status in db.session.query(
+                Attendance.child_id, Attendance.day, Attendance.timestamp, Attendance.status
+            ).filter(Attendance.child_id.in_(child_ids), Attendance.day.in_(days)).all():
+                timelines[(child_id, day)].append((timestamp, status))
+            for timeline in timelines.values():
+                timeline.sort()
+            checked_in_days = {key for key, timeline in timelines.items()
+                               if any(status == 'check_in' for _, status in timeline)}
+            
+            new_records = []
+            for timestamp, index, key, scan, child in sorted(pending, key=lambda item: (item[0], item[1])):
+                day = local_day(timestamp)
+                timeline = timelines[(child.id, day)]
+                # الحالة حسب آخر عملية قبل وقت هذا المسح في نفس اليوم
+                position = bisect.bisect_right(timeline, (timestamp, '\uffff'))
+                previous = timeline[position - 1][1] if position else None
+                status = 'check_out' if previous == 'check_in' else 'check_in'
+                timeline.insert(position, (timestamp, status))
+                
+                # أول دخول للطفل في اليوم يزيد عدد الحاضرين
+                first_check_in = status == 'check_in' and (child.id, day) not in checked_in_days
+                if first_check_in:
+                    checked_in_days.add((child.id, day))
+                
+                attendance = Attendance(
+                    child_id=child.id,
+                    staff_id=current_user.id,
+                    status=status,
+                    timestamp=timestamp,
+                    day=day,
+                    notes=scan.get('notes'),
+                    idempotency_key=key
+                )
+                new_records.append((index, key, child, attendance, first_check_in))
+            
+            db.session.add_all(attendance for _, _, _, attendance, _ in new_records)
+            db.session.flush()
+            
+            # عدد المسجلين لأيام ليس لها ملخص بعد (يتجاهل إذا سبقنا مسح متزامن بإنشائه)
+            total_enrolled = 0
+            existing_days = {day for (day,) in db.session.query(AttendanceDailyRollup.day).filter(
+                AttendanceDailyRollup.day.in_(days)
+            ).all()}
+            if days - existing_days:
+                total_enrolled = Child.query.filter(Child.roster_filter()).count()
+            
+            # نفس أوامر upsert في المسح المباشر، فلا تتعارض الدفعة مع مسح متزامن لنفس الطفل أو اليوم
+            for index, key, child, attendance, first_check_in in new_records:
+                AttendanceDailyRollup.record(attendance, first_check_in, total_enrolled)
+                # المسح المتأخر (أقدم من آخر عملية معروفة) لا يغير الحالة الحالية
+                ChildPresence.record(attendance, only_if_newer=True)
+                
+                announce_attendance(child, attendance)
+                results[index] = {
+                    'idempotency_key': key,
+                    'result': 'recorded',
+                    'attendance_id': attendance.id,
+                    'status': attendance.status,
+                    'child_id': child.id
+                }
+        
+        db.session.commit()
+        
+        summary = defaultdict(int)
+        for result in results:
+            summary[result['result']] += 1
+        
+        return jsonify({
+            'message': f'{summary["recorded"]} scans recorded',
+            'summary': dict(summary),
+            'results': results
+        }), 200
+        
+    except IntegrityError:
+        # نفس الدفعة أرسلت بالتوازي، إعادة المحاولة ستعيد duplicate لما سجل
+        db.session.rollback()
+        return jsonify({'message': 'Batch conflicts with a concurrent upload, please retry'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Failed to process scan batch: {str(e)}'}), 500
+
 @attendance_bp.route('/child/<int:child_id>/today', methods=['GET'])
 @token_required
 def get_child_attendance_today(current_user, child_id):
@@ -85,11 +282,11 @@ def get_child_attendance_today(current_user, child_id):
             return jsonify({'message': 'Access denied'}), 403
         
         # الحصول على حضور اليوم
-        today = date.today()
+        today = local_today()
         attendance_records = Attendance.query.filter(
             and_(
                 Attendance.child_id == child_id,
-                func.date(Attendance.timestamp) == today
+                Attendance.day == today
             )
         ).order_by(Attendance.timestamp.asc()).all()
         
@@ -116,31 +313,40 @@ def get_today_attendance(current_user):
         if current_user.role not in ['staff', 'admin']:
             return jsonify({'message': 'Access denied'}), 403
         
-        today = date.today()
-        
-        # الحصول على جميع الأطفال المعتمدين
-        children = Child.query.filter_by(is_approved=True, is_active=True).all()
+        today = local_today()
+        # مؤشر الأحداث قبل اللقطة، ليكمل العميل من /api/events/stream دون فقد أي تغيير
+        events_cursor = latest_event_id()
+        
+        # الحصول على جميع الأطفال المعتمدين مع أولياء أمورهم وحالتهم الحالية في استعلام واحد
+        # مع قراءة الأعمدة المطلوبة فقط بدلاً من كائنات ORM
+        child_row = RowSerializer(Child.dict_columns())
+        parent_row = RowSerializer(User.dict_columns())
+        presence_start = child_row.width + parent_row.width
+        
+        rows = db.session.query(
+            *Child.dict_columns(),
+            *prefixed(User.dict_columns(), 'parent_'),
+            ChildPresence.status,
+            ChildPresence.day,
+            ChildPresence.last_action_time
+        ).join(User, Child.parent_id == User.id)\
+            .outerjoin(ChildPresence, ChildPresence.child_id == Child.id)\
+            .filter(Child.roster_filter())\
+            .order_by(Child.id).all()
         
         attendance_summary = []
         
-        for child in children:
-            # الحصول على آخر سجل حضور لهذا الطفل اليوم
-            last_attendance = Attendance.query.filter(
-                and_(
-                    Attendance.child_id == child.id,
-                    func.date(Attendance.timestamp) == today
-                )
-            ).order_by(Attendance.timestamp.desc()).first()
-            
+        for row in rows:
+            presence_status, presence_day, presence_time = row[presence_start:]
             status = 'absent'
             last_action_time = None
             
-            if last_attendance:
-                status = 'present' if last_attendance.status == 'check_in' else 'absent'
-                last_action_time = last_attendance.timestamp.isoformat()
+            if presence_day == today:
+                status = 'present' if presence_status == 'check_in' else 'absent'
+                last_action_time = presence_time.isoformat()
             
-            child_data = child.to_dict()
-            child_data['parent'] = child.parent.to_dict()
+            child_data = child_row(row[:child_row.width])
+            child_data['parent'] = parent_row(row[child_row.width:presence_start])
             child_data['current_status'] = status
             child_data['last_action_time'] = last_action_time
             
@@ -150,14 +356,15 @@ def get_today_attendance(current_user):
         present_count = sum(1 for child in attendance_summary if child['current_status'] == 'present')
         absent_count = len(attendance_summary) - present_count
         
-        return jsonify({
+        return json_response({
             'date': today.isoformat(),
             'summary': {
                 'total_children': len(attendance_summary),
                 'present': present_count,
                 'absent': absent_count
             },
-            'children': attendance_summary
+            'children': attendance_summary,
+            'events_cursor': events_cursor
         }), 200
         
     except Exception as e:
@@ -177,42 +384,75 @@ def get_child_attendance_history(current_user, child_id):
         if current_user.role == 'parent' and child.parent_id != current_user.id:
             return jsonify({'message': 'Access denied'}), 403
         
-        # الحصول على معاملات الاستعلام
-        days = request.args.get('days', 30, type=int)  # آخر 30 يوم افتراضياً
-        
-        # الحصول على سجلات الحضور
-        attendance_records = Attendance.query.filter_by(child_id=child_id)\
-            .order_by(Attendance.timestamp.desc())\
-            .limit(days * 4).all()  # تقدير 4 سجلات كحد أقصى في اليوم
-        
-        # تجميع البيانات حسب التاريخ
-        daily_attendance = {}
-        
-        for record in attendance_records:
-            record_date = record.timestamp.date().isoformat()
-            
-            if record_date not in daily_attendance:
-                daily_attendance[record_date] = {
-                    'date': record_date,
-                    'records': [],
-                    'status': 'absent'
-                }
-            
-            daily_attendance[record_date]['records'].append(record.to_dict())
-            
-            # تحديد الحالة النهائية لليوم
-            if record.status == 'check_in':
-                daily_attendance[record_date]['status'] = 'present'
+        # نطاق التاريخ: from و to بصيغة YYYY-MM-DD، أو آخر days يوم (30 افتراضياً)
+        try:
+            end_date = date.fromisoformat(request.args['to']) if request.args.get('to') else local_today()
+            if request.args.get('from'):
+                start_date = date.fromisoformat(request.args['from'])
+            else:
+                days = request.args.get('days', 30, type=int)
+                start_date = end_date - timedelta(days=days - 1)
+        except ValueError:
+            return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        if start_date > end_date:
+            return jsonify({'message': 'from must not be after to'}), 400
+        if (end_date - start_date).days >= MAX_HISTORY_DAYS:
+            return jsonify({'message': f'Date range cannot exceed {MAX_HISTORY_DAYS} days'}), 400
+        
+        in_range = and_(
+            Attendance.child_id == child_id,
+            Attendance.day >= start_date,
+            Attendance.day <= end_date
+        )
         
-        # ترتيب البيانات حسب التاريخ
-        sorted_attendance = sorted(daily_attendance.values(), 
-                                 key=lambda x: x['date'], reverse=True)
+        # ملخص كل يوم في استعلام واحد مجمع بدلاً من تحميل السجلات
+        daily_rows = db.session.query(
+            Attendance.day,
+            func.count(Attendance.id),
+            func.sum(case((Attendance.status == 'check_in', 1), else_=0)),
+            func.min(case((Attendance.status == 'check_in', Attendance.timestamp))),
+            func.max(case((Attendance.status == 'check_out', Attendance.timestamp)))
+        ).filter(in_range).group_by(Attendance.day).order_by(Attendance.day.desc()).all()
+        
+        attendance_history = []
+        for day, scan_count, check_ins, first_check_in, last_check_out in daily_rows:
+            attendance_history.append({
+                'date': day.isoformat(),
+                'status': 'present' if check_ins else 'absent',
+                'first_check_in': first_check_in.isoformat() if first_check_in else None,
+                'last_check_out': last_check_out.isoformat() if last_check_out else None,
+                'scan_count': scan_count
+            })
         
-        return jsonify({
+        response = {
             'child': child.to_dict(),
-            'attendance_history': sorted_attendance
-        }), 200
+            'period': {
+                'from': start_date.isoformat(),
+                'to': end_date.isoformat(),
+                'days': (end_date - start_date).days + 1
+            },
+            'summary': {
+                'present_days': sum(1 for day in attendance_history if day['status'] == 'present'),
+                'total_scans': sum(day['scan_count'] for day in attendance_history)
+            },
+            'attendance_history': attendance_history
+        }
+        
+        # السجلات التفصيلية عند الطلب فقط، مرقمة بالصفحات
+        if request.args.get('include_records', 'false').lower() in ('1', 'true', 'yes'):
+            limit, cursor = get_page_args()
+            records, next_cursor = paginate(
+                Attendance.query.filter(in_range),
+                [Attendance.day, Attendance.timestamp, Attendance.id], cursor, limit, descending=True
+            )
+            response['records'] = [record.to_dict() for record in records]
+            response['next_cursor'] = next_cursor
+        
+        return jsonify(response), 200
         
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get attendance history: {str(e)}'}), 500
 
@@ -224,53 +464,247 @@ def get_attendance_stats(current_user):
     try:
         # الحصول على معاملات الاستعلام
         days = request.args.get('days', 7, type=int)  # آخر 7 أيام افتراضياً
+        granularity = request.args.get('granularity', 'day')  # day أو week أو month
+        
+        if days < 1:
+            return jsonify({'message': 'days must be a positive integer'}), 400
+        if granularity not in ['day', 'week', 'month']:
+            return jsonify({'message': 'granularity must be day, week or month'}), 400
         
         # حساب التواريخ
-        end_date = date.today()
+        end_date = local_today()
         start_date = date.fromordinal(end_date.toordinal() - days + 1)
         
         # الحصول على جميع الأطفال المعتمدين
-        total_children = Child.query.filter_by(is_approved=True, is_active=True).count()
+        total_children = Child.query.filter(Child.roster_filter()).count()
+        
+        # قراءة الملخصات اليومية المحسوبة مسبقاً في استعلام واحد
+        rollups = {
+            rollup.day: rollup
+            for rollup in AttendanceDailyRollup.query.filter(
+                AttendanceDailyRollup.day.between(start_date, end_date)
+            ).all()
+        }
         
         # إحصائيات يومية
         daily_stats = []
         
         for i in range(days):
             current_date = date.fromordinal(start_date.toordinal() + i)
+            rollup = rollups.get(current_date)
             
-            # عدد الأطفال الحاضرين في هذا اليوم
-            present_children = db.session.query(Attendance.child_id)\
-                .filter(
-                    and_(
-                        func.date(Attendance.timestamp) == current_date,
-                        Attendance.status == 'check_in'
-                    )
-                ).distinct().count()
+            # الأيام بدون أي مسح ليس لها ملخص
+            present_children = rollup.present_count if rollup else 0
+            enrolled = rollup.total_enrolled if rollup else total_children
             
             daily_stats.append({
                 'date': current_date.isoformat(),
-                'total_children': total_children,
+                'total_children': enrolled,
                 'present': present_children,
-                'absent': total_children - present_children,
-                'attendance_rate': round((present_children / total_children * 100) if total_children > 0 else 0, 2)
+                'absent': enrolled - present_children,
+                'attendance_rate': round((present_children / enrolled * 100) if enrolled > 0 else 0, 2)
             })
         
         # إحصائيات عامة
         avg_attendance_rate = sum(day['attendance_rate'] for day in daily_stats) / len(daily_stats) if daily_stats else 0
         
-        return jsonify({
+        response = {
             'period': {
                 'start_date': start_date.isoformat(),
                 'end_date': end_date.isoformat(),
-                'days': days
+                'days': days,
+                'granularity': granularity
             },
             'summary': {
                 'total_children': total_children,
                 'average_attendance_rate': round(avg_attendance_rate, 2)
+            }
+        }
+        
+        if granularity == 'day':
+            response['daily_stats'] = daily_stats
+        else:
+            response['period_stats'] = group_daily_stats(daily_stats, granularity)
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'message': f'Failed to get attendance stats: {str(e)}'}), 500
+
+def group_daily_stats(daily_stats, granularity):
+    """تجميع الإحصائيات اليومية حسب الأسبوع (يبدأ الاثنين) أو الشهر"""
+    buckets = {}
+    
+    for day in daily_stats:
+        current_date = date.fromisoformat(day['date'])
+        if granularity == 'week':
+            key = current_date - timedelta(days=current_date.weekday())
+        else:
+            key = current_date.replace(day=1)
+        
+        if key not in buckets:
+            buckets[key] = {
+                'start_date': day['date'],
+                'end_date': day['date'],
+                'days': 0,
+                'present_days': 0,
+                'peak_present': 0,
+                'rate_total': 0
+            }
+        
+        bucket = buckets[key]
+        bucket['end_date'] = day['date']
+        bucket['days'] += 1
+        bucket['present_days'] += day['present']
+        bucket['peak_present'] = max(bucket['peak_present'], day['present'])
+        bucket['rate_total'] += day['attendance_rate']
+    
+    period_stats = []
+    for key in sorted(buckets):
+        bucket = buckets[key]
+        period_stats.append({
+            'start_date': bucket['start_date'],
+            'end_date': bucket['end_date'],
+            'days': bucket['days'],
+            'present_days': bucket['present_days'],
+            'average_present': round(bucket['present_days'] / bucket['days'], 2),
+            'peak_present': bucket['peak_present'],
+            'average_attendance_rate': round(bucket['rate_total'] / bucket['days'], 2)
+        })
+    
+    return period_stats
+
+@attendance_bp.route('/analytics', methods=['GET'])
+@token_required
+@admin_required
+def get_attendance_analytics(current_user):
+    """ساعات الحضور لكل طفل ولكل أسبوع أو شهر وحالات التأخر في الاستلام (الإدارة فقط)"""
+    try:
+        if not attendance_analytics.available():
+            return jsonify({'message': 'Attendance analytics require NumPy to be installed'}), 501
+        
+        try:
+            end_date = date.fromisoformat(request.args['to']) if request.args.get('to') else local_today()
+            if request.args.get('from'):
+                start_date = date.fromisoformat(request.args['from'])
+            else:
+                start_date = end_date - timedelta(days=request.args.get('days', 30, type=int) - 1)
+        except ValueError:
+            return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        if start_date > end_date:
+            return jsonify({'message': 'from must not be after to'}), 400
+        if (end_date - start_date).days >= MAX_HISTORY_DAYS:
+            return jsonify({'message': f'Date range cannot exceed {MAX_HISTORY_DAYS} days'}), 400
+        
+        granularity = request.args.get('granularity', 'week')
+        if granularity not in ('week', 'month'):
+            return jsonify({'message': 'granularity must be week or month'}), 400
+        
+        late_after = request.args.get('late_after', attendance_analytics.LATE_PICKUP_TIME)
+        try:
+            datetime.strptime(late_after, '%H:%M')
+        except ValueError:
+            return jsonify({'message': 'late_after must be HH:MM'}), 400
+        
+        columns = attendance_analytics.load_attendance_columns(
+            start_date, end_date, request.args.get('child_id', type=int)
+        )
+        result = attendance_analytics.time_on_site(columns, granularity, late_after)
+        
+        # أسماء الأطفال في استعلام واحد
+        names = dict(db.session.query(Child.id, Child.name).filter(
+            Child.id.in_([child['child_id'] for child in result['children']])
+        ).all()) if result['children'] else {}
+        for child in result['children']:
+            child['child_name'] = names.get(child['child_id'])
+        
+        return json_response({
+            'period': {
+                'from': start_date.isoformat(),
+                'to': end_date.isoformat(),
+                'granularity': granularity,
+                'late_after': late_after
             },
-            'daily_stats': daily_stats
+            **result
         }), 200
         
     except Exception as e:
-        return jsonify({'message': f'Failed to get attendance stats: {str(e)}'}), 500
+        return jsonify({'message': f'Failed to get attendance analytics: {str(e)}'}), 500
+
+@attendance_bp.cli.command('rebuild-presence')
+def rebuild_presence():
+    """إعادة بناء جدول حالة الأطفال من سجل الحضور"""
+    latest = db.session.query(
+        Attendance.child_id,
+        func.max(Attendance.timestamp).label('timestamp')
+    ).group_by(Attendance.child_id).subquery()
+    
+    records = Attendance.query.join(
+        latest,
+        and_(
+            Attendance.child_id == latest.c.child_id,
+            Attendance.timestamp == latest.c.timestamp
+        )
+    ).order_by(Attendance.id.asc()).all()
+    
+    # عند تساوي الوقت يعتمد السجل الأحدث إدخالاً
+    last_by_child = {record.child_id: record for record in records}
+    
+    ChildPresence.query.delete()
+    for record in last_by_child.values():
+        presence = ChildPresence(child_id=record.child_id)
+        presence.apply(record)
+        db.session.add(presence)
+    
+    db.session.commit()
+    click.echo(f'Rebuilt presence for {len(last_by_child)} children')
 
+@attendance_bp.cli.command('backfill-rollups')
+@click.option('--days', default=365, help='Number of days to recompute, ending today')
+def backfill_rollups(days):
+    """إعادة حساب الملخصات اليومية من سجل الحضور"""
+    end_date = local_today()
+    start_date = date.fromordinal(end_date.toordinal() - days + 1)
+    
+    rows = db.session.query(
+        Attendance.day,
+        func.count(func.distinct(case((Attendance.status == 'check_in', Attendance.child_id)))),
+        func.min(Attendance.timestamp),
+        func.max(Attendance.timestamp)
+    ).filter(
+        Attendance.day.between(start_date, end_date)
+    ).group_by(Attendance.day).all()
+    
+    # عدد الأطفال المسجلين في كل يوم حسب تاريخ إضافتهم (تقريبي لعدم تخزين تاريخ الموافقة)
+    enrolled_since = sorted(
+        local_day(created_at) for (created_at,) in
+        db.session.query(Child.created_at).filter(Child.roster_filter()).all()
+        if created_at
+    )
+    
+    for day, present_count, first_scan_at, last_scan_at in rows:
+        db.session.merge(AttendanceDailyRollup(
+            day=day,
+            present_count=present_count,
+            total_enrolled=bisect.bisect_right(enrolled_since, day),
+            first_scan_at=first_scan_at,
+            last_scan_at=last_scan_at
+        ))
+    
+    db.session.commit()
+    click.echo(f'Backfilled {len(rows)} daily rollups from {start_date} to {end_date}')
+
+@attendance_bp.cli.command('rebuild-days')
+def rebuild_days():
+    """إعادة حساب اليوم المحلي لسجلات الحضور والتحديثات بعد تغيير NURSERY_UTC_OFFSET_MINUTES"""
+    changed = 0
+    for model, source in ((Attendance, Attendance.timestamp), (DailyUpdate, DailyUpdate.created_at)):
+        for record_id, value, day in db.session.query(model.id, source, model.day).all():
+            if value is not None and local_day(value) != day:
+                db.session.query(model).filter(model.id == record_id).update(
+                    {'day': local_day(value)}, synchronize_session=False
+                )
+                changed += 1
+    db.session.commit()
+    click.echo(f'Updated {changed} records, run backfill-rollups and rebuild-presence next')
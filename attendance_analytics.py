@@ -0,0 +1,204 @@
+from src.models.user import db, Attendance, UTC_OFFSET_MINUTES
+from sqlalchemy import select
+import os
+
+try:
+    import numpy as np
+except ImportError:  # اختياري، بدونه يعيد مسار التحليلات 501
+    np = None
+
+# وقت الاستلام المتأخر بالتوقيت المحلي، والسجلات محفوظة بتوقيت UTC (فرق التوقيت من النماذج مثل عمود day)
+LATE_PICKUP_TIME = os.environ.get('LATE_PICKUP_TIME', '16:00')
+PERCENTILES = (50, 90)
+
+US_PER_HOUR = 3600 * 10 ** 6
+COLUMNS_DTYPE = [('child_id', 'i8'), ('is_check_in', 'i1'), ('timestamp', 'M8[us]')] if np is not None else None
+
+def available():
+    return np is not None
+
+def load_attendance_columns(start_date, end_date, child_id=None):
+    """تحميل سجلات الفترة كمصفوفات أعمدة (الطفل، هل هو دخول، الوقت) مرتبة حسب الطفل ثم الوقت"""
+    statement = select(
+        Attendance.child_id,
+        Attendance.status == 'check_in',
+        Attendance.timestamp
+    ).where(Attendance.day >= start_date, Attendance.day <= end_date)
+    if child_id is not None:
+        statement = statement.where(Attendance.child_id == child_id)
+
+    # مئات الآلاف من الصفوف: نقرأها من مؤشر DBAPI مباشرة ونحولها إلى مصفوفة دفعة واحدة
+    # بدلاً من إنشاء كائن Row وتحويل الوقت إلى datetime لكل صف
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(sql)
+        rows = np.array(cursor.fetchall(), dtype=COLUMNS_DTYPE)
+    finally:
+        cursor.close()
+
+    order = np.lexsort((rows['timestamp'], rows['child_id']))
+    rows = rows[order]
+    return {
+        'child_id': rows['child_id'],
+        'is_check_in': rows['is_check_in'].astype(bool),
+        'timestamp': rows['timestamp']
+    }
+
+def local_time(timestamps):
+    """أوقات UTC بالتوقيت المحلي للحضانة"""
+    return timestamps + np.timedelta64(UTC_OFFSET_MINUTES, 'm')
+
+def pair_visits(columns):
+    """ربط كل دخول بالخروج الذي يليه مباشرة لنفس الطفل في نفس اليوم"""
+    child_ids = columns['child_id']
+    is_check_in = columns['is_check_in']
+    timestamps = columns['timestamp']
+    # نفس اليوم المحلي المخزن في Attendance.day
+    days = local_time(timestamps).astype('datetime64[D]')
+
+    paired = (
+        is_check_in[:-1] & ~is_check_in[1:]
+        & (child_ids[:-1] == child_ids[1:])
+        & (days[:-1] == days[1:])
+    )
+    starts = np.nonzero(paired)[0]
+
+    # دخول بدون خروج في نفس اليوم
+    open_check_ins = is_check_in.copy()
+    open_check_ins[starts] = False
+
+    check_in = timestamps[starts]
+    check_out = timestamps[starts + 1]
+    return {
+        'child_id': child_ids[starts],
+        'day': days[starts],
+        'check_in': check_in,
+        'check_out': check_out,
+        'hours': (check_out - check_in).astype(np.int64) / US_PER_HOUR,
+        'open_child_id': child_ids[open_check_ins]
+    }
+
+def late_pickup_mask(check_out, late_after=LATE_PICKUP_TIME):
+    """الخروج بعد وقت الاستلام المحدد (بالتوقيت المحلي)"""
+    hours, minutes = (int(part) for part in late_after.split(':'))
+    local = local_time(check_out)
+    time_of_day = local - local.astype('datetime64[D]')
+    return time_of_day > np.timedelta64(hours * 60 + minutes, 'm')
+
+def period_start(days, granularity):
+    """بداية الأسبوع (الاثنين) أو الشهر لكل يوم"""
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    # 1970-01-01 كان يوم خميس
+    return days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+
+def grouped_percentiles(groups, values, counts, percentiles=PERCENTILES):
+    """النسب المئوية لكل مجموعة (groups أرقام متتالية من 0) بالاستيفاء الخطي مثل np.percentile"""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_values = counts > 0
+    result = {}
+    for q in percentiles:
+        position = starts + (q / 100) * np.maximum(counts - 1, 0)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        fraction = position - low
+        value = np.zeros(len(counts))
+        if len(ordered):
+            low = np.minimum(low, len(ordered) - 1)
+            high = np.minimum(high, len(ordered) - 1)
+            value = ordered[low] * (1 - fraction) + ordered[high] * fraction
+        result[q] = np.where(has_values, value, np.nan)
+    return result
+
+def _round(values):
+    return [None if value != value else round(float(value), 2) for value in values]
+
+def time_on_site(columns, granularity='week', late_after=LATE_PICKUP_TIME):
+    """ساعات الحضور وحالات التأخر لكل طفل ولكل فترة ولكامل المدة"""
+    visits = pair_visits(columns)
+    hours = visits['hours']
+    late = late_pickup_mask(visits['check_out'], late_after)
+
+    # الأطفال الذين سجلوا دخولاً في الفترة، حتى لو لم يسجل خروجهم
+    check_in_children = columns['child_id'][columns['is_check_in']]
+    check_in_days = local_time(columns['timestamp'][columns['is_check_in']]).astype('datetime64[D]')
+    children = np.unique(check_in_children)
+    n = len(children)
+
+    visit_group = np.searchsorted(children, visits['child_id'])
+    visit_counts = np.bincount(visit_group, minlength=n)
+    total_hours = np.bincount(visit_group, weights=hours, minlength=n)
+    late_counts = np.bincount(visit_group, weights=late, minlength=n)
+    open_counts = np.bincount(np.searchsorted(children, visits['open_child_id']), minlength=n)
+
+    # أيام الحضور الفريدة لكل طفل (مفتاح واحد: ترتيب الطفل × عدد الأيام + اليوم)
+    day_numbers = check_in_days.astype(np.int64)
+    if len(day_numbers):
+        day_numbers = day_numbers - day_numbers.min()
+    span = int(day_numbers.max()) + 1 if len(day_numbers) else 1
+    attended = np.unique(np.searchsorted(children, check_in_children) * span + day_numbers)
+    days_attended = np.bincount(attended // span, minlength=n)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average_visit = np.where(visit_counts > 0, total_hours / visit_counts, np.nan)
+    percentiles = grouped_percentiles(visit_group, hours, visit_counts)
+
+    child_stats = []
+    rounded_total = _round(total_hours)
+    rounded_average = _round(average_visit)
+    rounded_percentiles = {q: _round(values) for q, values in percentiles.items()}
+    for i, child_id in enumerate(children.tolist()):
+        stats = {
+            'child_id': child_id,
+            'days_attended': int(days_attended[i]),
+            'visits': int(visit_counts[i]),
+            'total_hours': rounded_total[i],
+            'average_visit_hours': rounded_average[i],
+            'late_pickups': int(late_counts[i]),
+            'missing_check_outs': int(open_counts[i])
+        }
+        for q in PERCENTILES:
+            stats[f'p{q}_visit_hours'] = rounded_percentiles[q][i]
+        child_stats.append(stats)
+
+    # التجميع حسب الأسبوع أو الشهر
+    starts = period_start(visits['day'], granularity)
+    periods, period_group = np.unique(starts, return_inverse=True)
+    period_hours = np.bincount(period_group, weights=hours, minlength=len(periods))
+    period_visits = np.bincount(period_group, minlength=len(periods))
+    period_late = np.bincount(period_group, weights=late, minlength=len(periods))
+    period_children = np.bincount(
+        np.unique(period_group.astype(np.int64) * max(n, 1) + visit_group) // max(n, 1), minlength=len(periods)
+    )
+
+    period_stats = []
+    rounded_hours = _round(period_hours)
+    for i, start in enumerate(periods.astype(str).tolist()):
+        period_stats.append({
+            'period_start': start,
+            'children': int(period_children[i]),
+            'visits': int(period_visits[i]),
+            'total_hours': rounded_hours[i],
+            'average_hours_per_child': round(float(period_hours[i] / period_children[i]), 2) if period_children[i] else None,
+            'late_pickups': int(period_late[i])
+        })
+
+    overall = {
+        'children': n,
+        'visits': int(len(hours)),
+        'total_hours': round(float(hours.sum()), 2),
+        'average_visit_hours': round(float(hours.mean()), 2) if len(hours) else None,
+        'late_pickups': int(late.sum()),
+        'missing_check_outs': int(len(visits['open_child_id']))
+    }
+    for q in PERCENTILES:
+        overall[f'p{q}_visit_hours'] = round(float(np.percentile(hours, q)), 2) if len(hours) else None
+
+    return {
+        'overall': overall,
+        'children': child_stats,
+        'periods': period_stats
+    }
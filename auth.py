@@ -1,46 +1,152 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
-from src.models.user import db, User, Child
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db, User, Child, PasswordHashingBusy
+from src.utils.cache import TTLCache
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
+import hashlib
+import time
 import uuid
+import os
 
 auth_bp = Blueprint('auth', __name__)
 
+# المستخدمون المصادق عليهم حسب المعرف، ونتائج فك JWT حسب بصمة الرمز
+# لكل عملية نسختها، وتعديل المستخدم يزيله من ذاكرة العملية التي نفذته فقط: قد ترى العمليات الأخرى
+# الدور والتفعيل القديمين حتى PRINCIPAL_CACHE_TTL ثانية، لذلك يعيد admin_required قراءتهما من قاعدة البيانات
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', 1024)),
+    ttl=int(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+)
+token_cache = TTLCache(
+    maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', 4096)),
+    ttl=int(os.environ.get('TOKEN_CACHE_TTL', 300))
+)
+
+# توكنات قصيرة العمر لطلبات لا ترسل ترويسة Authorization (وسوم img و video و EventSource) فتمرر في access_token
+# وتظهر في سجلات الخوادم، لذلك تقتصر على نطاق واحد ومدة قصيرة بدلاً من توكن الدخول (30 يوماً)
+SCOPED_TOKEN_TTLS = {
+    'media': int(os.environ.get('MEDIA_TOKEN_TTL', 3600)),
+    'events': int(os.environ.get('EVENTS_TOKEN_TTL', 600)),
+}
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_principal_dirty(mapper, connection, target):
+    """تسجيل المستخدمين المعدلين لإزالتهم من الذاكرة المؤقتة عند انتهاء المعاملة"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('dirty_principals', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_dirty_principals(session):
+    """يغطي تحديث الملف الشخصي وإعادة تعيين كلمة المرور وتعطيل الحساب"""
+    for user_id in session.info.pop('dirty_principals', ()):
+        principal_cache.invalidate(user_id)
+
+def decode_token(token):
+    """فك JWT مع الاحتفاظ بالنتيجة حتى انتهاء صلاحية الرمز"""
+    digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    data = token_cache.get(digest)
+    if data is None:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        ttl = token_cache.ttl
+        if data.get('exp') is not None:
+            ttl = min(ttl, data['exp'] - time.time())
+        if ttl > 0:
+            token_cache.set(digest, data, ttl)
+    return data
+
+def load_principal(user_id):
+    """جلب المستخدم من الذاكرة المؤقتة وربطه بالجلسة الحالية دون استعلام"""
+    cached = principal_cache.get(user_id)
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+    
+    user = User.query.filter_by(id=user_id).first()
+    if not user:
+        return None
+    
+    # نحتفظ بنسخة منفصلة عن الجلسة ونعيد نسخة مرتبطة بها
+    db.session.expunge(user)
+    principal_cache.set(user_id, user)
+    return db.session.merge(user, load=False)
+
+def hashing_busy_response():
+    """استجابة سريعة عند انشغال مجموعة تشفير كلمات المرور"""
+    return jsonify({'message': 'Server is busy, please try again shortly'}), 503, {'Retry-After': '1'}
+
+def resolve_principal(token, scope=None):
+    """التحقق من التوكن وإرجاع (المستخدم، None) أو (None، رد الخطأ)، وscope لتوكنات النطاق قصيرة العمر"""
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+    
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        data = decode_token(token)
+        # توكن النطاق لا يقبل بدلاً من توكن الدخول ولا في نطاق آخر
+        if data.get('scope') != scope:
+            return None, (jsonify({'message': 'Token is invalid!'}), 401)
+        
+        current_user = load_principal(data['user_id'])
+        
+        if not current_user:
+            return None, (jsonify({'message': 'Token is invalid!'}), 401)
+            
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired!'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Token is invalid!'}), 401)
+    
+    return current_user, None
+
 def token_required(f):
     """Decorator للتحقق من صحة JWT Token"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.filter_by(id=data['user_id']).first()
-            
-            if not current_user:
-                return jsonify({'message': 'Token is invalid!'}), 401
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Token is invalid!'}), 401
+        current_user, error = resolve_principal(request.headers.get('Authorization'))
+        if error:
+            return error
         
         return f(current_user, *args, **kwargs)
     
     return decorated
 
+def scoped_token_required(scope):
+    """مثل token_required، ويقبل أيضاً توكن النطاق scope في access_token"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.headers.get('Authorization'):
+                current_user, error = resolve_principal(request.headers['Authorization'])
+            else:
+                current_user, error = resolve_principal(request.args.get('access_token'), scope)
+            if error:
+                return error
+            
+            return f(current_user, *args, **kwargs)
+        
+        return decorated
+    return decorator
+
+def is_active_admin(user_id):
+    """الدور والتفعيل الحاليان من قاعدة البيانات (عمودان عبر المفتاح الأساسي) بدلاً من النسخة المؤقتة"""
+    row = db.session.query(User.role, User.is_active).filter(User.id == user_id).first()
+    return row is not None and row.role == 'admin' and row.is_active is not False
+
 def admin_required(f):
     """Decorator للتحقق من صلاحيات الإدارة"""
     @wraps(f)
     def decorated(current_user, *args, **kwargs):
-        if current_user.role != 'admin':
+        if not is_active_admin(current_user.id):
+            # عدل المستخدم في عملية أخرى، فلا نعيد استخدام نسخته المؤقتة
+            principal_cache.invalidate(current_user.id)
             return jsonify({'message': 'Admin access required!'}), 403
         return f(current_user, *args, **kwargs)
     
@@ -87,6 +193,9 @@ def register_parent():
             'user': user.to_dict()
         }), 201
         
+    except PasswordHashingBusy:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Registration failed: {str(e)}'}), 500
@@ -135,6 +244,9 @@ def register_staff():
             'user': user.to_dict()
         }), 201
         
+    except PasswordHashingBusy:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Registration failed: {str(e)}'}), 500
@@ -156,6 +268,14 @@ def login():
         if not user.is_active:
             return jsonify({'message': 'Account is deactivated'}), 401
         
+        # إعادة تشفير كلمة المرور إذا كانت إعدادات التشفير المخزنة أقدم من الحالية
+        if user.password_needs_rehash():
+            try:
+                user.set_password(data['password'])
+                db.session.commit()
+            except PasswordHashingBusy:
+                db.session.rollback()
+        
         # توليد JWT Token
         token = jwt.encode({
             'user_id': user.id,
@@ -168,6 +288,8 @@ def login():
             'user': user.to_dict()
         }), 200
         
+    except PasswordHashingBusy:
+        return hashing_busy_response()
     except Exception as e:
         return jsonify({'message': f'Login failed: {str(e)}'}), 500
 
@@ -229,6 +351,9 @@ def reset_password():
         
         return jsonify({'message': 'Password reset successfully'}), 200
         
+    except PasswordHashingBusy:
+        db.session.rollback()
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Password reset failed: {str(e)}'}), 500
@@ -266,3 +391,35 @@ def update_profile(current_user):
         db.session.rollback()
         return jsonify({'message': f'Profile update failed: {str(e)}'}), 500
 
+@auth_bp.route('/access-token', methods=['POST'])
+@token_required
+def issue_access_token(current_user):
+    """توكن قصير العمر لنطاق واحد يمرر في access_token (مثل روابط الوسائط)"""
+    data = request.get_json(silent=True) or {}
+    scope = data.get('scope')
+    
+    if scope not in SCOPED_TOKEN_TTLS:
+        return jsonify({'message': f"scope must be one of: {', '.join(SCOPED_TOKEN_TTLS)}"}), 400
+    
+    expires_in = SCOPED_TOKEN_TTLS[scope]
+    token = jwt.encode({
+        'user_id': current_user.id,
+        'scope': scope,
+        'exp': datetime.utcnow() + timedelta(seconds=expires_in)
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    
+    return jsonify({
+        'access_token': token,
+        'scope': scope,
+        'expires_in': expires_in
+    }), 200
+
+@auth_bp.route('/cache-stats', methods=['GET'])
+@token_required
+@admin_required
+def get_cache_stats(current_user):
+    """إحصائيات الذاكرة المؤقتة للمصادقة (الإدارة فقط)"""
+    return jsonify({
+        'principal_cache': principal_cache.stats(),
+        'token_cache': token_cache.stats()
+    }), 200
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+مقارنة مسار to_dict + jsonify مع مسار الأعمدة المسقطة لـ /children/all و /attendance/today
+
+الاستخدام: python benchmark_serialization.py [عدد الأطفال] [عدد التكرارات]
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+from datetime import datetime, timedelta, date
+from flask import Flask, jsonify
+from src.models.user import db, User, Child, Attendance, ChildPresence, local_today
+from src.routes.auth import token_required, principal_cache
+from src.utils.pagination import paginate
+from src.utils.live_events import latest_event_id
+from sqlalchemy.orm import joinedload
+from src.routes.children import children_bp
+from src.routes.attendance import attendance_bp
+import jwt
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.register_blueprint(children_bp, url_prefix='/api/children')
+    app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
+    
+    # المسار القديم (كائنات ORM مع تحميل مسبق + to_dict + jsonify) كمرجع للمقارنة
+    @app.route('/legacy/children/all')
+    @token_required
+    def legacy_all_children(current_user):
+        query = Child.query.options(joinedload(Child.parent)).filter_by(is_active=True)
+        children, next_cursor = paginate(query, [Child.id], None, 200)
+        children_with_parents = []
+        for child in children:
+            child_dict = child.to_dict()
+            child_dict['parent'] = child.parent.to_dict()
+            children_with_parents.append(child_dict)
+        return jsonify({'children': children_with_parents, 'next_cursor': next_cursor}), 200
+    
+    @app.route('/legacy/attendance/today')
+    @token_required
+    def legacy_today(current_user):
+        today = local_today()
+        events_cursor = latest_event_id()
+        rows = db.session.query(Child, ChildPresence)\
+            .outerjoin(ChildPresence, ChildPresence.child_id == Child.id)\
+            .options(joinedload(Child.parent))\
+            .filter(Child.roster_filter()).order_by(Child.id).all()
+        attendance_summary = []
+        for child, presence in rows:
+            status = 'absent'
+            last_action_time = None
+            if presence and presence.day == today:
+                status = presence.current_status(today)
+                last_action_time = presence.last_action_time.isoformat()
+            child_data = child.to_dict()
+            child_data['parent'] = child.parent.to_dict()
+            child_data['current_status'] = status
+            child_data['last_action_time'] = last_action_time
+            attendance_summary.append(child_data)
+        present_count = sum(1 for child in attendance_summary if child['current_status'] == 'present')
+        return jsonify({
+            'date': today.isoformat(),
+            'summary': {
+                'total_children': len(attendance_summary),
+                'present': present_count,
+                'absent': len(attendance_summary) - present_count
+            },
+            'children': attendance_summary,
+            'events_cursor': events_cursor
+        }), 200
+    
+    return app
+
+def seed(app, children_count):
+    """إنشاء بيانات تجريبية"""
+    with app.app_context():
+        db.create_all()
+        admin = User(name='مدير', email='admin@example.com', phone='0500000000',
+                     role='admin', password_hash='-')
+        db.session.add(admin)
+        parents = []
+        for i in range(children_count // 2 + 1):
+            parent = User(name=f'ولي أمر {i}', email=f'parent{i}@example.com', phone=f'05{i:08d}',
+                          role='parent', password_hash='-')
+            parents.append(parent)
+        db.session.add_all(parents)
+        db.session.flush()
+        
+        now = datetime.utcnow()
+        for i in range(children_count):
+            child = Child(name=f'طفل {i}', birthdate=date(2021, 1, 1) + timedelta(days=i),
+                          parent_id=parents[i // 2].id, is_approved=True,
+                          qr_code=f'CHILD_{i}_bench')
+            db.session.add(child)
+            db.session.flush()
+            if random.random() < 0.8:
+                attendance = Attendance(child_id=child.id, staff_id=admin.id, status='check_in',
+                                        timestamp=now - timedelta(minutes=random.randint(1, 60)))
+                db.session.add(attendance)
+                db.session.flush()
+                presence = ChildPresence(child_id=child.id)
+                presence.apply(attendance)
+                db.session.add(presence)
+        db.session.commit()
+        return jwt.encode({'user_id': admin.id}, app.config['SECRET_KEY'], algorithm='HS256')
+
+def measure(client, url, headers, iterations):
+    client.get(url, headers=headers)  # تسخين
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response = client.get(url, headers=headers)
+    elapsed = (time.perf_counter() - start) / iterations * 1000
+    return elapsed, response.data
+
+def main():
+    children_count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    
+    app = create_app()
+    token = seed(app, children_count)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+    
+    print(f'{children_count} children, {iterations} iterations')
+    for name, new_url, legacy_url in [
+        ('/children/all', '/api/children/all?limit=200', '/legacy/children/all'),
+        ('/attendance/today', '/api/attendance/today', '/legacy/attendance/today'),
+    ]:
+        legacy_ms, legacy_body = measure(client, legacy_url, headers, iterations)
+        new_ms, new_body = measure(client, new_url, headers, iterations)
+        print(f'{name:20} to_dict+jsonify {legacy_ms:8.2f} ms   projected {new_ms:8.2f} ms   '
+              f'x{legacy_ms / new_ms:.1f}   identical={legacy_body == new_body}')
+    
+    print(f'principal cache: {principal_cache.stats()}')
+
+if __name__ == '__main__':
+    main()
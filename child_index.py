@@ -0,0 +1,179 @@
+from src.models.user import db, Child
+from src.utils.serialization import RowSerializer
+from src.utils.text import normalize_arabic, strip_arabic_article
+import bisect
+import threading
+import time
+import os
+
+# مدة صلاحية الفهرس، تضمن وصول التعديلات من العمليات الأخرى (كل عملية لها فهرسها)
+INDEX_TTL = int(os.environ.get('CHILD_INDEX_TTL', 60))
+MAX_NAME_MATCHES = 50
+
+def name_keys(name):
+    """كلمات الاسم الموحدة، مع نسخة بدون أداة التعريف (عبد الرحمن يطابق "رحمن" و"الرحمن")"""
+    words = normalize_arabic(name).split()
+    return set(words) | {strip_arabic_article(word) for word in words}
+
+class ChildRecord:
+    """بيانات الطفل التي يحتاجها رد المسح فقط، جاهزة للتحويل إلى JSON"""
+    __slots__ = ('id', 'name', 'parent_id', 'qr_code', 'data', 'normalized_name')
+
+    def __init__(self, data):
+        self.id = data['id']
+        self.name = data['name']
+        self.parent_id = data['parent_id']
+        self.qr_code = data['qr_code']
+        self.data = data
+        self.normalized_name = normalize_arabic(data['name'])
+
+    def to_dict(self):
+        return dict(self.data)
+
+class QRCodeIndex:
+    """خريطة في الذاكرة من QR Code إلى الطفل المعتمد والنشط، مع فهرس أسماء للبحث بالبادئة"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._by_code = None
+        self._code_by_id = {}
+        # مصفوفة مرتبة من (كلمة الاسم، معرف الطفل) يبحث فيها بالتنصيف
+        self._names = []
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        serializer = RowSerializer(Child.dict_columns())
+        by_code = {}
+        code_by_id = {}
+        names = []
+        for row in db.session.query(*Child.dict_columns()).filter(Child.roster_filter(), Child.qr_code.isnot(None)):
+            record = ChildRecord(serializer(row))
+            by_code[record.qr_code] = record
+            code_by_id[record.id] = record.qr_code
+            names.extend((key, record.id) for key in name_keys(record.name))
+        names.sort()
+        self._by_code, self._code_by_id, self._names = by_code, code_by_id, names
+        self._built_at = time.monotonic()
+        return by_code
+
+    def _ensure(self):
+        """الفهرس الصالح حالياً، يقرأ منه المستدعي بدلاً من self._by_code الذي قد يلغيه invalidate في أي لحظة"""
+        by_code = self._by_code
+        if by_code is None or time.monotonic() - self._built_at > self.ttl:
+            with self._lock:
+                by_code = self._by_code
+                if by_code is None or time.monotonic() - self._built_at > self.ttl:
+                    by_code = self._build()
+        return by_code
+
+    def lookup(self, qr_code):
+        """الطفل صاحب الرمز، أو None للرمز غير الصالح دون استعلام"""
+        return self.lookup_many([qr_code]).get(qr_code)
+
+    def lookup_many(self, qr_codes):
+        """الأطفال أصحاب الرموز الموجودة في الفهرس، مؤكدين من قاعدة البيانات باستعلام واحد
+
+        الرفض أو التعطيل في عملية أخرى لا يصل إلى فهرس هذه العملية قبل INDEX_TTL، فيتحقق من
+        الموجودين بالمفتاح الأساسي، أما الرموز غير الموجودة فترفض دون استعلام
+        """
+        by_code = self._ensure()
+        found = {qr_code: by_code[qr_code] for qr_code in set(qr_codes) if qr_code in by_code}
+        if not found:
+            return {}
+
+        current = set(db.session.query(Child.id, Child.qr_code).filter(
+            Child.id.in_([record.id for record in found.values()]),
+            Child.roster_filter()
+        ).all())
+        confirmed = {}
+        for qr_code, record in found.items():
+            if (record.id, qr_code) in current:
+                confirmed[qr_code] = record
+            else:
+                self._discard(record.id, qr_code)
+        return confirmed
+
+    def _discard(self, child_id, qr_code):
+        """إزالة طفل لم يعد في القائمة (عدل في عملية أخرى)"""
+        with self._lock:
+            if self._by_code is None or self._code_by_id.get(child_id) != qr_code:
+                return
+            del self._code_by_id[child_id]
+            record = self._by_code.pop(qr_code, None)
+            if record is not None:
+                names = list(self._names)
+                self._remove_names(names, record)
+                self._names = names
+
+    def refresh(self, child):
+        """تحديث الفهرس بعد إضافة طفل أو الموافقة عليه أو رفضه أو تعديله"""
+        if self._by_code is None:
+            return
+        with self._lock:
+            if self._by_code is None:
+                return
+            # نعدل نسخة من فهرس الأسماء ثم نستبدل المرجع، فلا يرى match_name قائمة نصف معدلة
+            names = list(self._names)
+            old_code = self._code_by_id.pop(child.id, None)
+            if old_code is not None:
+                old_record = self._by_code.pop(old_code, None)
+                if old_record is not None:
+                    self._remove_names(names, old_record)
+            if child.is_approved and child.is_active and child.qr_code:
+                record = ChildRecord(child.to_dict())
+                self._by_code[child.qr_code] = record
+                self._code_by_id[child.id] = child.qr_code
+                for key in name_keys(record.name):
+                    bisect.insort(names, (key, record.id))
+            self._names = names
+
+    def _remove_names(self, names, record):
+        for key in name_keys(record.name):
+            position = bisect.bisect_left(names, (key, record.id))
+            if position < len(names) and names[position] == (key, record.id):
+                del names[position]
+
+    def _prefix_ids(self, names, prefix):
+        ids = set()
+        position = bisect.bisect_left(names, (prefix,))
+        while position < len(names) and names[position][0].startswith(prefix):
+            ids.add(names[position][1])
+            position += 1
+        return ids
+
+    def match_name(self, query, limit=10):
+        """الأطفال الذين تبدأ كلمات أسمائهم بكلمات البحث، ومن يبدأ اسمه بالبحث كاملاً أولاً"""
+        by_code = self._ensure()
+        words = normalize_arabic(query).split()
+        if not words:
+            return []
+        names, code_by_id = self._names, self._code_by_id
+
+        ids = None
+        for word in words:
+            matched = self._prefix_ids(names, word)
+            stripped = strip_arabic_article(word)
+            if stripped != word:
+                matched |= self._prefix_ids(names, stripped)
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                return []
+
+        normalized_query = ' '.join(words)
+        # قد يعدل الفهرس أثناء البحث، فنتجاهل الأطفال الذين أزيلوا للتو
+        records = [record for record in (by_code.get(code_by_id.get(child_id)) for child_id in ids) if record]
+        records.sort(key=lambda record: (
+            not record.normalized_name.startswith(normalized_query), record.normalized_name, record.id
+        ))
+        return records[:limit]
+
+    def invalidate(self):
+        """إعادة البناء عند الاستخدام التالي"""
+        with self._lock:
+            self._by_code = None
+
+    def __len__(self):
+        return len(self._ensure())
+
+qr_index = QRCodeIndex()
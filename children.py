@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app
 from src.models.user import db, User, Child
 from src.routes.auth import token_required, admin_required
+from src.utils.pagination import get_page_args, paginate, InvalidCursor
+from src.utils.serialization import RowSerializer, prefixed, json_response
+from src.utils.live_events import publish_event
+from src.utils.child_index import qr_index, MAX_NAME_MATCHES
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import uuid
 
@@ -37,6 +42,7 @@ def add_child(current_user):
         child.generate_qr_code()
         
         db.session.commit()
+        qr_index.refresh(child)
         
         return jsonify({
             'message': 'Child added successfully. Waiting for admin approval.',
@@ -72,7 +78,11 @@ def get_my_children(current_user):
 def get_pending_children(current_user):
     """الحصول على قائمة الأطفال المنتظرين الموافقة (الإدارة فقط)"""
     try:
-        children = Child.query.filter_by(is_approved=False, is_active=True).all()
+        limit, cursor = get_page_args()
+        
+        query = Child.query.options(joinedload(Child.parent))\
+            .filter(Child.pending_filter())
+        children, next_cursor = paginate(query, [Child.id], cursor, limit)
         
         children_with_parents = []
         for child in children:
@@ -81,9 +91,12 @@ def get_pending_children(current_user):
             children_with_parents.append(child_dict)
         
         return jsonify({
-            'pending_children': children_with_parents
+            'pending_children': children_with_parents,
+            'next_cursor': next_cursor
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get pending children: {str(e)}'}), 500
 
@@ -101,7 +114,10 @@ def approve_child(current_user, child_id):
         child.is_approved = True
         child.updated_at = datetime.utcnow()
         
+        publish_event('child_approved', child, child.to_dict())
+        
         db.session.commit()
+        qr_index.refresh(child)
         
         return jsonify({
             'message': 'Child approved successfully',
@@ -131,6 +147,7 @@ def reject_child(current_user, child_id):
         child.updated_at = datetime.utcnow()
         
         db.session.commit()
+        qr_index.refresh(child)
         
         return jsonify({
             'message': 'Child rejected successfully',
@@ -147,21 +164,55 @@ def reject_child(current_user, child_id):
 def get_all_children(current_user):
     """الحصول على قائمة جميع الأطفال (الإدارة فقط)"""
     try:
-        children = Child.query.filter_by(is_active=True).all()
+        limit, cursor = get_page_args()
+        
+        # قراءة الأعمدة المطلوبة فقط بدلاً من كائنات ORM
+        child_row = RowSerializer(Child.dict_columns())
+        parent_row = RowSerializer(User.dict_columns())
+        
+        query = db.session.query(*Child.dict_columns(), *prefixed(User.dict_columns(), 'parent_'))\
+            .join(User, Child.parent_id == User.id)\
+            .filter(Child.is_active == True)
+        rows, next_cursor = paginate(query, [Child.id], cursor, limit)
         
         children_with_parents = []
-        for child in children:
-            child_dict = child.to_dict()
-            child_dict['parent'] = child.parent.to_dict()
+        for row in rows:
+            child_dict = child_row(row[:child_row.width])
+            child_dict['parent'] = parent_row(row[child_row.width:])
             children_with_parents.append(child_dict)
         
-        return jsonify({
-            'children': children_with_parents
+        return json_response({
+            'children': children_with_parents,
+            'next_cursor': next_cursor
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get children: {str(e)}'}), 500
 
+@children_bp.route('/lookup', methods=['GET'])
+@token_required
+def lookup_children(current_user):
+    """البحث السريع بالاسم للتسجيل اليدوي عند غياب بطاقة QR (الإدارة والموظفين)"""
+    try:
+        if current_user.role not in ['admin', 'staff']:
+            return jsonify({'message': 'Only staff can look up children'}), 403
+        
+        query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 10, type=int), MAX_NAME_MATCHES))
+        
+        # من فهرس الذاكرة مباشرة، دون استعلام لكل حرف يكتبه المستخدم
+        matches = qr_index.match_name(query, limit)
+        
+        return json_response({
+            'query': query,
+            'children': [record.to_dict() for record in matches]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'message': f'Failed to look up children: {str(e)}'}), 500
+
 @children_bp.route('/<int:child_id>', methods=['GET'])
 @token_required
 def get_child_details(current_user, child_id):
@@ -217,6 +268,7 @@ def update_child(current_user, child_id):
         
         child.updated_at = datetime.utcnow()
         db.session.commit()
+        qr_index.refresh(child)
         
         return jsonify({
             'message': 'Child updated successfully',
@@ -0,0 +1,124 @@
+from flask import Flask
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import threading
+import jwt
+import pytest
+from src.models.user import db, User, Child, Attendance
+from src.utils.storage import StreamingUploadRequest
+from src.utils.child_index import qr_index
+from src.routes.auth import auth_bp, principal_cache, token_cache
+from src.routes.children import children_bp
+from src.routes.registration import registration_bp
+from src.routes.attendance import attendance_bp
+from src.routes.daily_updates import daily_updates_bp
+from src.routes.notifications import notifications_bp
+from src.routes.events import events_bp
+from src.routes.parents import parents_bp, feed_cache
+from src.routes.search import search_bp
+
+SECRET_KEY = 'test-secret-key-with-at-least-32-bytes'
+
+BLUEPRINTS = [
+    (auth_bp, '/api/auth'),
+    (children_bp, '/api/children'),
+    (registration_bp, '/api/registration'),
+    (attendance_bp, '/api/attendance'),
+    (daily_updates_bp, '/api/daily-updates'),
+    (notifications_bp, '/api/notifications'),
+    (events_bp, '/api/events'),
+    (parents_bp, '/api/parents'),
+    (search_bp, '/api/search'),
+]
+
+def create_test_app(database_uri):
+    app = Flask(__name__)
+    app.request_class = StreamingUploadRequest
+    app.config['SECRET_KEY'] = SECRET_KEY
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    for blueprint, url_prefix in BLUEPRINTS:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    return app
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # مجلدات الرفع مسارات نسبية، فتكتب داخل مجلد الاختبار
+    monkeypatch.chdir(tmp_path)
+    app = create_test_app(f"sqlite:///{tmp_path / 'app.db'}")
+    # الذاكرات المؤقتة على مستوى العملية تحمل معرفات من اختبارات سابقة
+    for cache in (principal_cache, token_cache, feed_cache):
+        cache.clear()
+    qr_index.invalidate()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def auth_header(user_id, **claims):
+    token = jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.utcnow() + timedelta(days=1),
+        **claims
+    }, SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def users(app):
+    """مدير وموظف وولي أمر (كلمة المرور لا تستخدم في أغلب الاختبارات)"""
+    users = {
+        role: User(name=role, email=f'{role}@example.com', phone='0500000000', role=role, password_hash='-')
+        for role in ('admin', 'staff', 'parent')
+    }
+    db.session.add_all(users.values())
+    db.session.commit()
+    return users
+
+@pytest.fixture
+def headers(users):
+    return {role: auth_header(user.id) for role, user in users.items()}
+
+@pytest.fixture
+def children(users):
+    """ثلاثة أطفال معتمدين لولي الأمر مع رموز QR"""
+    children = [Child(name=name, parent_id=users['parent'].id, is_approved=True)
+                for name in ('محمد علي', 'سارة أحمد', 'عبد الرحمن خالد')]
+    db.session.add_all(children)
+    db.session.flush()
+    for child in children:
+        child.generate_qr_code()
+    db.session.commit()
+    return children
+
+def scan(client, headers, qr_code):
+    return client.post('/api/attendance/scan-qr', headers=headers, json={'qr_code': qr_code})
+
+def hold_writes_until_all_read(monkeypatch, parties):
+    """كل طلب ينتظر قبل أول كتابة حتى تقرأ جميع الطلبات الحالة، فيتزامن أول مسح فعلاً"""
+    barrier = threading.Barrier(parties, timeout=10)
+    flush = Session.flush
+
+    def flush_after_all_reads(self, objects=None):
+        if any(isinstance(obj, Attendance) for obj in self.new):
+            barrier.wait()
+        return flush(self, objects)
+
+    monkeypatch.setattr(Session, 'flush', flush_after_all_reads)
+
+def concurrent_scans(app, headers, qr_codes):
+    statuses = []
+
+    def worker(qr_code):
+        statuses.append(scan(app.test_client(), headers, qr_code).status_code)
+
+    threads = [threading.Thread(target=worker, args=(qr_code,)) for qr_code in qr_codes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
@@ -1,11 +1,59 @@
-from flask import Blueprint, request, jsonify, current_app
-from src.models.user import db, User, Child, DailyUpdate
-from src.routes.auth import token_required, admin_required
+from flask import Blueprint, request, jsonify, current_app, send_file, redirect, url_for
+from src.models.user import db, User, Child, DailyUpdate, MediaAsset, local_day, local_today
+from src.routes.auth import token_required, admin_required, scoped_token_required
 from datetime import datetime, date
-from sqlalchemy import and_, func
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import joinedload
+from src.utils.pagination import get_page_args, paginate, InvalidCursor
+from src.utils.storage import upload_limits, store_upload
+from src.utils.outbox import enqueue_notification
+from src.utils.live_events import publish_event, latest_event_id
+from src.utils.media import media_executor, media_kind, render_variants, MEDIA_VARIANTS
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+import os
 
 daily_updates_bp = Blueprint('daily_updates', __name__)
 
+MAX_MEDIA_SIZE = int(os.environ.get('DAILY_UPDATE_MAX_MEDIA_SIZE', 100 * 1024 * 1024))
+# النسخ لا تتغير بعد إنشائها فيمكن تخزينها مؤقتاً لمدة طويلة في المتصفح فقط (private)،
+# فهي صور أطفال ولا يجوز أن تحفظها الوسائط المشتركة أو CDN
+MEDIA_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+def media_urls(asset):
+    """روابط جميع نسخ الوسائط"""
+    return {
+        name: url_for('daily_updates.serve_media', asset_id=asset.id, variant=name)
+        for name in MEDIA_VARIANTS[asset.kind]
+    }
+
+def can_view_media(user, asset):
+    """الموظفون والإدارة، وولي الأمر إن ظهر الملف في تحديث لأحد أطفاله"""
+    if user.role in ['staff', 'admin']:
+        return True
+    
+    pattern = f'%/media/{asset.id}/%'
+    return db.session.query(DailyUpdate.id)\
+        .join(Child, DailyUpdate.child_id == Child.id)\
+        .filter(
+            Child.parent_id == user.id,
+            or_(DailyUpdate.photo_url.like(pattern), DailyUpdate.video_url.like(pattern))
+        ).first() is not None
+
+def process_media_asset(app, asset_id):
+    """إنشاء النسخ المصغرة لملف وسائط (يعمل في الخلفية)"""
+    with app.app_context():
+        asset = MediaAsset.query.get(asset_id)
+        if asset is None:
+            return
+        try:
+            asset.variants = render_variants(asset.kind, asset.storage_path)
+            asset.status = 'ready'
+        except Exception:
+            app.logger.exception('Failed to render media %s', asset_id)
+            asset.status = 'failed'
+        db.session.commit()
+
 @daily_updates_bp.route('/add', methods=['POST'])
 @token_required
 def add_daily_update(current_user):
@@ -28,20 +76,49 @@ def add_daily_update(current_user):
         if not child.is_approved:
             return jsonify({'message': 'Child is not approved yet'}), 400
         
+        photo_url = data.get('photo_url')
+        video_url = data.get('video_url')
+        
+        # الوسائط المرفوعة عبر /media تقدم بنسختها المصغرة بدلاً من الأصل
+        if data.get('media_id'):
+            asset = MediaAsset.query.get(data['media_id'])
+            if not asset:
+                return jsonify({'message': 'Media not found'}), 404
+            urls = media_urls(asset)
+            if asset.kind == 'image':
+                photo_url = urls['preview']
+            else:
+                video_url = urls['preview']
+                photo_url = photo_url or urls['thumbnail']
+        
         # إنشاء التحديث اليومي
         daily_update = DailyUpdate(
             child_id=data['child_id'],
             staff_id=current_user.id,
             note=data.get('note'),
-            photo_url=data.get('photo_url'),
-            video_url=data.get('video_url'),
+            photo_url=photo_url,
+            video_url=video_url,
             activity_type=data.get('activity_type')  # أكل، نوم، لعب، تعلم
         )
         
         db.session.add(daily_update)
-        db.session.commit()
+        db.session.flush()
+        
+        update_dict = daily_update.to_dict()
+        update_dict['child'] = child.to_dict()
+        update_dict['staff'] = current_user.to_dict()
+        publish_event('daily_update', child, update_dict)
+        
+        # إشعار ولي الأمر يحفظ مع نفس المعاملة ويرسله عامل الإشعارات
+        enqueue_notification(child.parent_id, child.id, 'daily_update', {
+            'update_id': daily_update.id,
+            'child_name': child.name,
+            'activity_type': daily_update.activity_type,
+            'note': daily_update.note,
+            'photo_url': daily_update.photo_url
+        })
         
-        # إرسال إشعار لولي الأمر (TODO: تنفيذ الإشعارات)
+        db.session.commit()
         
         return jsonify({
             'message': 'Daily update added successfully',
@@ -68,11 +145,11 @@ def get_child_updates_today(current_user, child_id):
             return jsonify({'message': 'Access denied'}), 403
         
         # الحصول على تحديثات اليوم
-        today = date.today()
-        updates = DailyUpdate.query.filter(
+        today = local_today()
+        updates = DailyUpdate.query.options(joinedload(DailyUpdate.staff_member)).filter(
             and_(
                 DailyUpdate.child_id == child_id,
-                func.date(DailyUpdate.created_at) == today
+                DailyUpdate.day == today
             )
         ).order_by(DailyUpdate.created_at.desc()).all()
         
@@ -109,22 +186,31 @@ def get_child_updates_history(current_user, child_id):
         # الحصول على معاملات الاستعلام
         days = request.args.get('days', 7, type=int)  # آخر 7 أيام افتراضياً
         activity_type = request.args.get('activity_type')  # تصفية حسب نوع النشاط
+        limit, cursor = get_page_args()
+        start_date = date.fromordinal(local_today().toordinal() - days + 1)
         
-        # بناء الاستعلام
-        query = DailyUpdate.query.filter_by(child_id=child_id)
+        # بناء الاستعلام ضمن نطاق الأيام
+        query = DailyUpdate.query.options(joinedload(DailyUpdate.staff_member))\
+            .filter(
+                and_(
+                    DailyUpdate.child_id == child_id,
+                    DailyUpdate.day >= start_date
+                )
+            )
         
         if activity_type:
             query = query.filter_by(activity_type=activity_type)
         
-        # الحصول على التحديثات
-        updates = query.order_by(DailyUpdate.created_at.desc())\
-            .limit(days * 10).all()  # تقدير 10 تحديثات كحد أقصى في اليوم
+        # الحصول على التحديثات (قد تمتد تحديثات اليوم الواحد على أكثر من صفحة)
+        updates, next_cursor = paginate(
+            query, [DailyUpdate.day, DailyUpdate.created_at, DailyUpdate.id], cursor, limit, descending=True
+        )
         
         # تجميع البيانات حسب التاريخ
         daily_updates = {}
         
         for update in updates:
-            update_date = update.created_at.date().isoformat()
+            update_date = local_day(update.created_at).isoformat()
             
             if update_date not in daily_updates:
                 daily_updates[update_date] = {
@@ -142,9 +228,12 @@ def get_child_updates_history(current_user, child_id):
         
         return jsonify({
             'child': child.to_dict(),
-            'updates_history': sorted_updates
+            'updates_history': sorted_updates,
+            'next_cursor': next_cursor
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get updates history: {str(e)}'}), 500
 
@@ -157,27 +246,31 @@ def get_my_children_updates_today(current_user):
             return jsonify({'message': 'Only parents can view their children updates'}), 403
         
         # الحصول على أطفال ولي الأمر
-        children = Child.query.filter_by(
-            parent_id=current_user.id, 
-            is_approved=True, 
-            is_active=True
+        children = Child.query.filter(
+            Child.parent_id == current_user.id,
+            Child.roster_filter()
         ).all()
         
-        today = date.today()
+        today = local_today()
         children_updates = []
         
-        for child in children:
-            # الحصول على تحديثات اليوم لهذا الطفل
-            updates = DailyUpdate.query.filter(
+        # الحصول على تحديثات اليوم لجميع الأطفال في استعلام واحد
+        updates_by_child = {child.id: [] for child in children}
+        if children:
+            updates = DailyUpdate.query.options(joinedload(DailyUpdate.staff_member)).filter(
                 and_(
-                    DailyUpdate.child_id == child.id,
-                    func.date(DailyUpdate.created_at) == today
+                    DailyUpdate.child_id.in_(updates_by_child.keys()),
+                    DailyUpdate.day == today
                 )
             ).order_by(DailyUpdate.created_at.desc()).all()
             
+            for update in updates:
+                updates_by_child[update.child_id].append(update)
+        
+        for child in children:
             # إضافة معلومات الموظف لكل تحديث
             updates_with_staff = []
-            for update in updates:
+            for update in updates_by_child[child.id]:
                 update_dict = update.to_dict()
                 update_dict['staff'] = update.staff_member.to_dict()
                 updates_with_staff.append(update_dict)
@@ -204,12 +297,21 @@ def get_all_updates_today(current_user):
         if current_user.role not in ['staff', 'admin']:
             return jsonify({'message': 'Access denied'}), 403
         
-        today = date.today()
-        
-        # الحصول على جميع التحديثات اليوم
-        updates = DailyUpdate.query.filter(
-            func.date(DailyUpdate.created_at) == today
-        ).order_by(DailyUpdate.created_at.desc()).all()
+        today = local_today()
+        limit, cursor = get_page_args()
+        # مؤشر الأحداث قبل اللقطة، ليكمل العميل من /api/events/stream دون فقد أي تغيير
+        events_cursor = latest_event_id()
+        
+        # الحصول على صفحة من تحديثات اليوم
+        query = DailyUpdate.query.options(
+            joinedload(DailyUpdate.child),
+            joinedload(DailyUpdate.staff_member)
+        ).filter(
+            DailyUpdate.day == today
+        )
+        updates, next_cursor = paginate(
+            query, [DailyUpdate.created_at, DailyUpdate.id], cursor, limit, descending=True
+        )
         
         # إضافة معلومات الطفل والموظف لكل تحديث
         updates_with_details = []
@@ -219,13 +321,16 @@ def get_all_updates_today(current_user):
             update_dict['staff'] = update.staff_member.to_dict()
             updates_with_details.append(update_dict)
         
-        # إحصائيات سريعة
-        total_updates = len(updates_with_details)
-        activity_types = {}
+        # إحصائيات سريعة لكامل اليوم وليس للصفحة فقط
+        breakdown = db.session.query(DailyUpdate.activity_type, func.count(DailyUpdate.id))\
+            .filter(DailyUpdate.day == today)\
+            .group_by(DailyUpdate.activity_type).all()
         
-        for update in updates_with_details:
-            activity_type = update.get('activity_type', 'غير محدد')
-            activity_types[activity_type] = activity_types.get(activity_type, 0) + 1
+        activity_types = {}
+        for activity_type, count in breakdown:
+            activity_type = activity_type or 'غير محدد'
+            activity_types[activity_type] = activity_types.get(activity_type, 0) + count
+        total_updates = sum(activity_types.values())
         
         return jsonify({
             'date': today.isoformat(),
@@ -233,9 +338,13 @@ def get_all_updates_today(current_user):
                 'total_updates': total_updates,
                 'activity_breakdown': activity_types
             },
-            'updates': updates_with_details
+            'updates': updates_with_details,
+            'next_cursor': next_cursor,
+            'events_cursor': events_cursor
         }), 200
         
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get today updates: {str(e)}'}), 500
 
@@ -267,6 +376,8 @@ def update_daily_update(current_user, update_id):
         if data.get('activity_type') is not None:
             daily_update.activity_type = data['activity_type']
         
+        publish_event('daily_update_edited', daily_update.child, daily_update.to_dict())
+        
         db.session.commit()
         
         return jsonify({
@@ -294,6 +405,10 @@ def delete_daily_update(current_user, update_id):
         elif current_user.role not in ['staff', 'admin']:
             return jsonify({'message': 'Access denied'}), 403
         
+        publish_event('daily_update_deleted', daily_update.child, {
+            'id': daily_update.id,
+            'child_id': daily_update.child_id
+        })
         db.session.delete(daily_update)
         db.session.commit()
         
@@ -325,3 +440,110 @@ def get_activity_types(current_user):
         'activity_types': activity_types
     }), 200
 
+
+@daily_updates_bp.route('/media', methods=['POST'])
+@upload_limits(MAX_MEDIA_SIZE + 64 * 1024, MAX_MEDIA_SIZE)
+@token_required
+def upload_media(current_user):
+    """رفع صورة أو فيديو لتحديث يومي، وتنشأ النسخ المصغرة في الخلفية"""
+    try:
+        if current_user.role not in ['staff', 'admin']:
+            return jsonify({'message': 'Only staff can upload media'}), 403
+        
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            return jsonify({'message': 'File is required'}), 400
+        
+        kind = media_kind(file.mimetype, file.filename)
+        if kind is None:
+            return jsonify({'message': 'Only images and videos are supported'}), 400
+        
+        sha256, size, storage_path = store_upload(file, MAX_MEDIA_SIZE)
+        
+        asset = MediaAsset(
+            kind=kind,
+            original_name=secure_filename(file.filename) or file.filename,
+            content_type=file.mimetype,
+            size=size,
+            sha256=sha256,
+            storage_path=storage_path,
+            uploaded_by=current_user.id
+        )
+        
+        # نفس المحتوى رفع سابقاً، نستخدم نسخه الجاهزة
+        existing = MediaAsset.query.filter_by(sha256=sha256, status='ready').first()
+        if existing:
+            asset.variants = existing.variants
+            asset.status = 'ready'
+        
+        db.session.add(asset)
+        db.session.commit()
+        
+        if asset.status == 'processing':
+            media_executor.submit(process_media_asset, current_app._get_current_object(), asset.id)
+        
+        return jsonify({
+            'message': 'Media uploaded successfully',
+            'media': asset.to_dict(),
+            'urls': media_urls(asset)
+        }), 202 if asset.status == 'processing' else 201
+        
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({'message': f'File exceeds the {MAX_MEDIA_SIZE // (1024 * 1024)} MB limit'}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Failed to upload media: {str(e)}'}), 500
+
+@daily_updates_bp.route('/media/<asset_id>', methods=['GET'])
+@token_required
+def get_media(current_user, asset_id):
+    """حالة ملف الوسائط وروابط نسخه"""
+    asset = MediaAsset.query.get(asset_id)
+    if not asset:
+        return jsonify({'message': 'Media not found'}), 404
+    
+    return jsonify({
+        'media': asset.to_dict(),
+        'urls': media_urls(asset)
+    }), 200
+
+@daily_updates_bp.route('/media/<asset_id>/<variant>', methods=['GET'])
+@scoped_token_required('media')
+def serve_media(current_user, asset_id, variant):
+    """تقديم نسخة من ملف الوسائط مع دعم Range والتخزين المؤقت الطويل"""
+    # وسوم img و video لا ترسل ترويسة Authorization، فيضيف العميل توكن media من /api/auth/access-token
+    asset = MediaAsset.query.get(asset_id)
+    if not asset or variant not in MEDIA_VARIANTS[asset.kind]:
+        return jsonify({'message': 'Media not found'}), 404
+    
+    if not can_view_media(current_user, asset):
+        return jsonify({'message': 'Access denied'}), 403
+    
+    info = asset.variant(variant)
+    if info is None:
+        if asset.status == 'processing':
+            response = jsonify({'message': 'Media is still being processed'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '2'
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        if asset.kind == 'video' and variant == 'thumbnail':
+            # الأصل فيديو لا يعرض في وسم img
+            response = jsonify({'message': 'Thumbnail is not available'})
+            response.status_code = 404
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        # تعذر إنشاء النسخة، نحول إلى الأصل (من نفس النوع) دون تخزين التحويل
+        return redirect(url_for('daily_updates.serve_media', asset_id=asset.id, variant='original',
+                                access_token=request.args.get('access_token')), 307)
+    
+    response = send_file(
+        os.path.abspath(info['path']),
+        mimetype=info['content_type'] or 'application/octet-stream',
+        conditional=True,
+        etag=info['sha256'],
+        max_age=31536000
+    )
+    response.headers['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
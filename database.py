@@ -0,0 +1,85 @@
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.dialects import sqlite, postgresql
+import sqlite3
+import os
+
+# إعدادات SQLite لكل اتصال (WAL يسمح بالقراءة أثناء الكتابة)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # بالمللي ثانية
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # القيمة السالبة بالكيلوبايت
+}
+
+def configure_database(app, default_sqlite_path):
+    """قراءة رابط قاعدة البيانات من البيئة وضبط إعدادات المحرك حسب نوعها"""
+    url = os.environ.get('DATABASE_URL')
+    
+    if not url:
+        os.makedirs(os.path.dirname(default_sqlite_path), exist_ok=True)
+        url = f"sqlite:///{default_sqlite_path}"
+    elif url.startswith('postgres://'):
+        # بعض المنصات ما زالت تستخدم البادئة القديمة التي لا يقبلها SQLAlchemy
+        url = 'postgresql://' + url[len('postgres://'):]
+    
+    # المسح والعدادات تعتمد على upsert، فنرفض عند التشغيل بدلاً من فشل أول مسح
+    backend = make_url(url).get_backend_name()
+    if backend not in UPSERT_INSERTS:
+        raise RuntimeError(f'Unsupported database backend {backend}: DATABASE_URL must be SQLite or PostgreSQL')
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    
+    if not url.startswith('sqlite'):
+        # قواعد البيانات الخادمة: مجموعة اتصالات مع فحص الاتصال قبل الاستخدام
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+        }
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """تطبيق إعدادات SQLite على كل اتصال جديد"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+# عداد الاستعلامات لكل طلب (للتأكد من ثبات عدد الاستعلامات مهما زاد عدد الصفوف)
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+def query_count_header(app):
+    """ترويسة X-Query-Count في وضع التطوير أو مع QUERY_COUNT_HEADER فقط، فلا تكشف تفاصيل التنفيذ في الإنتاج"""
+    @app.before_request
+    def reset_query_count():
+        # g مرتبط بسياق التطبيق وقد يشترك فيه أكثر من طلب
+        g.query_count = 0
+
+    @app.after_request
+    def add_query_count_header(response):
+        if app.debug or app.config.get('QUERY_COUNT_HEADER'):
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+# INSERT ... ON CONFLICT مدعوم في SQLite (3.24 فأحدث) و PostgreSQL
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def upsert(session, table, values, index_elements, set_, where=None):
+    """إدراج صف أو تحديثه عند تعارض المفتاح في أمر واحد، فلا يفشل أول إدراجين متزامنين (where يقيد التحديث)"""
+    # configure_database يرفض غير SQLite و PostgreSQL عند التشغيل
+    statement = UPSERT_INSERTS[session.get_bind().dialect.name](table).values(**values)
+    return session.execute(statement.on_conflict_do_update(index_elements=index_elements, set_=set_, where=where))
@@ -0,0 +1,98 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.models.user import db, LiveEvent
+from src.routes.auth import scoped_token_required
+from src.utils.live_events import scoped_events, latest_event_id, RESCAN_WINDOW
+from datetime import datetime, timedelta
+from sqlalchemy import func
+import click
+import json
+import time
+import os
+
+events_bp = Blueprint('events', __name__)
+
+POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', 1))
+HEARTBEAT_INTERVAL = 15
+# يغلق الاتصال بعدها ويعيد العميل الاتصال تلقائياً بآخر مؤشر
+MAX_STREAM_SECONDS = int(os.environ.get('EVENTS_MAX_STREAM_SECONDS', 300))
+BATCH_SIZE = 200
+
+def format_event(event_id, event_type, data):
+    """تنسيق حدث بصيغة Server-Sent Events"""
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+@events_bp.route('/stream', methods=['GET'])
+@scoped_token_required('events')
+def stream_events(current_user):
+    """بث الأحداث المباشرة (دخول، خروج، تحديث يومي، موافقة) بدءاً من مؤشر الاستئناف
+    
+    EventSource لا يرسل ترويسات، فيمرر توكن events من /api/auth/access-token في access_token
+    ويطلب العميل توكناً جديداً عند رفض إعادة الاتصال (401). قد يتكرر حدث بعد الاستئناف
+    فيتجاهل العميل ما سبق أن طبقه حسب id في البيانات.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    user_id, role = current_user.id, current_user.role
+
+    def generate():
+        position = cursor
+        yield 'retry: 3000\n\n'
+
+        # المعرفات المرسلة ضمن نافذة إعادة الفحص، حتى لا يتكرر الحدث داخل الاتصال نفسه
+        sent = set()
+        if position is None:
+            # بدون مؤشر نبدأ من الآن، واللقطة الكاملة من /attendance/today أو /daily-updates/today
+            position = latest_event_id()
+            sent = {event_id for (event_id,) in scoped_events(user_id, role).with_entities(LiveEvent.id)
+                    .filter(LiveEvent.id > position - RESCAN_WINDOW, LiveEvent.id <= position)}
+        else:
+            # المؤشر أقدم من الأحداث المحفوظة، على العميل إعادة تحميل اللقطة
+            oldest = db.session.query(func.min(LiveEvent.id)).scalar()
+            if oldest is not None and position < oldest - 1:
+                position = latest_event_id()
+                yield format_event(position, 'reset', {'cursor': position})
+        db.session.rollback()
+
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < MAX_STREAM_SECONDS:
+            rows = scoped_events(user_id, role).filter(
+                LiveEvent.id > position - RESCAN_WINDOW
+            ).order_by(LiveEvent.id).limit(RESCAN_WINDOW + BATCH_SIZE).all()
+            # إنهاء المعاملة حتى لا يبقى الاتصال بقاعدة البيانات محجوزاً بين الدورات
+            db.session.rollback()
+
+            events = [event for event in rows if event.id not in sent]
+            for event in events:
+                sent.add(event.id)
+                # حدث متأخر بمعرف أصغر لا يرجع المؤشر، فيبقى Last-Event-ID أكبر معرف مرسل
+                position = max(position, event.id)
+                yield format_event(position, event.event_type, event.to_dict())
+            sent = {event_id for event_id in sent if event_id > position - RESCAN_WINDOW}
+
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= HEARTBEAT_INTERVAL:
+                last_sent = now
+                yield ': keep-alive\n\n'
+
+            if len(rows) < RESCAN_WINDOW + BATCH_SIZE:
+                time.sleep(POLL_INTERVAL)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # تعطيل التخزين المؤقت في nginx
+    return response
+
+@events_bp.cli.command('prune')
+@click.option('--hours', default=48, help='Delete live events older than this many hours')
+def prune_live_events(hours):
+    """حذف الأحداث القديمة (العملاء المتأخرون يتلقون reset ويعيدون تحميل اللقطة)"""
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    deleted = LiveEvent.query.filter(LiveEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {deleted} live events')
@@ -0,0 +1,29 @@
+from src.models.user import db, LiveEvent
+from sqlalchemy import func
+import os
+
+def publish_event(event_type, child, payload):
+    """إضافة حدث مباشر إلى الجلسة الحالية (يحفظ مع نفس المعاملة)"""
+    event = LiveEvent(
+        event_type=event_type,
+        child_id=child.id,
+        parent_id=child.parent_id,
+        payload=payload
+    )
+    db.session.add(event)
+    return event
+
+# المعرفات تحجز عند الإدراج لا عند الحفظ: معاملة بدأت قبل أخرى قد تحفظ حدثاً بمعرف أصغر
+# من مؤشر أرسل مسبقاً، لذلك يعيد البث فحص آخر RESCAN_WINDOW معرفاً قبل المؤشر (والعميل يتجاهل المكرر حسب id)
+RESCAN_WINDOW = int(os.environ.get('EVENTS_RESCAN_WINDOW', 100))
+
+def latest_event_id():
+    """آخر مؤشر أحداث، يرسل مع اللقطة الكاملة ليبدأ العميل البث منه (مع نافذة إعادة الفحص)"""
+    return db.session.query(func.max(LiveEvent.id)).scalar() or 0
+
+def scoped_events(user_id, role):
+    """الأحداث التي يحق للمستخدم رؤيتها (ولي الأمر يرى أطفاله فقط)"""
+    query = LiveEvent.query
+    if role == 'parent':
+        query = query.filter(LiveEvent.parent_id == user_id)
+    return query
@@ -3,15 +3,26 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
-from src.models.user import db
+from src.models.user import db, upgrade_schema
+from src.utils.database import configure_database, query_count_header
+from src.utils.storage import StreamingUploadRequest
+from src.utils.static_assets import StaticManifest
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.children import children_bp
 from src.routes.registration import registration_bp
+from src.routes.attendance import attendance_bp
+from src.routes.daily_updates import daily_updates_bp
+from src.routes.notifications import notifications_bp
+from src.routes.events import events_bp
+from src.routes.parents import parents_bp
+from src.routes.search import search_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+# الملفات المرفوعة تكتب مباشرة إلى مخزن الملفات مع حساب البصمة أثناء القراءة
+app.request_class = StreamingUploadRequest
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # تمكين CORS للسماح بالطلبات من الواجهة الأمامية
@@ -22,30 +33,42 @@ app.register_blueprint(user_bp, url_prefix='/api/users')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(children_bp, url_prefix='/api/children')
 app.register_blueprint(registration_bp, url_prefix='/api/registration')
+app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
+app.register_blueprint(daily_updates_bp, url_prefix='/api/daily-updates')
+app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+app.register_blueprint(events_bp, url_prefix='/api/events')
+app.register_blueprint(parents_bp, url_prefix='/api/parents')
+app.register_blueprint(search_bp, url_prefix='/api/search')
 
 # إعداد قاعدة البيانات
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# DATABASE_URL من البيئة، وإلا ملف SQLite المحلي
+configure_database(app, os.path.join(os.path.dirname(__file__), 'database', 'app.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 with app.app_context():
     db.create_all()
+    upgrade_schema()
+
+# عدد الاستعلامات لكل طلب في ترويسة X-Query-Count (مع debug أو QUERY_COUNT_HEADER=1)
+app.config['QUERY_COUNT_HEADER'] = os.environ.get('QUERY_COUNT_HEADER') == '1'
+query_count_header(app)
+
+# فهرس الملفات الثابتة يبنى مرة واحدة (أعد التشغيل بعد تغيير الواجهة)
+static_manifest = StaticManifest(app.static_folder).build()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if app.static_folder is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    asset = static_manifest.get(path) if path != "" else None
+    if asset is None:
+        asset = static_manifest.get('index.html')
+        if asset is None:
             return "index.html not found", 404
+    return static_manifest.respond(asset)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.storage import blob_store
+import subprocess
+import tempfile
+import shutil
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # اختياري، بدونه تقدم الصور الأصلية فقط
+    Image = None
+
+FFMPEG = shutil.which(os.environ.get('FFMPEG_BINARY', 'ffmpeg'))
+RENDER_TIMEOUT = int(os.environ.get('MEDIA_RENDER_TIMEOUT', 300))
+
+# أقصى بعد (بالبكسل) لكل نسخة
+IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'preview': 1280
+}
+VIDEO_THUMBNAIL_SIZE = 640
+VIDEO_PREVIEW_HEIGHT = 720
+
+MEDIA_VARIANTS = {
+    'image': ('original', 'thumbnail', 'preview'),
+    'video': ('original', 'thumbnail', 'preview')
+}
+
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'm4v', 'webm', '3gp'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic'}
+
+# عمليات التحويل تعمل في الخلفية حتى لا يتأخر رد الرفع
+media_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('MEDIA_WORKERS', 2)),
+    thread_name_prefix='media'
+)
+
+def media_kind(content_type, filename):
+    """تحديد نوع الوسائط (صورة أو فيديو) من نوع المحتوى أو الامتداد"""
+    content_type = (content_type or '').lower()
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in (filename or '') else ''
+    if content_type.startswith('image/') or extension in IMAGE_EXTENSIONS:
+        return 'image'
+    if content_type.startswith('video/') or extension in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+def _temp_path(suffix):
+    os.makedirs(blob_store.tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=blob_store.tmp_dir, suffix=suffix)
+    os.close(fd)
+    return path
+
+def _store(path, content_type):
+    """نقل النسخة الناتجة إلى مخزن الملفات"""
+    sha256, size, storage_path = blob_store.save_file(path)
+    return {
+        'path': storage_path,
+        'sha256': sha256,
+        'size': size,
+        'content_type': content_type
+    }
+
+def _render_image(source, max_side):
+    if Image is None:
+        return None
+    path = _temp_path('.jpg')
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((max_side, max_side))
+            image.save(path, 'JPEG', quality=82, optimize=True, progressive=True)
+        return _store(path, 'image/jpeg')
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _ffmpeg(*args):
+    subprocess.run(
+        [FFMPEG, '-y', '-loglevel', 'error', *args],
+        check=True, timeout=RENDER_TIMEOUT,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+def _render_video_thumbnail(source):
+    if FFMPEG is None:
+        return None
+    path = _temp_path('.jpg')
+    try:
+        _ffmpeg('-ss', '1', '-i', source, '-frames:v', '1',
+                '-vf', f'scale={VIDEO_THUMBNAIL_SIZE}:{VIDEO_THUMBNAIL_SIZE}:force_original_aspect_ratio=decrease',
+                path)
+        return _store(path, 'image/jpeg')
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _render_video_preview(source):
+    if FFMPEG is None:
+        return None
+    path = _temp_path('.mp4')
+    try:
+        # faststart يضع الفهرس في بداية الملف ليبدأ التشغيل والتقديم قبل اكتمال التحميل
+        _ffmpeg('-i', source, '-vf', f'scale=-2:min({VIDEO_PREVIEW_HEIGHT}\\,ih)',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+                '-c:a', 'aac', '-b:a', '96k', '-movflags', '+faststart', path)
+        return _store(path, 'video/mp4')
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def render_variants(kind, source):
+    """إنشاء النسخ المصغرة، ويعيد قاموساً بالنسخ التي أمكن إنشاؤها فقط"""
+    if kind == 'image':
+        renderers = {name: (lambda size=size: _render_image(source, size)) for name, size in IMAGE_VARIANTS.items()}
+    else:
+        renderers = {
+            'thumbnail': lambda: _render_video_thumbnail(source),
+            'preview': lambda: _render_video_preview(source)
+        }
+
+    variants = {}
+    for name, render in renderers.items():
+        try:
+            variant = render()
+        except Exception:
+            # فشل نسخة لا يمنع بقية النسخ، ويقدم الأصل بدلاً منها
+            variant = None
+        if variant:
+            variants[name] = variant
+    return variants
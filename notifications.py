@@ -0,0 +1,57 @@
+from flask import Blueprint, jsonify
+from src.models.user import db, NotificationOutbox
+from src.routes.auth import token_required, admin_required
+from src.utils.outbox import drain_outbox, get_transport, BATCH_SIZE
+from sqlalchemy import func
+import click
+import time
+
+notifications_bp = Blueprint('notifications', __name__)
+
+@notifications_bp.route('/outbox/stats', methods=['GET'])
+@token_required
+@admin_required
+def get_outbox_stats(current_user):
+    """عدد الإشعارات حسب الحالة وأقدم إشعار لم يرسل (الإدارة فقط)"""
+    try:
+        counts = dict(db.session.query(
+            NotificationOutbox.status, func.count(NotificationOutbox.id)
+        ).group_by(NotificationOutbox.status).all())
+
+        oldest_pending = db.session.query(func.min(NotificationOutbox.created_at)).filter(
+            NotificationOutbox.status.in_(['pending', 'sending'])
+        ).scalar()
+
+        return jsonify({
+            'pending': counts.get('pending', 0),
+            'sending': counts.get('sending', 0),
+            'sent': counts.get('sent', 0),
+            'dead': counts.get('dead', 0),
+            'oldest_pending': oldest_pending.isoformat() if oldest_pending else None
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Failed to get outbox stats: {str(e)}'}), 500
+
+@notifications_bp.cli.command('worker')
+@click.option('--transport', default=None, help='log or file:<path> (defaults to NOTIFICATION_TRANSPORT)')
+@click.option('--batch-size', default=BATCH_SIZE, help='Parents notified per batch')
+@click.option('--interval', default=5.0, help='Seconds to sleep when the outbox is empty')
+@click.option('--once', is_flag=True, help='Drain what is due and exit')
+def run_notification_worker(transport, batch_size, interval, once):
+    """عامل منفصل يرسل إشعارات أولياء الأمور من جدول outbox"""
+    transport = get_transport(transport)
+    while True:
+        try:
+            sent, retried, dead = drain_outbox(transport, batch_size)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f'Outbox drain failed: {e}', err=True)
+            sent = retried = dead = 0
+        if sent or retried or dead:
+            click.echo(f'Sent {sent}, retrying {retried}, dead {dead}')
+        if once:
+            break
+        # دفعة ممتلئة تعني أن هناك المزيد، فنكمل دون انتظار
+        if sent + retried + dead == 0:
+            time.sleep(interval)
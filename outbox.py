@@ -0,0 +1,149 @@
+from src.models.user import db, NotificationOutbox
+from sqlalchemy import and_, or_
+from datetime import datetime, timedelta
+from itertools import groupby
+import logging
+import random
+import json
+import os
+
+logger = logging.getLogger('notifications')
+
+# الأحداث المتتالية لنفس ولي الأمر خلال هذه المدة ترسل في إشعار واحد
+COALESCE_WINDOW = int(os.environ.get('NOTIFICATION_COALESCE_SECONDS', 30))
+BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 100))
+MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 8))
+RETRY_BASE = int(os.environ.get('NOTIFICATION_RETRY_BASE_SECONDS', 30))
+RETRY_MAX = int(os.environ.get('NOTIFICATION_RETRY_MAX_SECONDS', 3600))
+# مدة حجز الدفعة لعامل واحد، يجب أن تتجاوز أطول مدة إرسال متوقعة
+LEASE_SECONDS = int(os.environ.get('NOTIFICATION_LEASE_SECONDS', 300))
+
+def enqueue_notification(parent_id, child_id, event_type, payload):
+    """إضافة إشعار إلى الجلسة الحالية (يحفظ مع نفس المعاملة)"""
+    now = datetime.utcnow()
+    notification = NotificationOutbox(
+        parent_id=parent_id,
+        child_id=child_id,
+        event_type=event_type,
+        payload=payload,
+        created_at=now,
+        available_at=now + timedelta(seconds=COALESCE_WINDOW)
+    )
+    db.session.add(notification)
+    return notification
+
+def retry_delay(attempts):
+    """تأخير أسي مع عشوائية بسيطة حتى لا تتزامن المحاولات"""
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+class LogTransport:
+    """إرسال الإشعارات إلى السجل (للتطوير والاختبار)"""
+
+    def send(self, parent_id, events):
+        logger.info('Notify parent %s: %s', parent_id, json.dumps(events, ensure_ascii=False))
+
+class FileTransport:
+    """إلحاق كل إشعار كسطر JSON في ملف"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, parent_id, events):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps({
+            'parent_id': parent_id,
+            'sent_at': datetime.utcnow().isoformat(),
+            'events': events
+        }, ensure_ascii=False)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+def get_transport(spec=None):
+    """اختيار طريقة الإرسال من NOTIFICATION_TRANSPORT (log أو file:<path>)"""
+    spec = spec or os.environ.get('NOTIFICATION_TRANSPORT', 'log')
+    if spec.startswith('file:'):
+        return FileTransport(spec[len('file:'):])
+    if spec == 'log':
+        return LogTransport()
+    raise ValueError(f'Unknown notification transport: {spec}')
+
+def claim_outbox(batch_size=BATCH_SIZE, now=None):
+    """حجز دفعة من الإشعارات المستحقة (status=sending حتى انتهاء المهلة) وحفظ الحجز قبل أي إرسال"""
+    now = now or datetime.utcnow()
+    # المحجوز الذي انتهت مهلته توقف عامله قبل إنهائه، فيعاد حجزه
+    claimable = or_(
+        NotificationOutbox.status == 'pending',
+        and_(NotificationOutbox.status == 'sending', NotificationOutbox.available_at <= now)
+    )
+
+    # أولياء الأمور الذين لديهم إشعار مستحق
+    parent_ids = [parent_id for (parent_id,) in db.session.query(NotificationOutbox.parent_id).filter(
+        claimable,
+        NotificationOutbox.available_at <= now
+    ).distinct().limit(batch_size).all()]
+    if not parent_ids:
+        db.session.commit()
+        return []
+
+    # نضم الأحداث الأحدث لنفس ولي الأمر حتى لو لم تستحق بعد، فترسل كلها في إشعار واحد
+    rows = NotificationOutbox.query.filter(
+        claimable,
+        NotificationOutbox.parent_id.in_(parent_ids)
+    ).order_by(NotificationOutbox.parent_id, NotificationOutbox.id).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for parent_id, group in groupby(rows, key=lambda row: row.parent_id):
+        group = list(group)
+        # محاولة فاشلة سابقة تؤجل المجموعة كلها حتى موعد إعادة المحاولة
+        if any(row.attempts and row.available_at > now for row in group):
+            continue
+        claimed.append((parent_id, [row.id for row in group], max(row.attempts for row in group),
+                        [row.to_dict() for row in group]))
+
+    claimed_ids = [row_id for _, ids, _, _ in claimed for row_id in ids]
+    if claimed_ids:
+        NotificationOutbox.query.filter(NotificationOutbox.id.in_(claimed_ids)).update({
+            'status': 'sending',
+            'available_at': now + timedelta(seconds=LEASE_SECONDS)
+        }, synchronize_session=False)
+    # الحفظ يحرر أقفال الصفوف، والعمال الآخرون يتجاوزون المحجوز حتى انتهاء المهلة
+    db.session.commit()
+    return claimed
+
+def drain_outbox(transport, batch_size=BATCH_SIZE, now=None):
+    """إرسال دفعة من الإشعارات المستحقة مجمعة حسب ولي الأمر، ويعيد (المرسلة، المؤجلة، المتوقفة)"""
+    now = now or datetime.utcnow()
+
+    sent = retried = dead = 0
+    for parent_id, ids, attempts, events in claim_outbox(batch_size, now):
+        # شرط sending حتى لا نغير صفوفاً أعاد عامل آخر حجزها بعد انتهاء المهلة
+        outbox = NotificationOutbox.query.filter(
+            NotificationOutbox.id.in_(ids),
+            NotificationOutbox.status == 'sending'
+        )
+        try:
+            transport.send(parent_id, events)
+        except Exception as e:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                outbox.update({'status': 'dead', 'attempts': attempts, 'last_error': str(e)}, synchronize_session=False)
+                dead += len(ids)
+            else:
+                outbox.update({
+                    'status': 'pending',
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'available_at': now + retry_delay(attempts)
+                }, synchronize_session=False)
+                retried += len(ids)
+            logger.warning('Failed to notify parent %s: %s', parent_id, e)
+        else:
+            outbox.update({'status': 'sent', 'sent_at': now}, synchronize_session=False)
+            sent += len(ids)
+        # الحفظ بعد كل ولي أمر حتى لا يعاد إرسال ما أرسل إن توقف العامل
+        db.session.commit()
+
+    return sent, retried, dead
@@ -0,0 +1,88 @@
+from flask import request
+from sqlalchemy import and_, or_
+from datetime import datetime, date
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+class InvalidCursor(ValueError):
+    """مؤشر صفحة غير صالح"""
+
+def get_page_args(default_limit=DEFAULT_LIMIT):
+    """قراءة معاملات limit و cursor من الطلب"""
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_LIMIT))
+    return limit, request.args.get('cursor') or None
+
+def encode_cursor(values):
+    """تحويل قيم آخر صف إلى مؤشر مبهم"""
+    values = [value.isoformat() if isinstance(value, (datetime, date)) else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, types):
+    """استرجاع قيم المؤشر وتحويلها إلى أنواع الأعمدة"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor(cursor)
+        decoded = []
+        for value, python_type in zip(values, types):
+            if value is not None and python_type in (datetime, date):
+                value = python_type.fromisoformat(value)
+            elif value is not None and python_type in (int, str) and type(value) is not python_type:
+                # قيمة من نوع آخر تقارن بالعمود نصياً فتعطي صفحة خاطئة بصمت
+                raise InvalidCursor(cursor)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+def _column_types(columns):
+    return [column.property.columns[0].type.python_type for column in columns]
+
+def _after(columns, values, descending):
+    """شرط (c1, c2, ...) > (v1, v2, ...) أو أصغر منه عند الترتيب التنازلي"""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+def paginate(query, columns, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """ترقيم الصفحات بالمفاتيح (keyset) على أعمدة مفهرسة، آخر عمود يجب أن يكون فريداً"""
+    if cursor:
+        values = decode_cursor(cursor, _column_types(columns))
+        query = query.filter(_after(columns, values, descending))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    items = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+
+    return items, next_cursor
+
+def paginate_sorted(items, key, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """ترقيم قائمة في الذاكرة مرتبة حسب key (يعيد صفوفاً بقيم مفاتيح نصية أو رقمية)"""
+    items = sorted(items, key=key, reverse=descending)
+
+    if cursor:
+        values = tuple(decode_cursor(cursor, [None] * len(key(items[0])))) if items else ()
+        if descending:
+            items = [item for item in items if key(item) < values]
+        else:
+            items = [item for item in items if key(item) > values]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(list(key(items[-1])))
+
+    return items, next_cursor
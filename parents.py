@@ -0,0 +1,109 @@
+from flask import Blueprint, request, jsonify
+from src.models.user import db, User, Child, ChildPresence, DailyUpdate, LiveEvent, local_today
+from src.routes.auth import token_required
+from src.utils.cache import TTLCache
+from src.utils.serialization import RowSerializer, prefixed, json_response
+from sqlalchemy import func
+import hashlib
+import os
+
+parents_bp = Blueprint('parents', __name__)
+
+# الردود الجاهزة حسب (ولي الأمر، الإصدار)، والإصدار يتغير مع أي مسح أو تحديث لأطفاله
+feed_cache = TTLCache(
+    maxsize=int(os.environ.get('PARENT_FEED_CACHE_SIZE', 2048)),
+    ttl=int(os.environ.get('PARENT_FEED_CACHE_TTL', 300))
+)
+
+def feed_version(parent_id, today):
+    """إصدار الصفحة الرئيسية لولي الأمر في استعلام واحد: آخر حدث لأطفاله وآخر تعديل على بياناتهم"""
+    last_event_id, last_child_update = db.session.query(
+        db.session.query(func.max(LiveEvent.id)).filter(LiveEvent.parent_id == parent_id).scalar_subquery(),
+        db.session.query(func.max(Child.updated_at)).filter(Child.parent_id == parent_id).scalar_subquery()
+    ).one()
+    last_event_id = last_event_id or 0
+    raw = f'{parent_id}:{today.isoformat()}:{last_event_id}:{last_child_update}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24], last_event_id
+
+@parents_bp.route('/me/feed', methods=['GET'])
+@token_required
+def get_my_feed(current_user):
+    """الصفحة الرئيسية لولي الأمر: الأطفال وحالة حضورهم وتحديثات اليوم في طلب واحد"""
+    try:
+        if current_user.role != 'parent':
+            return jsonify({'message': 'Only parents can view the feed'}), 403
+
+        today = local_today()
+        etag, last_event_id = feed_version(current_user.id, today)
+
+        # لم يتغير شيء منذ آخر طلب
+        if request.if_none_match.contains(etag):
+            response = json_response({})
+            response.status_code = 304
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        payload = feed_cache.get((current_user.id, etag))
+        if payload is None:
+            payload = build_feed(current_user.id, today, last_event_id)
+            feed_cache.set((current_user.id, etag), payload)
+
+        response = json_response(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+
+    except Exception as e:
+        return jsonify({'message': f'Failed to get feed: {str(e)}'}), 500
+
+def build_feed(parent_id, today, last_event_id):
+    """بناء الصفحة باستعلامين: الأطفال مع حالتهم، وتحديثات اليوم مع الموظفين"""
+    child_row = RowSerializer(Child.dict_columns())
+    update_row = RowSerializer(DailyUpdate.dict_columns())
+    staff_row = RowSerializer(User.dict_columns())
+
+    child_rows = db.session.query(
+        *Child.dict_columns(),
+        ChildPresence.status,
+        ChildPresence.day,
+        ChildPresence.last_action_time
+    ).outerjoin(ChildPresence, ChildPresence.child_id == Child.id)\
+        .filter(Child.parent_id == parent_id, Child.is_active == True)\
+        .order_by(Child.id).all()
+
+    children = []
+    children_by_id = {}
+    for row in child_rows:
+        presence_status, presence_day, presence_time = row[child_row.width:]
+        child = child_row(row[:child_row.width])
+        if presence_day == today:
+            child['current_status'] = 'present' if presence_status == 'check_in' else 'absent'
+            child['last_action_time'] = presence_time.isoformat()
+        else:
+            child['current_status'] = 'absent'
+            child['last_action_time'] = None
+        child['updates'] = []
+        children.append(child)
+        children_by_id[child['id']] = child
+
+    if children_by_id:
+        update_rows = db.session.query(*DailyUpdate.dict_columns(), *prefixed(User.dict_columns(), 'staff_'))\
+            .join(User, DailyUpdate.staff_id == User.id)\
+            .filter(DailyUpdate.child_id.in_(children_by_id.keys()), DailyUpdate.day == today)\
+            .order_by(DailyUpdate.created_at.desc(), DailyUpdate.id.desc()).all()
+
+        for row in update_rows:
+            update = update_row(row[:update_row.width])
+            update['staff'] = staff_row(row[update_row.width:])
+            children_by_id[update['child_id']]['updates'].append(update)
+
+    for child in children:
+        child['updates_count'] = len(child['updates'])
+
+    return {
+        'date': today.isoformat(),
+        'children': children,
+        'present_count': sum(1 for child in children if child['current_status'] == 'present'),
+        'events_cursor': last_event_id
+    }
@@ -1,32 +1,70 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from sqlalchemy import or_
 import uuid
 import os
+import json
+import click
 from werkzeug.utils import secure_filename
+from src.models.user import db, Registration, RegistrationFile, UploadSession, RegistrationDailyCount, RegistrationStatusCount
+from src.utils.storage import upload_limits, store_upload, blob_store, partial_path, append_chunk, chunk_lock, ChunkInProgress, ChecksumMismatch
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_content_range_header
+from collections import Counter
+from src.utils.pagination import get_page_args, paginate, InvalidCursor
+from src.utils.text import normalize_arabic, normalize_phone, normalize_email
+from src.utils.database import upsert
+from src.routes.auth import token_required
 
 registration_bp = Blueprint('registration', __name__)
 
-# مجلد لحفظ الملفات المرفوعة
-UPLOAD_FOLDER = 'uploads/registrations'
+# حدود حجم الملفات المرفوعة
+MAX_FILE_SIZE = int(os.environ.get('REGISTRATION_MAX_FILE_SIZE', 10 * 1024 * 1024))
+MAX_REQUEST_SIZE = int(os.environ.get('REGISTRATION_MAX_REQUEST_SIZE', 30 * 1024 * 1024))
+# الحد الأقصى لكل دفعة في الرفع القابل للاستئناف
+UPLOAD_CHUNK_SIZE = int(os.environ.get('REGISTRATION_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+# الملف المستخدم سابقاً لتخزين الطلبات (للاستيراد فقط)
+REGISTRATIONS_FILE = 'data/registrations.json'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def ensure_upload_folder():
-    """التأكد من وجود مجلد الرفع"""
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
+def generate_registration_number():
+    """توليد رقم تسجيل غير مستخدم"""
+    while True:
+        registration_number = f"BK-{str(uuid.uuid4())[:6].upper()}"
+        if not Registration.query.filter_by(registration_number=registration_number).first():
+            return registration_number
+
+def bump_counter(model, key, delta=1):
+    """تحديث عداد إحصائيات ضمن المعاملة الحالية (upsert حتى لا يتعارض أول طلبين متزامنين في اليوم أو الحالة)"""
+    table = model.__table__
+    key_name = model.__mapper__.primary_key[0].key
+    upsert(db.session, table, {key_name: key, 'count': delta}, [key_name], {'count': table.c.count + delta})
+
+def rebuild_registration_counters():
+    """إعادة حساب عدادات الإحصائيات من جميع الطلبات"""
+    by_day = Counter()
+    by_status = Counter()
+    for submitted_at, status in db.session.query(Registration.submission_date, Registration.status).yield_per(1000):
+        by_day[submitted_at.date()] += 1
+        by_status[status or 'pending_review'] += 1
+    
+    RegistrationDailyCount.query.delete()
+    RegistrationStatusCount.query.delete()
+    db.session.add_all(RegistrationDailyCount(day=day, count=count) for day, count in by_day.items())
+    db.session.add_all(RegistrationStatusCount(status=status, count=count) for status, count in by_status.items())
+    return sum(by_status.values())
 
 @registration_bp.route('/api/registration/submit', methods=['POST'])
+@upload_limits(MAX_REQUEST_SIZE, MAX_FILE_SIZE)
 def submit_registration():
     """استقبال طلب تسجيل طفل جديد"""
     try:
-        ensure_upload_folder()
-        
         # إنشاء رقم تسجيل فريد
-        registration_number = f"BK-{str(uuid.uuid4())[:6].upper()}"
+        registration_number = generate_registration_number()
         
         # استخراج البيانات من النموذج
         data = {}
@@ -47,30 +85,51 @@ def submit_registration():
         data['email'] = request.form.get('email', '')
         data['address'] = request.form.get('address', '')
         
-        # معالجة الملفات المرفوعة
+        # معالجة الملفات المرفوعة (كتبت إلى القرص أثناء قراءة الطلب، والمتطابقة تخزن مرة واحدة)
         uploaded_files = []
         for file_key in request.files:
             file = request.files[file_key]
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # إضافة timestamp لتجنب تضارب الأسماء
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{registration_number}_{timestamp}_{filename}"
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(file_path)
-                uploaded_files.append({
-                    'original_name': file.filename,
-                    'saved_name': filename,
-                    'file_path': file_path,
-                    'file_type': file_key
-                })
-        
-        # إنشاء سجل التسجيل
-        registration_record = {
-            'registration_number': registration_number,
-            'submission_date': datetime.now().isoformat(),
-            'status': 'pending_review',  # قيد المراجعة
-            'child_data': {
+                sha256, size, storage_path = store_upload(file, MAX_FILE_SIZE)
+                uploaded_files.append(RegistrationFile(
+                    file_type=file_key,
+                    original_name=secure_filename(file.filename) or file.filename,
+                    content_type=file.mimetype,
+                    size=size,
+                    sha256=sha256,
+                    storage_path=storage_path
+                ))
+        
+        # الملفات المرفوعة مسبقاً عبر جلسات الرفع القابلة للاستئناف
+        upload_ids = {upload_id.strip() for value in request.form.getlist('upload_ids')
+                      for upload_id in value.split(',') if upload_id.strip()}
+        if upload_ids:
+            uploads = UploadSession.query.filter(
+                UploadSession.id.in_(upload_ids),
+                UploadSession.status == 'complete'
+            ).all()
+            if len(uploads) != len(upload_ids):
+                return jsonify({
+                    'success': False,
+                    'message': 'بعض الملفات المرفوعة غير موجودة أو لم يكتمل رفعها'
+                }), 400
+            for upload in uploads:
+                uploaded_files.append(RegistrationFile(
+                    file_type=upload.file_type,
+                    original_name=upload.original_name,
+                    content_type=upload.content_type,
+                    size=upload.total_size,
+                    sha256=upload.sha256,
+                    storage_path=upload.storage_path
+                ))
+                upload.status = 'attached'
+        
+        # إنشاء سجل التسجيل وحفظه في معاملة واحدة
+        registration = Registration(
+            registration_number=registration_number,
+            submission_date=datetime.now(),
+            status='pending_review',  # قيد المراجعة
+            child_data={
                 'name': data['child_name'],
                 'birth_date': data['birth_date'],
                 'age': data['age'],
@@ -78,7 +137,7 @@ def submit_registration():
                 'nationality': data['nationality'],
                 'birth_place': data['birth_place']
             },
-            'parent_data': {
+            parent_data={
                 'name': data['parent_name'],
                 'relationship': data['relationship'],
                 'phone': data['phone_number'],
@@ -86,34 +145,14 @@ def submit_registration():
                 'email': data['email'],
                 'address': data['address']
             },
-            'uploaded_files': uploaded_files,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
-        
-        # حفظ السجل في ملف JSON مؤقت (يمكن استبداله بقاعدة بيانات لاحقاً)
-        import json
-        registrations_file = 'data/registrations.json'
+            uploaded_files=[],
+            files=uploaded_files
+        )
         
-        # التأكد من وجود مجلد البيانات
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        
-        # قراءة السجلات الموجودة أو إنشاء قائمة جديدة
-        registrations = []
-        if os.path.exists(registrations_file):
-            try:
-                with open(registrations_file, 'r', encoding='utf-8') as f:
-                    registrations = json.load(f)
-            except:
-                registrations = []
-        
-        # إضافة السجل الجديد
-        registrations.append(registration_record)
-        
-        # حفظ السجلات المحدثة
-        with open(registrations_file, 'w', encoding='utf-8') as f:
-            json.dump(registrations, f, ensure_ascii=False, indent=2)
+        db.session.add(registration)
+        bump_counter(RegistrationDailyCount, registration.submission_date.date())
+        bump_counter(RegistrationStatusCount, registration.status)
+        db.session.commit()
         
         # إرسال استجابة النجاح
         return jsonify({
@@ -121,7 +160,7 @@ def submit_registration():
             'message': 'تم إرسال طلب التسجيل بنجاح',
             'registration_number': registration_number,
             'status': 'pending_review',
-            'submission_date': registration_record['submission_date'],
+            'submission_date': registration.submission_date.isoformat(),
             'ticket_data': {
                 'registration_number': registration_number,
                 'child_name': data['child_name'],
@@ -139,66 +178,349 @@ def submit_registration():
             }
         }), 200
         
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'حجم الملف يتجاوز الحد المسموح ({MAX_FILE_SIZE // (1024 * 1024)} ميجابايت لكل ملف)'
+        }), 413
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': f'حدث خطأ أثناء معالجة الطلب: {str(e)}'
         }), 500
 
+def upload_offset_response(upload, status_code=200, message=None):
+    """رد بحالة جلسة الرفع مع الموضع الحالي في ترويسة Upload-Offset"""
+    payload = {'success': status_code < 400, **upload.to_dict()}
+    if message:
+        payload['message'] = message
+    response = jsonify(payload)
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(upload.received_size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@registration_bp.route('/api/registration/uploads', methods=['POST'])
+def create_upload_session():
+    """بدء جلسة رفع ملف على دفعات (يمكن استئنافها بعد انقطاع الاتصال)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename', '')
+        total_size = data.get('size')
+        
+        if not filename or not allowed_file(filename):
+            return jsonify({
+                'success': False,
+                'message': 'نوع الملف غير مسموح'
+            }), 400
+        
+        if not isinstance(total_size, int) or total_size <= 0:
+            return jsonify({
+                'success': False,
+                'message': 'حجم الملف مطلوب'
+            }), 400
+        
+        if total_size > MAX_FILE_SIZE:
+            return jsonify({
+                'success': False,
+                'message': f'حجم الملف يتجاوز الحد المسموح ({MAX_FILE_SIZE // (1024 * 1024)} ميجابايت لكل ملف)'
+            }), 413
+        
+        upload = UploadSession(
+            file_type=data.get('file_type'),
+            original_name=secure_filename(filename) or filename,
+            content_type=data.get('content_type'),
+            total_size=total_size
+        )
+        db.session.add(upload)
+        db.session.commit()
+        
+        response = upload_offset_response(upload, 201)
+        response.headers['Location'] = f'{request.path}/{upload.id}'
+        response.headers['Upload-Chunk-Size'] = str(UPLOAD_CHUNK_SIZE)
+        return response
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ أثناء إنشاء جلسة الرفع: {str(e)}'
+        }), 500
+
+@registration_bp.route('/api/registration/uploads/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """الاستعلام عن عدد البايتات المستلمة لاستئناف الرفع (يدعم HEAD أيضاً)"""
+    upload = UploadSession.query.get(upload_id)
+    if not upload:
+        return jsonify({
+            'success': False,
+            'message': 'جلسة الرفع غير موجودة'
+        }), 404
+    
+    return upload_offset_response(upload)
+
+@registration_bp.route('/api/registration/uploads/<upload_id>', methods=['PUT'])
+@upload_limits(UPLOAD_CHUNK_SIZE, UPLOAD_CHUNK_SIZE)
+def upload_chunk(upload_id):
+    """استقبال دفعة من الملف، ترويسة Content-Range يجب أن تبدأ من آخر بايت مستلم"""
+    try:
+        upload = UploadSession.query.get(upload_id)
+        if not upload:
+            return jsonify({
+                'success': False,
+                'message': 'جلسة الرفع غير موجودة'
+            }), 404
+        
+        if upload.status != 'uploading':
+            return upload_offset_response(upload, 409, 'اكتمل رفع هذا الملف')
+        
+        content_range = parse_content_range_header(request.headers.get('Content-Range'))
+        if (content_range is None or content_range.units != 'bytes'
+                or content_range.length != upload.total_size
+                or request.content_length != content_range.stop - content_range.start):
+            return upload_offset_response(upload, 400, 'ترويسة Content-Range غير صالحة')
+        
+        if content_range.stop > upload.total_size:
+            return upload_offset_response(upload, 400, 'الدفعة تتجاوز حجم الملف')
+        
+        # دفعتان بنفس الموضع (مثل إعادة محاولة والطلب الأول ما زال جارياً) لا تكتبان معاً
+        with chunk_lock(partial_path(upload.id)):
+            # قراءة الموضع بعد أخذ القفل، فقد تكون دفعة سابقة انتهت للتو
+            db.session.refresh(upload)
+            if upload.status != 'uploading':
+                return upload_offset_response(upload, 409, 'اكتمل رفع هذا الملف')
+            if content_range.start != upload.received_size:
+                return upload_offset_response(upload, 409, 'يجب أن تبدأ الدفعة من آخر بايت مستلم')
+            
+            written = append_chunk(partial_path(upload.id), content_range.start, request.stream)
+            
+            # تحديث مشروط: لا يقبل إلا إذا لم يتغير الموضع منذ قراءته
+            claimed = UploadSession.query.filter(
+                UploadSession.id == upload.id,
+                UploadSession.received_size == content_range.start
+            ).update({'received_size': content_range.start + written}, synchronize_session=False)
+            if not claimed:
+                db.session.rollback()
+                return upload_offset_response(upload, 409, 'يجب أن تبدأ الدفعة من آخر بايت مستلم')
+            db.session.commit()
+        
+        return upload_offset_response(upload)
+        
+    except ChunkInProgress:
+        db.session.rollback()
+        return upload_offset_response(upload, 409, 'دفعة أخرى قيد الرفع لهذا الملف')
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'حجم الدفعة يتجاوز الحد المسموح ({UPLOAD_CHUNK_SIZE} بايت)'
+        }), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ أثناء رفع الملف: {str(e)}'
+        }), 500
+
+@registration_bp.route('/api/registration/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """إنهاء الرفع ونقل الملف إلى المخزن، مع التحقق من البصمة إن أرسلت"""
+    try:
+        upload = UploadSession.query.get(upload_id)
+        if not upload:
+            return jsonify({
+                'success': False,
+                'message': 'جلسة الرفع غير موجودة'
+            }), 404
+        
+        if upload.status != 'uploading':
+            return upload_offset_response(upload)
+        
+        data = request.get_json(silent=True) or {}
+        
+        # نفس قفل الدفعات: لا تكتب دفعة في الملف أثناء التحقق من بصمته ونقله
+        with chunk_lock(partial_path(upload.id)):
+            db.session.refresh(upload)
+            if upload.status != 'uploading':
+                return upload_offset_response(upload)
+            if upload.received_size != upload.total_size:
+                return upload_offset_response(upload, 409, 'لم يكتمل رفع الملف')
+            
+            try:
+                sha256, size, storage_path = blob_store.save_file(
+                    partial_path(upload.id), MAX_FILE_SIZE, expected_sha256=data.get('sha256')
+                )
+            except ChecksumMismatch:
+                # المحتوى تالف، يعاد الرفع من البداية
+                os.remove(partial_path(upload.id))
+                upload.received_size = 0
+                db.session.commit()
+                return upload_offset_response(upload, 422, 'بصمة الملف لا تطابق المحتوى المستلم، يرجى إعادة الرفع')
+            
+            # تحديث مشروط: طلب إنهاء آخر قد يكون سبقنا
+            UploadSession.query.filter(
+                UploadSession.id == upload.id,
+                UploadSession.status == 'uploading'
+            ).update({'sha256': sha256, 'storage_path': storage_path, 'status': 'complete'},
+                     synchronize_session=False)
+            db.session.commit()
+        
+        return upload_offset_response(upload)
+        
+    except ChunkInProgress:
+        db.session.rollback()
+        return upload_offset_response(upload, 409, 'دفعة أخرى قيد الرفع لهذا الملف')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ أثناء إنهاء الرفع: {str(e)}'
+        }), 500
+
 @registration_bp.route('/api/registration/list', methods=['GET'])
 def list_registrations():
-    """عرض قائمة طلبات التسجيل"""
+    """عرض قائمة طلبات التسجيل مع التصفية والترتيب"""
     try:
-        import json
-        registrations_file = 'data/registrations.json'
+        limit, cursor = get_page_args()
+        
+        # معاملات التصفية (كلها تستخدم أعمدة مفهرسة)
+        status = request.args.get('status')
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        phone = request.args.get('phone')
+        email = request.args.get('email')
+        child_name = request.args.get('child_name')
+        sort = request.args.get('sort', '-submission_date')
+        
+        if sort not in ['submission_date', '-submission_date']:
+            return jsonify({
+                'success': False,
+                'message': 'قيمة الترتيب غير صالحة'
+            }), 400
+        
+        query = Registration.query
+        
+        if status:
+            query = query.filter(Registration.status == status)
+        if date_from:
+            query = query.filter(Registration.submission_date >= datetime.combine(date.fromisoformat(date_from), datetime.min.time()))
+        if date_to:
+            query = query.filter(Registration.submission_date < datetime.combine(date.fromisoformat(date_to) + timedelta(days=1), datetime.min.time()))
+        if phone:
+            query = query.filter(Registration.phone_normalized == normalize_phone(phone))
+        if email:
+            query = query.filter(Registration.email_normalized == normalize_email(email))
+        if child_name:
+            query = query.filter(Registration.child_name_normalized == normalize_arabic(child_name))
+        
+        registrations, next_cursor = paginate(
+            query,
+            [Registration.submission_date, Registration.id],
+            cursor, limit, descending=sort.startswith('-')
+        )
+        
+        return jsonify({
+            'success': True,
+            'registrations': [registration.to_dict() for registration in registrations],
+            'total': query.order_by(None).count(),
+            'next_cursor': next_cursor
+        })
         
-        if not os.path.exists(registrations_file):
+    except (InvalidCursor, ValueError):
+        return jsonify({
+            'success': False,
+            'message': 'مؤشر الصفحة أو التاريخ غير صالح (استخدم YYYY-MM-DD)'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ أثناء جلب البيانات: {str(e)}'
+        }), 500
+
+@registration_bp.route('/api/registration/duplicates', methods=['GET'])
+@token_required
+def find_duplicate_registrations(current_user):
+    """البحث عن طلبات مكررة لنفس الطفل وولي الأمر (الاسم مع الجوال أو البريد)"""
+    try:
+        # بيانات التواصل للطلبات الأخرى متاحة للموظفين والإدارة فقط
+        if current_user.role not in ['staff', 'admin']:
             return jsonify({
-                'success': True,
-                'registrations': [],
-                'total': 0
-            })
+                'success': False,
+                'message': 'غير مصرح بالوصول'
+            }), 403
+        
+        child_name = normalize_arabic(request.args.get('child_name'))
+        phone = normalize_phone(request.args.get('phone'))
+        email = normalize_email(request.args.get('email'))
         
-        with open(registrations_file, 'r', encoding='utf-8') as f:
-            registrations = json.load(f)
+        if not child_name or not (phone or email):
+            return jsonify({
+                'success': False,
+                'message': 'اسم الطفل مع رقم الجوال أو البريد الإلكتروني مطلوب'
+            }), 400
         
-        # ترتيب حسب تاريخ التقديم (الأحدث أولاً)
-        registrations.sort(key=lambda x: x['submission_date'], reverse=True)
+        duplicates = find_duplicates(child_name, phone, email)
         
         return jsonify({
             'success': True,
-            'registrations': registrations,
-            'total': len(registrations)
+            'duplicates': [registration.to_dict() for registration in duplicates],
+            'total': len(duplicates)
         })
         
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': f'حدث خطأ أثناء جلب البيانات: {str(e)}'
+            'message': f'حدث خطأ أثناء البحث: {str(e)}'
         }), 500
 
-@registration_bp.route('/api/registration/<registration_number>', methods=['GET'])
-def get_registration(registration_number):
-    """عرض تفاصيل طلب تسجيل محدد"""
+@registration_bp.route('/api/registration/<registration_number>/duplicates', methods=['GET'])
+@token_required
+def get_registration_duplicates(current_user, registration_number):
+    """الطلبات الأخرى المطابقة لطلب محدد"""
     try:
-        import json
-        registrations_file = 'data/registrations.json'
+        if current_user.role not in ['staff', 'admin']:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح بالوصول'
+            }), 403
         
-        if not os.path.exists(registrations_file):
+        registration = Registration.query.filter_by(registration_number=registration_number).first()
+        
+        if not registration:
             return jsonify({
                 'success': False,
                 'message': 'لم يتم العثور على الطلب'
             }), 404
         
-        with open(registrations_file, 'r', encoding='utf-8') as f:
-            registrations = json.load(f)
+        duplicates = [
+            duplicate for duplicate in find_duplicates(
+                registration.child_name_normalized,
+                registration.phone_normalized,
+                registration.email_normalized
+            )
+            if duplicate.id != registration.id
+        ]
         
-        # البحث عن الطلب
-        registration = None
-        for reg in registrations:
-            if reg['registration_number'] == registration_number:
-                registration = reg
-                break
+        return jsonify({
+            'success': True,
+            'duplicates': [duplicate.to_dict() for duplicate in duplicates],
+            'total': len(duplicates)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ أثناء البحث: {str(e)}'
+        }), 500
+
+@registration_bp.route('/api/registration/<registration_number>', methods=['GET'])
+def get_registration(registration_number):
+    """عرض تفاصيل طلب تسجيل محدد"""
+    try:
+        # البحث عن الطلب عبر الفهرس الفريد لرقم التسجيل
+        registration = Registration.query.filter_by(registration_number=registration_number).first()
         
         if not registration:
             return jsonify({
@@ -208,7 +530,7 @@ def get_registration(registration_number):
         
         return jsonify({
             'success': True,
-            'registration': registration
+            'registration': registration.to_dict()
         })
         
     except Exception as e:
@@ -221,48 +543,48 @@ def get_registration(registration_number):
 def update_registration_status(registration_number):
     """تحديث حالة طلب التسجيل"""
     try:
-        import json
-        registrations_file = 'data/registrations.json'
-        
-        if not os.path.exists(registrations_file):
-            return jsonify({
-                'success': False,
-                'message': 'لم يتم العثور على الطلب'
-            }), 404
-        
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         new_status = data.get('status')
         notes = data.get('notes', '')
         
-        # قراءة السجلات
-        with open(registrations_file, 'r', encoding='utf-8') as f:
-            registrations = json.load(f)
+        if not new_status:
+            return jsonify({
+                'success': False,
+                'message': 'الحالة مطلوبة'
+            }), 400
         
         # البحث عن الطلب وتحديثه
-        updated = False
-        for reg in registrations:
-            if reg['registration_number'] == registration_number:
-                reg['status'] = new_status
-                reg['updated_at'] = datetime.now().isoformat()
-                if notes:
-                    if 'notes' not in reg:
-                        reg['notes'] = []
-                    reg['notes'].append({
-                        'note': notes,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                updated = True
-                break
-        
-        if not updated:
+        registration = Registration.query.filter_by(registration_number=registration_number).first()
+        
+        if not registration:
             return jsonify({
                 'success': False,
                 'message': 'لم يتم العثور على الطلب'
             }), 404
         
-        # حفظ التحديثات
-        with open(registrations_file, 'w', encoding='utf-8') as f:
-            json.dump(registrations, f, ensure_ascii=False, indent=2)
+        old_status = registration.status
+        registration.updated_at = datetime.now()
+        
+        if new_status != old_status:
+            # تحديث مشروط على الحالة المقروءة: طلبان متزامنان لا ينقلان العدادات مرتين
+            changed = Registration.query.filter(
+                Registration.id == registration.id,
+                Registration.status == old_status
+            ).update({'status': new_status, 'updated_at': registration.updated_at}, synchronize_session=False)
+            if changed != 1:
+                db.session.rollback()
+                return jsonify({
+                    'success': False,
+                    'message': 'تم تغيير حالة الطلب من مستخدم آخر، يرجى التحديث والمحاولة مرة أخرى'
+                }), 409
+            
+            bump_counter(RegistrationStatusCount, old_status or 'pending_review', -1)
+            bump_counter(RegistrationStatusCount, new_status, 1)
+        
+        if notes:
+            registration.add_note(notes)
+        
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -270,6 +592,7 @@ def update_registration_status(registration_number):
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': f'حدث خطأ أثناء التحديث: {str(e)}'
@@ -277,64 +600,34 @@ def update_registration_status(registration_number):
 
 @registration_bp.route('/api/registration/stats', methods=['GET'])
 def get_registration_stats():
-    """إحصائيات طلبات التسجيل"""
+    """إحصائيات طلبات التسجيل من العدادات المحدثة تدريجياً"""
     try:
-        import json
-        registrations_file = 'data/registrations.json'
-        
-        if not os.path.exists(registrations_file):
-            return jsonify({
-                'success': True,
-                'stats': {
-                    'total': 0,
-                    'pending': 0,
-                    'approved': 0,
-                    'rejected': 0,
-                    'today': 0,
-                    'this_week': 0,
-                    'this_month': 0
-                }
-            })
-        
-        with open(registrations_file, 'r', encoding='utf-8') as f:
-            registrations = json.load(f)
+        status_counts = {counter.status: counter.count for counter in RegistrationStatusCount.query.all()}
         
-        from datetime import datetime, timedelta
+        # قاعدة بيانات قائمة قبل إضافة العدادات
+        if not status_counts and Registration.query.first():
+            rebuild_registration_counters()
+            db.session.commit()
+            status_counts = {counter.status: counter.count for counter in RegistrationStatusCount.query.all()}
         
         now = datetime.now()
         today = now.date()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
+        # النوافذ المتحركة تحسب بالأيام الكاملة من العدادات اليومية
+        week_start = (now - timedelta(days=7)).date()
+        month_start = (now - timedelta(days=30)).date()
+        
+        daily_counts = RegistrationDailyCount.query.filter(RegistrationDailyCount.day >= month_start).all()
         
         stats = {
-            'total': len(registrations),
-            'pending': 0,
-            'approved': 0,
-            'rejected': 0,
-            'today': 0,
-            'this_week': 0,
-            'this_month': 0
+            'total': sum(status_counts.values()),
+            'pending': status_counts.get('pending_review', 0),
+            'approved': status_counts.get('approved', 0),
+            'rejected': status_counts.get('rejected', 0),
+            'today': sum(counter.count for counter in daily_counts if counter.day == today),
+            'this_week': sum(counter.count for counter in daily_counts if counter.day >= week_start),
+            'this_month': sum(counter.count for counter in daily_counts)
         }
         
-        for reg in registrations:
-            # إحصائيات الحالة
-            status = reg.get('status', 'pending_review')
-            if status == 'pending_review':
-                stats['pending'] += 1
-            elif status == 'approved':
-                stats['approved'] += 1
-            elif status == 'rejected':
-                stats['rejected'] += 1
-            
-            # إحصائيات التاريخ
-            submission_date = datetime.fromisoformat(reg['submission_date']).date()
-            if submission_date == today:
-                stats['today'] += 1
-            if datetime.fromisoformat(reg['submission_date']) >= week_ago:
-                stats['this_week'] += 1
-            if datetime.fromisoformat(reg['submission_date']) >= month_ago:
-                stats['this_month'] += 1
-        
         return jsonify({
             'success': True,
             'stats': stats
@@ -346,3 +639,91 @@ def get_registration_stats():
             'message': f'حدث خطأ أثناء جلب الإحصائيات: {str(e)}'
         }), 500
 
+def find_duplicates(child_name, phone, email):
+    """طلبات بنفس اسم الطفل الموحد ونفس الجوال أو البريد (عبر الفهارس المركبة)"""
+    matches = []
+    if phone:
+        matches.append(Registration.phone_normalized == phone)
+    if email:
+        matches.append(Registration.email_normalized == email)
+    if not child_name or not matches:
+        return []
+    
+    return Registration.query.filter(
+        Registration.child_name_normalized == child_name,
+        or_(*matches)
+    ).order_by(Registration.submission_date.desc()).all()
+
+@registration_bp.cli.command('import-json')
+@click.option('--path', default=REGISTRATIONS_FILE, help='Path to the legacy registrations.json file')
+def import_registrations_json(path):
+    """استيراد الطلبات من ملف registrations.json القديم (يتجاهل الأرقام المستوردة مسبقاً)"""
+    if not os.path.exists(path):
+        click.echo(f'{path} not found, nothing to import')
+        return
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    
+    existing = {number for (number,) in db.session.query(Registration.registration_number).all()}
+    imported = 0
+    
+    for record in records:
+        if record['registration_number'] in existing:
+            continue
+        
+        submission_date = datetime.fromisoformat(record['submission_date'])
+        db.session.add(Registration(
+            registration_number=record['registration_number'],
+            status=record.get('status', 'pending_review'),
+            submission_date=submission_date,
+            child_data=record.get('child_data', {}),
+            parent_data=record.get('parent_data', {}),
+            uploaded_files=record.get('uploaded_files', []),
+            notes=record.get('notes'),
+            created_at=datetime.fromisoformat(record['created_at']) if record.get('created_at') else submission_date,
+            updated_at=datetime.fromisoformat(record['updated_at']) if record.get('updated_at') else submission_date
+        ))
+        existing.add(record['registration_number'])
+        imported += 1
+    
+    db.session.flush()
+    rebuild_registration_counters()
+    db.session.commit()
+    click.echo(f'Imported {imported} of {len(records)} registrations from {path}')
+
+@registration_bp.cli.command('reindex')
+def reindex_registrations():
+    """إعادة حساب المفاتيح الموحدة لجميع الطلبات"""
+    count = 0
+    for registration in Registration.query.yield_per(500):
+        registration.refresh_search_keys()
+        count += 1
+    db.session.commit()
+    click.echo(f'Reindexed {count} registrations')
+
+@registration_bp.cli.command('rebuild-stats')
+def rebuild_registration_stats():
+    """إعادة حساب عدادات إحصائيات الطلبات"""
+    total = rebuild_registration_counters()
+    db.session.commit()
+    click.echo(f'Rebuilt statistics for {total} registrations')
+
+@registration_bp.cli.command('purge-uploads')
+@click.option('--hours', default=48, help='Delete upload sessions not attached within this many hours')
+def purge_upload_sessions(hours):
+    """حذف جلسات الرفع المتروكة وملفاتها الجزئية"""
+    cutoff = datetime.now() - timedelta(hours=hours)
+    stale = UploadSession.query.filter(
+        UploadSession.status != 'attached',
+        UploadSession.updated_at < cutoff
+    ).all()
+    
+    for upload in stale:
+        path = partial_path(upload.id)
+        if os.path.exists(path):
+            os.remove(path)
+        db.session.delete(upload)
+    
+    db.session.commit()
+    click.echo(f'Purged {len(stale)} upload sessions')
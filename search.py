@@ -0,0 +1,143 @@
+from flask import Blueprint, request, jsonify
+from src.models.user import db, User, Child, DailyUpdate, create_search_indexes, rebuild_search_index, search_supported
+from src.routes.auth import token_required
+from src.utils.pagination import get_page_args, encode_cursor, decode_cursor, InvalidCursor
+from src.utils.serialization import RowSerializer, prefixed, json_response
+from src.utils.text import search_terms
+from sqlalchemy import and_, or_, literal_column, table, column
+from datetime import date
+import click
+
+search_bp = Blueprint('search', __name__)
+
+MAX_QUERY_TERMS = 8
+
+# جداول FTS5 الافتراضية (لا تعرّف كنماذج لأن create_all لا يدعمها)
+DAILY_UPDATES_FTS = table('daily_updates_fts', column('rowid'), column('rank'))
+CHILDREN_FTS = table('children_fts', column('rowid'), column('rank'))
+
+def matches(fts, match):
+    return literal_column(fts.name).op('MATCH')(match)
+
+def match_expression(query):
+    """تحويل نص البحث إلى استعلام FTS5: كل كلمة بين علامتي تنصيص مع مطابقة البادئة"""
+    terms = search_terms(query)[:MAX_QUERY_TERMS]
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def ranked_page(query, rank, row_id, cursor, limit):
+    """ترقيم النتائج بالمفاتيح على (الترتيب، المعرف)، الأفضل أولاً"""
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, [float, int])
+        query = query.filter(or_(rank > last_rank, and_(rank == last_rank, row_id > last_id)))
+
+    rows = query.order_by(rank, row_id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].rank, rows[-1].id])
+
+    return rows, next_cursor
+
+def search_updates(current_user, match, cursor, limit):
+    """البحث في ملاحظات التحديثات اليومية ضمن الأطفال المسموح بهم"""
+    rank = DAILY_UPDATES_FTS.c.rank
+    query = db.session.query(
+        *DailyUpdate.dict_columns(),
+        Child.name.label('child_name'),
+        *prefixed(User.dict_columns(), 'staff_'),
+        rank.label('rank')
+    ).select_from(DAILY_UPDATES_FTS)\
+        .join(DailyUpdate, DailyUpdate.id == DAILY_UPDATES_FTS.c.rowid)\
+        .join(Child, DailyUpdate.child_id == Child.id)\
+        .join(User, DailyUpdate.staff_id == User.id)\
+        .filter(matches(DAILY_UPDATES_FTS, match))
+
+    if current_user.role == 'parent':
+        query = query.filter(Child.parent_id == current_user.id)
+    if request.args.get('child_id'):
+        query = query.filter(DailyUpdate.child_id == request.args.get('child_id', type=int))
+    if request.args.get('activity_type'):
+        query = query.filter(DailyUpdate.activity_type == request.args['activity_type'])
+    if request.args.get('from'):
+        query = query.filter(DailyUpdate.day >= date.fromisoformat(request.args['from']))
+    if request.args.get('to'):
+        query = query.filter(DailyUpdate.day <= date.fromisoformat(request.args['to']))
+
+    rows, next_cursor = ranked_page(query, rank, DailyUpdate.id, cursor, limit)
+
+    update_row = RowSerializer(DailyUpdate.dict_columns())
+    staff_row = RowSerializer(User.dict_columns())
+    staff_start = update_row.width + 1
+    results = []
+    for row in rows:
+        update = update_row(row[:update_row.width])
+        update['child'] = {'id': update['child_id'], 'name': row.child_name}
+        update['staff'] = staff_row(row[staff_start:staff_start + staff_row.width])
+        results.append(update)
+    return results, next_cursor
+
+def search_children(current_user, match, cursor, limit):
+    """البحث في أسماء الأطفال النشطين ضمن الأطفال المسموح بهم"""
+    rank = CHILDREN_FTS.c.rank
+    query = db.session.query(*Child.dict_columns(), rank.label('rank'))\
+        .select_from(CHILDREN_FTS)\
+        .join(Child, Child.id == CHILDREN_FTS.c.rowid)\
+        .filter(matches(CHILDREN_FTS, match), Child.is_active == True)
+
+    if current_user.role == 'parent':
+        query = query.filter(Child.parent_id == current_user.id)
+
+    rows, next_cursor = ranked_page(query, rank, Child.id, cursor, limit)
+
+    child_row = RowSerializer(Child.dict_columns())
+    return [child_row(row[:child_row.width]) for row in rows], next_cursor
+
+@search_bp.route('', methods=['GET'])
+@token_required
+def search(current_user):
+    """البحث النصي في ملاحظات التحديثات (type=updates) أو أسماء الأطفال (type=children)، مرتباً حسب الصلة"""
+    try:
+        if not search_supported(db.session.connection()):
+            return jsonify({'message': 'Full-text search requires SQLite FTS5'}), 501
+
+        search_type = request.args.get('type', 'updates')
+        if search_type not in ('updates', 'children'):
+            return jsonify({'message': 'Invalid search type'}), 400
+
+        match = match_expression(request.args.get('q'))
+        if not match:
+            return jsonify({'message': 'Search query is required'}), 400
+
+        limit, cursor = get_page_args()
+
+        try:
+            if search_type == 'updates':
+                results, next_cursor = search_updates(current_user, match, cursor, limit)
+            else:
+                results, next_cursor = search_children(current_user, match, cursor, limit)
+        except InvalidCursor:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        except ValueError:
+            return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        return json_response({
+            'type': search_type,
+            'query': request.args.get('q'),
+            'results': results,
+            'next_cursor': next_cursor
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Search failed: {str(e)}'}), 500
+
+@search_bp.cli.command('rebuild')
+def rebuild_search():
+    """إعادة بناء فهارس البحث بعد تعديلات مباشرة على قاعدة البيانات أو تغيير قواعد التوحيد"""
+    with db.engine.begin() as connection:
+        if not create_search_indexes(connection):
+            click.echo('Full-text search requires SQLite FTS5')
+            return
+        counts = rebuild_search_index(connection)
+    for fts_table, count in counts.items():
+        click.echo(f'{fts_table}: indexed {count} rows')
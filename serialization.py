@@ -0,0 +1,51 @@
+from flask import current_app
+from datetime import datetime, date
+import json
+
+try:
+    import orjson
+except ImportError:  # اختياري، يستخدم فقط عند تعطيل ensure_ascii
+    orjson = None
+
+class RowSerializer:
+    """تحويل صف مسقط (أعمدة فقط بدون كائنات ORM) إلى نفس قاموس to_dict"""
+
+    def __init__(self, columns):
+        self.keys = tuple(column.key for column in columns)
+        self.width = len(self.keys)
+        self.date_indexes = tuple(
+            i for i, column in enumerate(columns)
+            if column.property.columns[0].type.python_type in (datetime, date)
+        )
+
+    def __call__(self, values):
+        values = list(values)
+        for i in self.date_indexes:
+            if values[i] is not None:
+                values[i] = values[i].isoformat()
+        return dict(zip(self.keys, values))
+
+def prefixed(columns, prefix):
+    """تسمية الأعمدة ببادئة لتجنب تعارض الأسماء عند الربط بين الجداول"""
+    return [column.label(f'{prefix}{column.key}') for column in columns]
+
+def json_response(payload):
+    """بديل أسرع لـ jsonify يعطي نفس البايتات الناتجة (القيم يجب أن تكون أنواعاً أساسية)"""
+    provider = current_app.json
+
+    # في وضع التطوير يستخدم jsonify تنسيقاً مقروءاً فنتركه كما هو
+    if (provider.compact is None and current_app.debug) or provider.compact is False:
+        return provider.response(payload)
+
+    if orjson is not None and not provider.ensure_ascii:
+        option = orjson.OPT_SORT_KEYS if provider.sort_keys else 0
+        body = orjson.dumps(payload, option=option) + b'\n'
+    else:
+        body = json.dumps(
+            payload,
+            ensure_ascii=provider.ensure_ascii,
+            sort_keys=provider.sort_keys,
+            separators=(',', ':')
+        ) + '\n'
+
+    return current_app.response_class(body, mimetype=provider.mimetype)
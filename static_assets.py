@@ -0,0 +1,112 @@
+from flask import Response, request, send_file
+import mimetypes
+import hashlib
+import gzip
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # اختياري، بدونه تقدم نسخة gzip فقط
+    brotli = None
+
+# الملفات الأكبر من هذا الحد لا تحمل في الذاكرة وتقدم من القرص
+MAX_INLINE_SIZE = int(os.environ.get('STATIC_MAX_INLINE_SIZE', 5 * 1024 * 1024))
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/wasm', 'application/manifest+json')
+
+# أسماء مثل index-4f3a9c2b.js أو app.8e1b7d3f.css (يجب أن تحتوي البصمة على رقم)
+FINGERPRINT_RE = re.compile(r'[.-](?=[A-Za-z0-9_]*\d)[A-Za-z0-9_]{8,}\.[A-Za-z0-9]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+class StaticAsset:
+    """ملف ثابت محمل في الذاكرة مع نسخه المضغوطة"""
+    __slots__ = ('path', 'file_path', 'content_type', 'fingerprinted', 'last_modified', 'bodies', 'etags')
+
+    def __init__(self, path, file_path, content_type, fingerprinted, last_modified=None):
+        self.path = path
+        self.file_path = file_path
+        self.content_type = content_type
+        self.fingerprinted = fingerprinted
+        self.last_modified = last_modified
+        self.bodies = {}  # الترميز -> البايتات
+        self.etags = {}  # الترميز -> ETag قوي (لكل ترميز بايتات مختلفة)
+
+    @property
+    def cache_control(self):
+        return IMMUTABLE_CACHE_CONTROL if self.fingerprinted else REVALIDATE_CACHE_CONTROL
+
+class StaticManifest:
+    """فهرس لمجلد الملفات الثابتة يبنى مرة واحدة عند التشغيل"""
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+
+    def build(self):
+        assets = {}
+        if self.root and os.path.isdir(self.root):
+            for directory, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    file_path = os.path.join(directory, filename)
+                    path = os.path.relpath(file_path, self.root).replace(os.sep, '/')
+                    assets[path] = self._load(path, file_path)
+        self.assets = assets
+        return self
+
+    def _load(self, path, file_path):
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        asset = StaticAsset(path, file_path, content_type, bool(FINGERPRINT_RE.search(path)),
+                            int(os.path.getmtime(file_path)))
+        if os.path.getsize(file_path) > MAX_INLINE_SIZE:
+            return asset
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        asset.bodies['identity'] = body
+        asset.etags['identity'] = digest
+
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                # نحتفظ بالنسخة المضغوطة فقط إن كانت أصغر فعلاً
+                if len(data) < len(body):
+                    asset.bodies[encoding] = data
+                    asset.etags[encoding] = f'{digest}-{encoding}'
+        return asset
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def respond(self, asset):
+        """رد بالنسخة المناسبة لـ Accept-Encoding مع دعم 304 و Range كما في send_file"""
+        if not asset.bodies:
+            response = send_file(asset.file_path, mimetype=asset.content_type, conditional=True)
+            response.headers['Cache-Control'] = asset.cache_control
+            return response
+
+        encoding = 'identity'
+        accepted = request.accept_encodings
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.bodies and accepted[candidate]:
+                encoding = candidate
+                break
+
+        body = asset.bodies[encoding]
+        response = Response(body, mimetype=asset.content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(asset.etags[encoding])
+        response.last_modified = asset.last_modified
+        response.headers['Cache-Control'] = asset.cache_control
+        if len(asset.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        # If-None-Match و If-Modified-Since و Range/If-Range (المدى على بايتات الترميز المختار)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
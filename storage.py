@@ -0,0 +1,211 @@
+from flask import Request, request, g, jsonify, has_request_context
+from werkzeug.exceptions import RequestEntityTooLarge, ClientDisconnected
+from functools import wraps
+from contextlib import contextmanager
+import tempfile
+import hashlib
+import os
+
+try:
+    import fcntl
+except ImportError:  # غير متوفر في Windows، ويبقى التحديث المشروط لموضع الرفع في قاعدة البيانات
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_FILE_SIZE = int(os.environ.get('MAX_UPLOAD_FILE_SIZE', 10 * 1024 * 1024))
+
+class ChecksumMismatch(ValueError):
+    """بصمة المحتوى المستلم لا تطابق البصمة المتوقعة"""
+
+class BlobStore:
+    """تخزين الملفات حسب بصمة SHA-256 لمحتواها، فالملفات المتطابقة تخزن مرة واحدة"""
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path_for(sha256))
+
+    def new_spool(self, max_size=None):
+        """ملف مؤقت يحسب البصمة أثناء الكتابة"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return HashingSpool(self, max_size)
+
+    def commit(self, tmp_path, sha256):
+        """نقل ملف مؤقت إلى مكانه النهائي، أو حذفه إن كان المحتوى مخزناً مسبقاً"""
+        final_path = self.path_for(sha256)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return final_path
+
+    def save_stream(self, stream, max_size=None):
+        """نسخ تيار إلى المخزن على دفعات، ويعيد (البصمة، الحجم، المسار)"""
+        spool = self.new_spool(max_size)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+            return spool.commit()
+        finally:
+            spool.close()
+
+    def save_file(self, path, max_size=None, expected_sha256=None):
+        """نقل ملف موجود على القرص إلى المخزن بعد حساب بصمته"""
+        with open(path, 'rb') as f:
+            sha256, size = hash_stream(f)
+        if max_size and size > max_size:
+            raise RequestEntityTooLarge(f'File exceeds {max_size} bytes')
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise ChecksumMismatch(sha256)
+        return sha256, size, self.commit(path, sha256)
+
+class HashingSpool:
+    """ملف مؤقت على القرص يحسب SHA-256 والحجم أثناء الكتابة ويرفض تجاوز الحد"""
+
+    def __init__(self, store, max_size=None):
+        self.store = store
+        self.max_size = max_size
+        self.size = 0
+        self.digest = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        self.committed_path = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            # المحلل لا يغلق الملف عند الخطأ فنحذفه هنا
+            self.close()
+            raise RequestEntityTooLarge(f'File exceeds {self.max_size} bytes')
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+
+    def commit(self):
+        """نقل الملف إلى المخزن، ويعيد (البصمة، الحجم، المسار)"""
+        if self.committed_path is None:
+            self._file.close()
+            self.committed_path = self.store.commit(self.tmp_path, self.sha256)
+        return self.sha256, self.size, self.committed_path
+
+    def close(self):
+        # الملفات غير المعتمدة (مرفوضة أو طلب فاشل) تحذف
+        if not self._file.closed:
+            self._file.close()
+        if self.committed_path is None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def hash_stream(stream):
+    """حساب SHA-256 لتيار على دفعات"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+blob_store = BlobStore(os.environ.get('BLOB_FOLDER', 'uploads/blobs'))
+PARTIAL_FOLDER = os.environ.get('PARTIAL_UPLOAD_FOLDER', 'uploads/partial')
+
+def partial_path(upload_id):
+    """مسار الملف الجزئي لجلسة رفع"""
+    return os.path.join(PARTIAL_FOLDER, f'{upload_id}.part')
+
+class ChunkInProgress(Exception):
+    """دفعة أخرى تكتب في نفس الملف الجزئي الآن"""
+
+@contextmanager
+def chunk_lock(path):
+    """قفل حصري على الملف الجزئي أثناء كتابة دفعة، ويرفض فوراً إن كان مقفلاً"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ChunkInProgress(path)
+        yield
+
+def append_chunk(path, offset, stream):
+    """كتابة دفعة بدءاً من offset، ويعيد عدد البايتات المكتوبة فعلاً حتى لو انقطع الاتصال"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with open(path, 'ab') as f:
+        # ما بعد offset بقايا دفعة لم تسجل فنحذفه
+        f.truncate(offset)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+        except ClientDisconnected:
+            # نحتفظ بما وصل ليستأنف العميل من بعده
+            pass
+        f.flush()
+        os.fsync(f.fileno())
+    return written
+
+
+class StreamingUploadRequest(Request):
+    """طلب يكتب الملفات المرفوعة مباشرة إلى مخزن الملفات بدلاً من الذاكرة"""
+
+    @property
+    def max_content_length(self):
+        limits = g.get('upload_limits') if has_request_context() else None
+        if limits:
+            return limits[0]
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limits = g.get('upload_limits') if has_request_context() else None
+        return blob_store.new_spool(limits[1] if limits else DEFAULT_MAX_FILE_SIZE)
+
+def upload_limits(max_request_size, max_file_size):
+    """تحديد الحجم الأقصى للطلب ولكل ملف في مسار رفع"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            g.upload_limits = (max_request_size, max_file_size)
+            if request.content_length and request.content_length > max_request_size:
+                return jsonify({
+                    'success': False,
+                    'message': f'حجم الطلب يتجاوز الحد المسموح ({max_request_size // (1024 * 1024)} ميجابايت)'
+                }), 413
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+def store_upload(file, max_size=None):
+    """تخزين ملف مرفوع، ويعيد (البصمة، الحجم، المسار)"""
+    if isinstance(file.stream, HashingSpool):
+        return file.stream.commit()
+    return blob_store.save_stream(file.stream, max_size or DEFAULT_MAX_FILE_SIZE)
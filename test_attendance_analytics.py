@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+import random
+import pytest
+from src.models.user import db, Attendance
+from src.utils import attendance_analytics
+
+np = pytest.importorskip('numpy')
+
+def add(child, staff, status, when):
+    timestamp = datetime.fromisoformat(when)
+    db.session.add(Attendance(child_id=child.id, staff_id=staff.id, status=status,
+                              timestamp=timestamp, day=timestamp.date()))
+
+@pytest.fixture
+def visits(users, children):
+    staff = users['staff']
+    # الطفل الأول: 4 ساعات، ثم 8.5 ساعات مع استلام متأخر، ثم ساعتان في الأسبوع التالي
+    add(children[0], staff, 'check_in', '2024-05-06T08:00:00')
+    add(children[0], staff, 'check_out', '2024-05-06T12:00:00')
+    add(children[0], staff, 'check_in', '2024-05-07T08:00:00')
+    add(children[0], staff, 'check_out', '2024-05-07T16:30:00')
+    add(children[0], staff, 'check_in', '2024-05-13T09:00:00')
+    add(children[0], staff, 'check_out', '2024-05-13T11:00:00')
+    # الطفل الثاني: دخول بلا خروج، وخروج في اليوم التالي لا يقترن بدخول اليوم السابق
+    add(children[1], staff, 'check_in', '2024-05-08T09:00:00')
+    add(children[1], staff, 'check_out', '2024-05-09T07:00:00')
+    db.session.commit()
+
+def analytics(client, headers, **params):
+    params = {'from': '2024-05-01', 'to': '2024-05-31', **params}
+    return client.get('/api/attendance/analytics', headers=headers, query_string=params)
+
+def test_visits_are_paired_per_child_and_day(client, headers, children, visits):
+    response = analytics(client, headers['admin'])
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['children'] == [
+        {'child_id': children[0].id, 'child_name': children[0].name, 'days_attended': 3, 'visits': 3,
+         'total_hours': 14.5, 'average_visit_hours': 4.83, 'late_pickups': 1, 'missing_check_outs': 0,
+         'p50_visit_hours': 4.0, 'p90_visit_hours': 7.6},
+        {'child_id': children[1].id, 'child_name': children[1].name, 'days_attended': 1, 'visits': 0,
+         'total_hours': 0.0, 'average_visit_hours': None, 'late_pickups': 0, 'missing_check_outs': 1,
+         'p50_visit_hours': None, 'p90_visit_hours': None},
+    ]
+    assert body['overall'] == {'children': 2, 'visits': 3, 'total_hours': 14.5, 'average_visit_hours': 4.83,
+                               'late_pickups': 1, 'missing_check_outs': 1,
+                               'p50_visit_hours': 4.0, 'p90_visit_hours': 7.6}
+
+def test_weekly_and_monthly_periods(client, headers, visits):
+    weekly = analytics(client, headers['admin']).get_json()['periods']
+    monthly = analytics(client, headers['admin'], granularity='month').get_json()['periods']
+
+    assert weekly == [
+        {'period_start': '2024-05-06', 'children': 1, 'visits': 2, 'total_hours': 12.5,
+         'average_hours_per_child': 12.5, 'late_pickups': 1},
+        {'period_start': '2024-05-13', 'children': 1, 'visits': 1, 'total_hours': 2.0,
+         'average_hours_per_child': 2.0, 'late_pickups': 0},
+    ]
+    assert [(period['period_start'], period['total_hours']) for period in monthly] == [('2024-05-01', 14.5)]
+
+def test_late_pickup_time_and_child_filter(client, headers, children, visits):
+    body = analytics(client, headers['admin'], late_after='17:00', child_id=children[0].id).get_json()
+
+    assert [child['child_id'] for child in body['children']] == [children[0].id]
+    assert body['overall']['late_pickups'] == 0
+
+def test_empty_range(client, headers, visits):
+    body = analytics(client, headers['admin'], **{'from': '2023-01-01', 'to': '2023-01-31'}).get_json()
+
+    assert body['children'] == [] and body['periods'] == []
+    assert body['overall']['visits'] == 0 and body['overall']['p50_visit_hours'] is None
+
+@pytest.mark.parametrize('params', [{'granularity': 'day'}, {'late_after': '5pm'}, {'from': '2024-06-01'}])
+def test_invalid_parameters(client, headers, params):
+    assert analytics(client, headers['admin'], **params).status_code == 400
+
+def test_admin_only(client, headers):
+    assert analytics(client, headers['staff']).status_code == 403
+
+def test_without_numpy(client, headers, monkeypatch):
+    monkeypatch.setattr(attendance_analytics, 'np', None)
+
+    assert analytics(client, headers['admin']).status_code == 501
+
+def test_pairing_matches_a_row_by_row_walk(app):
+    # مقارنة الربط المتجه بالمرور على السجلات واحداً تلو الآخر
+    rng = random.Random(7)
+    rows = sorted(
+        (rng.randrange(5), datetime(2024, 5, 1) + timedelta(minutes=rng.randrange(60 * 24 * 10)), rng.random() < 0.5)
+        for _ in range(2000)
+    )
+    columns = {
+        'child_id': np.array([child_id for child_id, _, _ in rows], dtype='i8'),
+        'timestamp': np.array([timestamp for _, timestamp, _ in rows], dtype='M8[us]'),
+        'is_check_in': np.array([is_check_in for _, _, is_check_in in rows])
+    }
+
+    expected = {}
+    for (child_id, start, is_in), (next_child, end, next_in) in zip(rows, rows[1:]):
+        if is_in and not next_in and child_id == next_child and start.date() == end.date():
+            expected[child_id] = expected.get(child_id, 0) + (end - start).total_seconds() / 3600
+
+    result = attendance_analytics.time_on_site(columns)
+    totals = {child['child_id']: child['total_hours'] for child in result['children']}
+    assert totals == {child_id: round(hours, 2) for child_id, hours in expected.items()}
@@ -0,0 +1,69 @@
+from datetime import date, datetime, timedelta
+import pytest
+from src.models.user import db, Attendance
+
+def add_scans(child, staff, day, times):
+    """سجلات بالتناوب دخول/خروج في يوم واحد، times بصيغة HH:MM"""
+    for index, clock in enumerate(times):
+        timestamp = datetime.combine(day, datetime.strptime(clock, '%H:%M').time())
+        db.session.add(Attendance(child_id=child.id, staff_id=staff.id, timestamp=timestamp, day=day,
+                                  status='check_in' if index % 2 == 0 else 'check_out'))
+    db.session.commit()
+
+def history(client, headers, child, **params):
+    return client.get(f'/api/attendance/child/{child.id}/history', headers=headers, query_string=params)
+
+def test_busy_day_does_not_push_older_days_out(client, users, headers, children):
+    # عشرة مسحات في يوم واحد كانت تملأ حد days * 4 وتخفي الأيام الأقدم
+    add_scans(children[0], users['staff'], date(2024, 5, 1), ['08:00', '10:00'])
+    add_scans(children[0], users['staff'], date(2024, 5, 2), ['07:30', '09:00', '09:15', '11:00', '11:30',
+                                                             '12:00', '12:30', '13:00', '13:30', '16:45'])
+
+    body = history(client, headers['staff'], children[0], **{'from': '2024-05-01', 'to': '2024-05-02'}).get_json()
+
+    assert body['attendance_history'] == [
+        {'date': '2024-05-02', 'status': 'present', 'first_check_in': '2024-05-02T07:30:00',
+         'last_check_out': '2024-05-02T16:45:00', 'scan_count': 10},
+        {'date': '2024-05-01', 'status': 'present', 'first_check_in': '2024-05-01T08:00:00',
+         'last_check_out': '2024-05-01T10:00:00', 'scan_count': 2},
+    ]
+    assert body['summary'] == {'present_days': 2, 'total_scans': 12}
+    assert 'records' not in body
+
+def test_range_excludes_days_outside_it_and_other_children(client, users, headers, children):
+    for day in (date(2024, 4, 30), date(2024, 5, 1), date(2024, 5, 4)):
+        add_scans(children[0], users['staff'], day, ['08:00'])
+    add_scans(children[1], users['staff'], date(2024, 5, 2), ['08:00'])
+
+    body = history(client, headers['parent'], children[0], **{'from': '2024-05-01', 'to': '2024-05-03'}).get_json()
+
+    assert [day['date'] for day in body['attendance_history']] == ['2024-05-01']
+    assert body['attendance_history'][0]['last_check_out'] is None
+    assert body['period'] == {'from': '2024-05-01', 'to': '2024-05-03', 'days': 3}
+
+@pytest.mark.parametrize('params', [
+    {'from': '2024-05-03', 'to': '2024-05-01'},
+    {'from': '01/05/2024'},
+    {'from': '2020-01-01', 'to': '2024-05-01'},
+])
+def test_invalid_ranges(client, headers, children, params):
+    assert history(client, headers['staff'], children[0], **params).status_code == 400
+
+def test_records_are_paginated_across_the_range(client, users, headers, children):
+    add_scans(children[0], users['staff'], date(2024, 5, 1), ['08:00', '10:00'])
+    add_scans(children[0], users['staff'], date(2024, 5, 2), ['08:00'])
+    params = {'from': '2024-05-01', 'to': '2024-05-02', 'include_records': 'true', 'limit': 2}
+
+    first = history(client, headers['staff'], children[0], **params).get_json()
+    second = history(client, headers['staff'], children[0], cursor=first['next_cursor'], **params).get_json()
+
+    timestamps = [record['timestamp'] for record in first['records'] + second['records']]
+    assert timestamps == ['2024-05-02T08:00:00', '2024-05-01T10:00:00', '2024-05-01T08:00:00']
+    assert second['next_cursor'] is None
+
+def test_days_defaults_to_a_window_ending_today(client, users, headers, children):
+    today = date.today()
+    add_scans(children[0], users['staff'], today - timedelta(days=10), ['08:00'])
+
+    assert history(client, headers['staff'], children[0], days=7).get_json()['attendance_history'] == []
+    assert len(history(client, headers['staff'], children[0]).get_json()['attendance_history']) == 1
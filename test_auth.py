@@ -0,0 +1,50 @@
+from src.models.user import db, User
+from src.routes.auth import principal_cache, token_cache
+from conftest import auth_header
+
+ADMIN_ROUTE = '/api/notifications/outbox/stats'
+
+def test_principal_and_token_are_cached_between_requests(client, headers):
+    assert client.get('/api/auth/profile', headers=headers['staff']).status_code == 200
+    principal_hits, token_hits = principal_cache.hits, token_cache.hits
+
+    response = client.get('/api/auth/profile', headers=headers['staff'])
+
+    assert response.status_code == 200
+    assert response.get_json()['user']['role'] == 'staff'
+    assert principal_cache.hits == principal_hits + 1
+    assert token_cache.hits == token_hits + 1
+
+def test_profile_update_invalidates_the_cached_principal(client, headers):
+    client.get('/api/auth/profile', headers=headers['parent'])
+
+    response = client.put('/api/auth/profile', headers=headers['parent'], json={'name': 'اسم جديد'})
+    assert response.status_code == 200
+
+    assert client.get('/api/auth/profile', headers=headers['parent']).get_json()['user']['name'] == 'اسم جديد'
+
+def test_unknown_user_is_rejected(client, users):
+    response = client.get('/api/auth/profile', headers=auth_header(10_000))
+
+    assert response.status_code == 401
+
+def change_in_another_worker(user_id, **values):
+    """تعديل مباشر دون أحداث ORM، كما لو نفذته عملية أخرى لا تشارك ذاكرتنا المؤقتة"""
+    db.session.query(User).filter(User.id == user_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+def test_demoted_admin_loses_admin_routes_while_cached(client, users, headers):
+    assert client.get(ADMIN_ROUTE, headers=headers['admin']).status_code == 200
+    assert principal_cache.get(users['admin'].id) is not None
+
+    change_in_another_worker(users['admin'].id, role='staff')
+
+    assert client.get(ADMIN_ROUTE, headers=headers['admin']).status_code == 403
+    assert principal_cache.get(users['admin'].id) is None
+
+def test_deactivated_admin_loses_admin_routes_while_cached(client, users, headers):
+    assert client.get(ADMIN_ROUTE, headers=headers['admin']).status_code == 200
+
+    change_in_another_worker(users['admin'].id, is_active=False)
+
+    assert client.get(ADMIN_ROUTE, headers=headers['admin']).status_code == 403
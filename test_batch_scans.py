@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import threading
+import pytest
+from src.models.user import db, Attendance, AttendanceDailyRollup, ChildPresence, local_today
+from conftest import scan, hold_writes_until_all_read
+
+def minutes_ago(minutes):
+    return (datetime.utcnow() - timedelta(minutes=minutes)).isoformat()
+
+def upload(client, headers, scans):
+    response = client.post('/api/attendance/scan-qr/batch', headers=headers, json={'scans': scans})
+    assert response.status_code == 200
+    return response.get_json()
+
+@pytest.mark.parametrize('fields', [
+    {'idempotency_key': 'k1', 'qr_code': ['x']},
+    {'idempotency_key': 'k1', 'qr_code': {'code': 'x'}},
+    {'idempotency_key': 'k1', 'qr_code': ''},
+    {'idempotency_key': ['k1'], 'qr_code': 'CHILD_1'},
+])
+def test_malformed_items_are_invalid_results(client, headers, children, fields):
+    body = upload(client, headers['staff'], [
+        dict(fields, timestamp=minutes_ago(5)),
+        {'idempotency_key': 'ok', 'qr_code': children[0].qr_code, 'timestamp': minutes_ago(5)}
+    ])
+
+    assert [result['result'] for result in body['results']] == ['invalid', 'recorded']
+    assert body['results'][0]['message'] == 'idempotency_key and qr_code are required strings'
+
+def test_resent_batch_reports_duplicates(client, headers, children):
+    scans = [{'idempotency_key': f'k{i}', 'qr_code': children[i].qr_code, 'timestamp': minutes_ago(10 - i)}
+             for i in range(2)]
+    first = upload(client, headers['staff'], scans)
+
+    second = upload(client, headers['staff'], scans + [scans[0]])
+
+    assert [result['result'] for result in second['results']] == ['duplicate'] * 3
+    assert [result['attendance_id'] for result in second['results'][:2]] == \
+        [result['attendance_id'] for result in first['results']]
+    assert Attendance.query.count() == 2
+
+def test_offline_scans_are_ordered_by_device_time(client, headers, children):
+    qr_code = children[0].qr_code
+    body = upload(client, headers['staff'], [
+        {'idempotency_key': 'out', 'qr_code': qr_code, 'timestamp': minutes_ago(10)},
+        {'idempotency_key': 'in', 'qr_code': qr_code, 'timestamp': minutes_ago(20)},
+    ])
+
+    assert [result['status'] for result in body['results']] == ['check_out', 'check_in']
+
+def test_late_offline_scan_does_not_override_the_current_state(client, headers, children):
+    qr_code = children[0].qr_code
+    scan(client, headers['staff'], qr_code)  # دخول الآن
+
+    body = upload(client, headers['staff'], [{'idempotency_key': 'old', 'qr_code': qr_code, 'timestamp': minutes_ago(30)}])
+
+    assert body['results'][0]['status'] == 'check_in'
+    presence = db.session.get(ChildPresence, children[0].id)
+    db.session.refresh(presence)
+    assert presence.last_attendance_id != body['results'][0]['attendance_id']
+    rollup = db.session.get(AttendanceDailyRollup, local_today())
+    db.session.refresh(rollup)
+    assert rollup.present_count == 1
+
+def test_batch_and_live_scan_of_a_new_day_do_not_collide(app, monkeypatch, headers, children):
+    # المسح المباشر والدفعة ينشئان الحالة والملخص لنفس الطفل واليوم في نفس اللحظة
+    qr_code = children[0].qr_code
+    hold_writes_until_all_read(monkeypatch, 2)
+    statuses = {}
+
+    def live():
+        statuses['live'] = scan(app.test_client(), headers['staff'], qr_code).status_code
+
+    def batch():
+        statuses['batch'] = app.test_client().post('/api/attendance/scan-qr/batch', headers=headers['staff'], json={
+            'scans': [{'idempotency_key': 'k', 'qr_code': qr_code, 'timestamp': minutes_ago(1)}]
+        }).status_code
+
+    threads = [threading.Thread(target=live), threading.Thread(target=batch)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == {'live': 200, 'batch': 200}
+    assert ChildPresence.query.count() == 1
+    assert db.session.get(AttendanceDailyRollup, local_today()) is not None
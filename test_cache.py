@@ -0,0 +1,36 @@
+from src.utils import cache
+from src.utils.cache import TTLCache
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(maxsize=2)
+    entries.set('a', 1)
+    entries.set('b', 2)
+    entries.get('a')
+
+    entries.set('c', 3)
+
+    assert (entries.get('a'), entries.get('b'), entries.get('c')) == (1, None, 3)
+    assert entries.evictions == 1
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    entries = TTLCache(ttl=10)
+    entries.set('a', 1)
+    entries.set('b', 2, ttl=30)
+
+    now[0] += 10
+
+    assert (entries.get('a'), entries.get('b')) == (None, 2)
+    assert entries.stats()['size'] == 1
+
+def test_stats_count_hits_and_misses():
+    entries = TTLCache()
+    entries.set('a', 1)
+    entries.get('a')
+    entries.get('b')
+    entries.invalidate('a')
+    entries.get('a')
+
+    assert {key: entries.stats()[key] for key in ('hits', 'misses', 'hit_rate')} == \
+        {'hits': 1, 'misses': 2, 'hit_rate': 0.3333}
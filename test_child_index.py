@@ -0,0 +1,69 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.models.user import db, Child
+from src.utils.child_index import QRCodeIndex, qr_index
+from conftest import scan
+
+def deactivate_elsewhere(child):
+    """تعطيل من عملية أخرى: قاعدة البيانات تتغير وفهرس هذه العملية لا يعلم"""
+    Child.query.filter(Child.id == child.id).update({'is_active': False})
+    db.session.commit()
+
+def test_unknown_code_is_rejected_without_a_query(app, children):
+    index = QRCodeIndex()
+    len(index)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(Engine, 'before_cursor_execute', listener)
+    try:
+        assert index.lookup('CHILD_0_unknown') is None
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listener)
+
+    assert statements == []
+
+def test_lookup_survives_a_concurrent_invalidate(app, monkeypatch, children):
+    index = QRCodeIndex()
+    ensure = index._ensure
+
+    def ensure_then_invalidate():
+        # invalidate من خيط آخر بين التحقق من الفهرس والقراءة منه
+        by_code = ensure()
+        index.invalidate()
+        return by_code
+
+    monkeypatch.setattr(index, '_ensure', ensure_then_invalidate)
+
+    assert index.lookup(children[0].qr_code).id == children[0].id
+    assert len(index) == 3
+    assert [record.id for record in index.match_name('سارة')] == [children[1].id]
+
+def test_child_deactivated_in_another_process_cannot_be_scanned(client, headers, children):
+    assert len(qr_index) == 3
+    deactivate_elsewhere(children[0])
+
+    assert scan(client, headers['staff'], children[0].qr_code).status_code == 404
+    assert len(qr_index) == 2
+    assert qr_index.match_name('محمد') == []
+
+def test_batch_rejects_a_child_deactivated_in_another_process(client, headers, children):
+    len(qr_index)
+    deactivate_elsewhere(children[0])
+
+    response = client.post('/api/attendance/scan-qr/batch', headers=headers['staff'], json={'scans': [
+        {'idempotency_key': 'k', 'qr_code': children[0].qr_code, 'timestamp': '2024-05-01T08:00:00'}
+    ]})
+
+    assert response.get_json()['results'][0]['result'] == 'invalid_qr'
+
+def test_approved_child_is_scannable_immediately(client, users, headers, children):
+    len(qr_index)
+    child = Child(name='ليان', parent_id=users['parent'].id)
+    child.generate_qr_code()
+    db.session.add(child)
+    db.session.commit()
+
+    assert client.post(f'/api/children/{child.id}/approve', headers=headers['admin']).status_code == 200
+
+    db.session.refresh(child)
+    assert scan(client, headers['staff'], child.qr_code).status_code == 200
@@ -0,0 +1,70 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import pytest
+from conftest import scan
+
+def lookup(client, headers, q, **params):
+    response = client.get('/api/children/lookup', headers=headers, query_string={'q': q, **params})
+    assert response.status_code == 200
+    return [child['name'] for child in response.get_json()['children']]
+
+def add_child(client, headers, name):
+    response = client.post('/api/children/add', headers=headers['parent'], json={'name': name})
+    assert response.status_code == 201
+    return response.get_json()['child']
+
+@pytest.mark.parametrize('q, names', [
+    ('سا', ['سارة أحمد']),
+    ('ساره', ['سارة أحمد']),
+    ('سَارَة', ['سارة أحمد']),
+    ('احمد', ['سارة أحمد']),
+    ('الرحمن', ['عبد الرحمن خالد']),
+    ('رحمن', ['عبد الرحمن خالد']),
+    ('عبد خا', ['عبد الرحمن خالد']),
+    ('عبد سارة', []),
+    ('  ', []),
+])
+def test_prefix_lookup_is_normalized(client, headers, children, q, names):
+    assert lookup(client, headers['staff'], q) == names
+
+def test_names_starting_with_the_query_come_first(client, headers, children):
+    # "محمد علي" يبدأ بالبحث، و"علي محمد" يطابق بكلمة لاحقة
+    child = add_child(client, headers, 'علي محمد')
+    client.post(f'/api/children/{child["id"]}/approve', headers=headers['admin'])
+
+    assert lookup(client, headers['staff'], 'محم') == ['محمد علي', 'علي محمد']
+    assert lookup(client, headers['staff'], 'محم', limit=1) == ['محمد علي']
+
+def test_index_follows_add_approve_edit_and_reject(client, headers, children):
+    assert lookup(client, headers['staff'], 'ليان') == []
+
+    child = add_child(client, headers, 'ليان يوسف')
+    assert lookup(client, headers['staff'], 'ليان') == []
+
+    client.post(f'/api/children/{child["id"]}/approve', headers=headers['admin'])
+    assert lookup(client, headers['staff'], 'ليان') == ['ليان يوسف']
+    assert scan(client, headers['staff'], child['qr_code']).status_code == 200
+
+    client.put(f'/api/children/{child["id"]}', headers=headers['parent'], json={'name': 'لين يوسف'})
+    assert lookup(client, headers['staff'], 'ليان') == []
+    assert lookup(client, headers['staff'], 'لين') == ['لين يوسف']
+
+    client.post(f'/api/children/{child["id"]}/reject', headers=headers['admin'], json={})
+    assert lookup(client, headers['staff'], 'يوسف') == []
+    assert scan(client, headers['staff'], child['qr_code']).status_code == 404
+
+def test_lookup_does_not_query_children(client, headers, children):
+    lookup(client, headers['staff'], 'سا')
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(Engine, 'before_cursor_execute', listener)
+    try:
+        for q in ('س', 'سا', 'سار', 'سارة'):
+            lookup(client, headers['staff'], q)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listener)
+
+    assert [statement for statement in statements if 'children' in statement] == []
+
+def test_lookup_is_for_staff(client, headers, children):
+    assert client.get('/api/children/lookup?q=سا', headers=headers['parent']).status_code == 403
@@ -0,0 +1,32 @@
+from flask import Flask
+from sqlalchemy import text
+from src.models.user import db
+from src.utils.database import configure_database
+
+def pragma(name):
+    return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+def test_sqlite_connections_are_tuned(app):
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('busy_timeout') == 5000
+    assert pragma('cache_size') == -64000
+
+def test_server_database_gets_a_pool(monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://user:pass@db/app')
+    monkeypatch.setenv('DB_POOL_SIZE', '4')
+    app = Flask(__name__)
+
+    configure_database(app, str(tmp_path / 'app.db'))
+
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    assert options['pool_size'] == 4
+    assert options['pool_pre_ping'] is True
+
+def test_sqlite_keeps_default_engine_options(monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = Flask(__name__)
+
+    configure_database(app, str(tmp_path / 'app.db'))
+
+    assert 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config
@@ -0,0 +1,66 @@
+from datetime import datetime, date
+import pytest
+from src.models import user as user_module
+from src.models.user import db, Attendance, AttendanceDailyRollup, DailyUpdate, local_day
+from src.utils import attendance_analytics
+
+@pytest.fixture
+def offset(monkeypatch):
+    """الحضانة بتوقيت UTC+3"""
+    monkeypatch.setattr(user_module, 'UTC_OFFSET_MINUTES', 180)
+    monkeypatch.setattr(attendance_analytics, 'UTC_OFFSET_MINUTES', 180)
+
+def test_local_day(offset):
+    assert local_day(datetime(2024, 5, 1, 20, 59)) == date(2024, 5, 1)
+    assert local_day(datetime(2024, 5, 1, 21, 0)) == date(2024, 5, 2)
+
+def test_negative_offset(monkeypatch):
+    monkeypatch.setattr(user_module, 'UTC_OFFSET_MINUTES', -300)
+
+    assert local_day(datetime(2024, 5, 2, 4, 59)) == date(2024, 5, 1)
+
+def test_late_evening_records_are_stored_on_the_local_day(offset, users, children):
+    late_evening = datetime(2024, 5, 1, 22, 30)
+    attendance = Attendance(child_id=children[0].id, staff_id=users['staff'].id,
+                            status='check_in', timestamp=late_evening)
+    update = DailyUpdate(child_id=children[0].id, staff_id=users['staff'].id,
+                         note='نام مبكراً', created_at=late_evening)
+    db.session.add_all([attendance, update])
+    db.session.commit()
+
+    assert attendance.day == date(2024, 5, 2)
+    assert update.day == date(2024, 5, 2)
+
+def test_stats_history_and_analytics_agree_on_the_day(offset, client, headers, children):
+    # دخول وخروج بعد منتصف الليل بالتوقيت المحلي (01:30 و 02:30)
+    response = client.post('/api/attendance/scan-qr/batch', headers=headers['staff'], json={'scans': [
+        {'idempotency_key': 'k1', 'qr_code': children[0].qr_code, 'timestamp': '2024-05-01T22:30:00Z'},
+        {'idempotency_key': 'k2', 'qr_code': children[0].qr_code, 'timestamp': '2024-05-01T23:30:00Z'},
+    ]})
+    assert response.get_json()['summary'] == {'recorded': 2}
+
+    assert db.session.get(AttendanceDailyRollup, date(2024, 5, 2)).present_count == 1
+    assert db.session.get(AttendanceDailyRollup, date(2024, 5, 1)) is None
+
+    history = client.get(f'/api/attendance/child/{children[0].id}/history?from=2024-05-02&to=2024-05-02',
+                         headers=headers['admin']).get_json()
+    assert [day['date'] for day in history['attendance_history']] == ['2024-05-02']
+
+    analytics = client.get('/api/attendance/analytics?from=2024-05-02&to=2024-05-02',
+                           headers=headers['admin']).get_json()
+    assert analytics['overall']['visits'] == 1
+    assert analytics['children'][0]['days_attended'] == 1
+
+def test_rebuild_days_after_changing_the_offset(app, monkeypatch, users, children):
+    attendance = Attendance(child_id=children[0].id, staff_id=users['staff'].id,
+                            status='check_in', timestamp=datetime(2024, 5, 1, 22, 30))
+    db.session.add(attendance)
+    db.session.commit()
+    assert attendance.day == date(2024, 5, 1)
+
+    monkeypatch.setattr(user_module, 'UTC_OFFSET_MINUTES', 180)
+    result = app.test_cli_runner().invoke(args=['attendance', 'rebuild-days'])
+
+    assert 'Updated 1 records' in result.output
+    db.session.expire_all()
+    assert db.session.get(Attendance, attendance.id).day == date(2024, 5, 2)
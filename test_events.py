@@ -0,0 +1,92 @@
+import json
+import time
+import pytest
+from src.models.user import db, LiveEvent
+from src.routes import events as events_module
+
+@pytest.fixture
+def polls(monkeypatch):
+    """دورات البث: كل انتظار بين دورتين ينفذ الخطوة التالية من القائمة، ثم ينتهي البث"""
+    steps = []
+
+    class Clock:
+        monotonic = staticmethod(time.monotonic)
+
+        @staticmethod
+        def sleep(seconds):
+            if steps:
+                steps.pop(0)()
+            else:
+                monkeypatch.setattr(events_module, 'MAX_STREAM_SECONDS', 0)
+
+    monkeypatch.setattr(events_module, 'time', Clock)
+    return steps
+
+def add_event(child, event_id=None):
+    event = LiveEvent(id=event_id, event_type='check_in', child_id=child.id,
+                      parent_id=child.parent_id, payload={'child_id': child.id})
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+def stream(client, headers, cursor=None):
+    response = client.get('/api/events/stream' + (f'?cursor={cursor}' if cursor is not None else ''), headers=headers)
+    assert response.status_code == 200
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((int(fields['id']), json.loads(fields['data'])['id']))
+    return events
+
+def test_resume_rescans_the_window_before_the_cursor(client, headers, children, polls):
+    # الحدث عند المؤشر يعاد إرساله، والعميل يتجاهله حسب id
+    first = add_event(children[0])
+    second = add_event(children[1])
+
+    assert [event_id for _, event_id in stream(client, headers['staff'], cursor=first)] == [first, second]
+
+def test_late_committed_event_is_not_skipped(client, headers, children, polls):
+    # المعرف 2 حجز قبل 3 لكن معاملته حفظت بعد أن أرسل 3
+    add_event(children[0], 1)
+    add_event(children[0], 3)
+    polls.append(lambda: add_event(children[1], 2))
+
+    events = stream(client, headers['staff'], cursor=1)
+
+    assert [event_id for _, event_id in events] == [1, 3, 2]
+    # المؤشر لا يرجع إلى الخلف مع الحدث المتأخر
+    assert [cursor for cursor, _ in events] == [1, 3, 3]
+
+def test_stream_without_cursor_starts_from_now(client, headers, children, polls):
+    add_event(children[0])
+    polls.append(lambda: add_event(children[1]))
+
+    events = stream(client, headers['staff'])
+
+    assert [event_id for _, event_id in events] == [LiveEvent.query.count()]
+
+def test_parents_only_receive_their_children_events(client, users, headers, children, polls):
+    other_parent_event = LiveEvent(event_type='check_in', child_id=children[0].id,
+                                   parent_id=users['staff'].id, payload={})
+    db.session.add(other_parent_event)
+    db.session.commit()
+    own = add_event(children[0])
+
+    assert [event_id for _, event_id in stream(client, headers['parent'], cursor=0)] == [own]
+
+def events_token(client, headers):
+    return client.post('/api/auth/access-token', headers=headers, json={'scope': 'events'}).get_json()['access_token']
+
+def test_stream_accepts_an_events_token(client, headers, polls):
+    token = events_token(client, headers['parent'])
+
+    assert client.get(f'/api/events/stream?access_token={token}').status_code == 200
+
+def test_stream_rejects_login_and_media_tokens_in_the_query_string(client, headers):
+    login_token = headers['parent']['Authorization'][len('Bearer '):]
+    media_token = client.post('/api/auth/access-token', headers=headers['parent'],
+                              json={'scope': 'media'}).get_json()['access_token']
+
+    assert client.get(f'/api/events/stream?access_token={login_token}').status_code == 401
+    assert client.get(f'/api/events/stream?access_token={media_token}').status_code == 401
@@ -0,0 +1,92 @@
+import hashlib
+import pytest
+from src.models.user import db, MediaAsset, DailyUpdate
+from conftest import auth_header
+
+def add_asset(tmp_path, kind='image', variants=None, status='ready'):
+    content = b'media content'
+    path = tmp_path / f'original.{"jpg" if kind == "image" else "mp4"}'
+    path.write_bytes(content)
+    asset = MediaAsset(kind=kind, content_type='image/jpeg' if kind == 'image' else 'video/mp4',
+                       size=len(content), sha256=hashlib.sha256(content).hexdigest(),
+                       storage_path=str(path), variants=variants or {}, status=status)
+    db.session.add(asset)
+    db.session.commit()
+    return asset
+
+def media_url(asset, variant='original'):
+    return f'/api/daily-updates/media/{asset.id}/{variant}'
+
+def share_with_parent(asset, child, staff):
+    db.session.add(DailyUpdate(child_id=child.id, staff_id=staff.id, photo_url=media_url(asset, 'preview')))
+    db.session.commit()
+
+def media_token(client, headers):
+    response = client.post('/api/auth/access-token', headers=headers, json={'scope': 'media'})
+    assert response.status_code == 200
+    return response.get_json()['access_token']
+
+def test_media_requires_a_token(client, tmp_path, users):
+    asset = add_asset(tmp_path)
+
+    assert client.get(media_url(asset)).status_code == 401
+
+def test_staff_can_view_any_media(client, tmp_path, headers):
+    asset = add_asset(tmp_path)
+
+    response = client.get(media_url(asset), headers=headers['staff'])
+
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'].startswith('private')
+
+def test_parent_sees_only_media_shared_with_their_children(client, tmp_path, users, headers, children):
+    asset = add_asset(tmp_path)
+    token = media_token(client, headers['parent'])
+
+    assert client.get(f'{media_url(asset)}?access_token={token}').status_code == 403
+
+    share_with_parent(asset, children[0], users['staff'])
+    assert client.get(f'{media_url(asset)}?access_token={token}').status_code == 200
+
+def test_login_token_is_not_accepted_in_the_query_string(client, tmp_path, headers):
+    asset = add_asset(tmp_path)
+    login_token = headers['staff']['Authorization'][len('Bearer '):]
+
+    assert client.get(f'{media_url(asset)}?access_token={login_token}').status_code == 401
+
+def test_scoped_token_is_not_a_login_token(client, headers):
+    token = media_token(client, headers['staff'])
+
+    assert client.get('/api/auth/profile', headers={'Authorization': f'Bearer {token}'}).status_code == 401
+
+def test_expired_media_token(client, tmp_path, users):
+    asset = add_asset(tmp_path)
+    token = auth_header(users['staff'].id, scope='media', exp=1)['Authorization'][len('Bearer '):]
+
+    assert client.get(f'{media_url(asset)}?access_token={token}').status_code == 401
+
+def test_unknown_scope(client, headers):
+    assert client.post('/api/auth/access-token', headers=headers['staff'], json={'scope': 'admin'}).status_code == 400
+
+def test_missing_video_thumbnail_is_not_redirected_to_the_video(client, tmp_path, headers):
+    asset = add_asset(tmp_path, kind='video')
+
+    assert client.get(media_url(asset, 'thumbnail'), headers=headers['staff']).status_code == 404
+
+@pytest.mark.parametrize('kind, variant', [('video', 'preview'), ('image', 'thumbnail')])
+def test_missing_variant_of_the_same_type_falls_back_to_the_original(client, tmp_path, headers, kind, variant):
+    asset = add_asset(tmp_path, kind=kind)
+    token = media_token(client, headers['staff'])
+
+    response = client.get(f'{media_url(asset, variant)}?access_token={token}')
+
+    assert response.status_code == 307
+    assert response.headers['Location'].endswith(f'{media_url(asset)}?access_token={token}')
+
+def test_variant_still_processing(client, tmp_path, headers):
+    asset = add_asset(tmp_path, status='processing')
+
+    response = client.get(media_url(asset, 'preview'), headers=headers['staff'])
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
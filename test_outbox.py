@@ -0,0 +1,143 @@
+from flask import Flask
+from datetime import datetime, timedelta
+import json
+import pytest
+from src.models.user import db, User, NotificationOutbox
+from src.utils import outbox
+from src.utils.outbox import enqueue_notification, drain_outbox, claim_outbox, FileTransport, COALESCE_WINDOW
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'outbox.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def parents(app):
+    users = [
+        User(name=f'parent {i}', email=f'parent{i}@example.com', role='parent', password_hash='x')
+        for i in range(2)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+@pytest.fixture
+def transport(tmp_path):
+    return FileTransport(str(tmp_path / 'notifications' / 'sent.jsonl'))
+
+def due_time():
+    """وقت بعد انتهاء نافذة التجميع لكل ما أضيف الآن"""
+    return datetime.utcnow() + timedelta(seconds=COALESCE_WINDOW + 1)
+
+def sent_lines(transport):
+    try:
+        with open(transport.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+    except FileNotFoundError:
+        return []
+
+def enqueue(parent_id, count):
+    for i in range(count):
+        enqueue_notification(parent_id, None, 'attendance', {'n': i})
+    db.session.commit()
+
+def statuses():
+    return sorted(status for (status,) in db.session.query(NotificationOutbox.status))
+
+def test_events_are_batched_per_parent(parents, transport):
+    enqueue(parents[0], 3)
+    enqueue(parents[1], 2)
+
+    assert drain_outbox(transport, now=due_time()) == (5, 0, 0)
+
+    lines = sent_lines(transport)
+    assert sorted(line['parent_id'] for line in lines) == sorted(parents)
+    by_parent = {line['parent_id']: line['events'] for line in lines}
+    assert [event['payload']['n'] for event in by_parent[parents[0]]] == [0, 1, 2]
+    assert [event['payload']['n'] for event in by_parent[parents[1]]] == [0, 1]
+    assert statuses() == ['sent'] * 5
+
+def test_nothing_is_sent_inside_the_coalesce_window(parents, transport):
+    enqueue(parents[0], 2)
+
+    assert drain_outbox(transport) == (0, 0, 0)
+    assert sent_lines(transport) == []
+
+def test_sent_notifications_are_not_sent_again(parents, transport):
+    enqueue(parents[0], 2)
+    now = due_time()
+
+    assert drain_outbox(transport, now=now) == (2, 0, 0)
+    assert drain_outbox(transport, now=now) == (0, 0, 0)
+    assert drain_outbox(transport, now=now + timedelta(days=1)) == (0, 0, 0)
+    assert len(sent_lines(transport)) == 1
+
+def test_failed_send_is_retried_after_backoff(parents, transport, tmp_path):
+    enqueue(parents[0], 2)
+    now = due_time()
+
+    # مجلد الوجهة ملف عادي، فيفشل الإرسال
+    (tmp_path / 'blocked').write_text('')
+    broken = FileTransport(str(tmp_path / 'blocked' / 'sent.jsonl'))
+    assert drain_outbox(broken, now=now) == (0, 2, 0)
+
+    rows = NotificationOutbox.query.all()
+    assert all(row.status == 'pending' and row.attempts == 1 and row.last_error for row in rows)
+    assert all(row.available_at > now for row in rows)
+
+    # قبل موعد إعادة المحاولة لا يرسل شيء حتى لو عادت الوجهة للعمل
+    assert drain_outbox(transport, now=now) == (0, 0, 0)
+    assert sent_lines(transport) == []
+
+    retry_at = max(row.available_at for row in rows) + timedelta(seconds=1)
+    assert drain_outbox(transport, now=retry_at) == (2, 0, 0)
+    assert len(sent_lines(transport)) == 1
+    assert statuses() == ['sent', 'sent']
+
+def test_backoff_grows_with_each_attempt(parents, tmp_path):
+    enqueue(parents[0], 1)
+    (tmp_path / 'blocked').write_text('')
+    broken = FileTransport(str(tmp_path / 'blocked' / 'sent.jsonl'))
+
+    now = due_time()
+    delays = []
+    for _ in range(3):
+        assert drain_outbox(broken, now=now) == (0, 1, 0)
+        row = NotificationOutbox.query.one()
+        delays.append(row.available_at - now)
+        now = row.available_at + timedelta(seconds=1)
+
+    assert delays[0] < delays[1] < delays[2]
+
+def test_notification_is_dead_after_max_attempts(parents, tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox, 'MAX_ATTEMPTS', 2)
+    enqueue(parents[0], 1)
+    (tmp_path / 'blocked').write_text('')
+    broken = FileTransport(str(tmp_path / 'blocked' / 'sent.jsonl'))
+
+    now = due_time()
+    assert drain_outbox(broken, now=now) == (0, 1, 0)
+    now = NotificationOutbox.query.one().available_at + timedelta(seconds=1)
+    assert drain_outbox(broken, now=now) == (0, 0, 1)
+    assert statuses() == ['dead']
+
+def test_claimed_rows_are_skipped_until_the_lease_expires(parents, transport):
+    enqueue(parents[0], 2)
+    now = due_time()
+
+    # عامل حجز الدفعة ثم توقف قبل الإرسال
+    claimed = claim_outbox(now=now)
+    assert [parent_id for parent_id, *_ in claimed] == [parents[0]]
+    assert statuses() == ['sending', 'sending']
+
+    assert drain_outbox(transport, now=now) == (0, 0, 0)
+    assert sent_lines(transport) == []
+
+    after_lease = now + timedelta(seconds=outbox.LEASE_SECONDS + 1)
+    assert drain_outbox(transport, now=after_lease) == (2, 0, 0)
+    assert len(sent_lines(transport)) == 1
@@ -0,0 +1,66 @@
+from datetime import datetime, date
+import pytest
+from src.models.user import db, Attendance, DailyUpdate
+from src.utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+
+def pages(client, url, headers, key):
+    """جمع كل الصفحات بتتبع next_cursor"""
+    items, cursor = [], None
+    while True:
+        separator = '&' if '?' in url else '?'
+        response = client.get(url + (f'{separator}cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        items.extend(body[key])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return items
+
+def test_cursor_round_trip():
+    values = [date(2024, 5, 1), datetime(2024, 5, 1, 8, 30), 7]
+
+    assert decode_cursor(encode_cursor(values), [date, datetime, int]) == values
+
+@pytest.mark.parametrize('cursor', ['not-base64!', encode_cursor([1, 2]), encode_cursor(['1']), encode_cursor([True])])
+def test_malformed_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, [int])
+
+def test_children_pages_cover_every_child_once(client, headers, children):
+    listed = pages(client, '/api/children/all?limit=2', headers['admin'], 'children')
+
+    assert [child['id'] for child in listed] == [child.id for child in children]
+
+def test_invalid_cursor_is_rejected(client, headers, children):
+    response = client.get('/api/children/all?cursor=bad', headers=headers['admin'])
+
+    assert response.status_code == 400
+
+def test_updates_with_equal_timestamps_span_pages(client, users, headers, children):
+    # نفس وقت الإنشاء لعدة تحديثات: المعرف يفصل بينها على حدود الصفحة
+    created_at = datetime.utcnow()
+    updates = [DailyUpdate(child_id=children[0].id, staff_id=users['staff'].id, note=f'note {i}',
+                           created_at=created_at) for i in range(5)]
+    db.session.add_all(updates)
+    db.session.commit()
+
+    days = pages(client, f'/api/daily-updates/child/{children[0].id}/history?limit=2',
+                 headers['parent'], 'updates_history')
+
+    listed = [update['id'] for day in days for update in day['updates']]
+    assert listed == sorted(update.id for update in updates)[::-1]
+
+def test_history_records_are_paginated_within_the_range(client, users, headers, children):
+    db.session.add_all([
+        Attendance(child_id=children[0].id, staff_id=users['staff'].id,
+                   status='check_in' if i % 2 == 0 else 'check_out', timestamp=datetime(2024, 5, 1, 8 + i))
+        for i in range(5)
+    ] + [Attendance(child_id=children[0].id, staff_id=users['staff'].id,
+                    status='check_in', timestamp=datetime(2024, 5, 2, 8))])
+    db.session.commit()
+
+    records = pages(client, f'/api/attendance/child/{children[0].id}/history'
+                            '?from=2024-05-01&to=2024-05-01&include_records=1&limit=2',
+                    headers['admin'], 'records')
+
+    assert [record['timestamp'] for record in records] == [f'2024-05-01T{hour:02d}:00:00' for hour in range(12, 7, -1)]
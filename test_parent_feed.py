@@ -0,0 +1,79 @@
+from src.models.user import db, User, Child
+from src.routes.parents import feed_cache
+from conftest import auth_header, scan
+
+def feed(client, headers, etag=None):
+    return client.get('/api/parents/me/feed', headers=dict(headers, **({'If-None-Match': etag} if etag else {})))
+
+def add_update(client, headers, child, note):
+    response = client.post('/api/daily-updates/add', headers=headers, json={'child_id': child.id, 'note': note})
+    assert response.status_code == 201
+    return response.get_json()['update']['id']
+
+def test_feed_has_children_presence_and_today_updates(client, users, headers, children):
+    scan(client, headers['staff'], children[0].qr_code)
+    add_update(client, headers['staff'], children[1], 'نامت ساعة')
+
+    body = feed(client, headers['parent']).get_json()
+
+    assert [child['id'] for child in body['children']] == [child.id for child in children]
+    assert [child['current_status'] for child in body['children']] == ['present', 'absent', 'absent']
+    assert body['present_count'] == 1
+    updates = body['children'][1]['updates']
+    assert [(update['note'], update['staff']['id']) for update in updates] == [('نامت ساعة', users['staff'].id)]
+    assert body['events_cursor'] > 0
+
+def test_unchanged_feed_is_not_modified(client, headers, children):
+    etag = feed(client, headers['parent']).headers['ETag']
+
+    response = feed(client, headers['parent'], etag)
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+def test_scan_update_and_child_edit_change_the_etag(client, headers, children):
+    etags = [feed(client, headers['parent']).headers['ETag']]
+
+    scan(client, headers['staff'], children[0].qr_code)
+    etags.append(feed(client, headers['parent'], etags[-1]).headers['ETag'])
+
+    update_id = add_update(client, headers['staff'], children[0], 'أكل جيداً')
+    etags.append(feed(client, headers['parent'], etags[-1]).headers['ETag'])
+
+    client.delete(f'/api/daily-updates/{update_id}', headers=headers['staff'])
+    etags.append(feed(client, headers['parent'], etags[-1]).headers['ETag'])
+
+    client.put(f'/api/children/{children[0].id}', headers=headers['parent'], json={'name': 'محمد'})
+    response = feed(client, headers['parent'], etags[-1])
+
+    assert response.status_code == 200
+    assert response.get_json()['children'][0]['name'] == 'محمد'
+    assert len(set(etags + [response.headers['ETag']])) == 5
+
+def test_other_families_do_not_change_the_etag(client, headers, children):
+    other_parent = User(name='other', email='other@example.com', phone='0500000001', role='parent', password_hash='-')
+    db.session.add(other_parent)
+    db.session.flush()
+    other_child = Child(name='ليان', parent_id=other_parent.id, is_approved=True)
+    other_child.generate_qr_code()
+    db.session.add(other_child)
+    db.session.commit()
+    etag = feed(client, headers['parent']).headers['ETag']
+
+    scan(client, headers['staff'], other_child.qr_code)
+
+    assert feed(client, headers['parent'], etag).status_code == 304
+    other = feed(client, auth_header(other_parent.id)).get_json()
+    assert [child['current_status'] for child in other['children']] == ['present']
+
+def test_payload_is_built_once_per_version(client, headers, children):
+    feed(client, headers['parent'])
+    hits = feed_cache.hits
+
+    assert feed(client, headers['parent']).status_code == 200
+    assert feed_cache.hits == hits + 1
+
+def test_feed_is_for_parents_only(client, headers):
+    assert feed(client, headers['staff']).status_code == 403
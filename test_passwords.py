@@ -0,0 +1,81 @@
+from werkzeug.security import generate_password_hash
+import pytest
+from src.models import user as user_module
+from src.models.user import db, User, PasswordHasher, hash_parameters
+
+def make_hasher(method):
+    return PasswordHasher(method=method, workers=1, max_pending=4, timeout=30)
+
+@pytest.fixture
+def hasher(monkeypatch):
+    hasher = make_hasher('scrypt')
+    monkeypatch.setattr(user_module, 'password_hasher', hasher)
+    yield hasher
+    if hasher._executor is not None:
+        hasher._executor.shutdown()
+
+def test_hash_parameters():
+    assert hash_parameters('scrypt:32768:8:1$salt$hash') == ('scrypt', (32768, 8, 1))
+    assert hash_parameters('pbkdf2:sha256:600000$salt$hash') == ('pbkdf2:sha256', (600000,))
+    assert hash_parameters('sha256$salt$hash') == ('sha256', ())
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2', 'pbkdf2:sha512'])
+def test_shorthand_method_matches_its_own_hashes(method):
+    assert not make_hasher(method).needs_rehash(generate_password_hash('secret', method))
+
+def test_default_method_is_werkzeug_default():
+    hasher = make_hasher(None)
+
+    assert not hasher.needs_rehash(generate_password_hash('secret'))
+    assert hasher.target_parameters() == hash_parameters(generate_password_hash('secret'))
+
+def test_weaker_cost_is_rehashed():
+    assert make_hasher('pbkdf2').needs_rehash('pbkdf2:sha256:600000$salt$hash')
+    assert make_hasher('scrypt').needs_rehash('scrypt:16384:8:1$salt$hash')
+
+def test_stronger_cost_is_not_downgraded():
+    assert not make_hasher('pbkdf2:sha256:600000').needs_rehash('pbkdf2:sha256:1000000$salt$hash')
+    assert not make_hasher('scrypt:16384:8:1').needs_rehash('scrypt:32768:8:1$salt$hash')
+
+def test_different_algorithm_is_rehashed():
+    assert make_hasher('pbkdf2').needs_rehash('scrypt:32768:8:1$salt$hash')
+    assert make_hasher('scrypt').needs_rehash('pbkdf2:sha256:1000000$salt$hash')
+    assert make_hasher('pbkdf2:sha256').needs_rehash('pbkdf2:sha512:1000000$salt$hash')
+    assert make_hasher('scrypt').needs_rehash('sha256$salt$hash')
+
+def login(client):
+    return client.post('/api/auth/login', json={'email': 'parent@example.com', 'password': 'secret'})
+
+def create_parent(password_hash):
+    user = User(name='parent', email='parent@example.com', role='parent', password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def test_login_does_not_rehash_a_current_shorthand_hash(client, hasher):
+    user = create_parent(generate_password_hash('secret', 'scrypt'))
+    stored = user.password_hash
+
+    for _ in range(2):
+        assert login(client).status_code == 200
+        db.session.refresh(user)
+        assert user.password_hash == stored
+
+def test_login_upgrades_a_weaker_hash_once(client, hasher):
+    user = create_parent(generate_password_hash('secret', 'scrypt:16384:8:1'))
+
+    assert login(client).status_code == 200
+    db.session.refresh(user)
+    upgraded = user.password_hash
+    assert hash_parameters(upgraded) == ('scrypt', (32768, 8, 1))
+
+    assert login(client).status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash == upgraded
+
+def test_login_with_wrong_password(client, hasher):
+    create_parent(generate_password_hash('secret', 'scrypt'))
+
+    response = client.post('/api/auth/login', json={'email': 'parent@example.com', 'password': 'wrong'})
+
+    assert response.status_code == 401
@@ -0,0 +1,41 @@
+from flask import Flask
+import pytest
+from src.models.user import db, ChildPresence, local_today
+from src.utils.database import configure_database
+from conftest import scan, hold_writes_until_all_read, concurrent_scans
+
+def test_scans_alternate_check_in_and_check_out(client, headers, children):
+    assert scan(client, headers['staff'], children[0].qr_code).get_json()['status'] == 'check_in'
+    assert scan(client, headers['staff'], children[0].qr_code).get_json()['status'] == 'check_out'
+
+    presence = db.session.get(ChildPresence, children[0].id)
+    db.session.refresh(presence)
+    assert presence.status == 'check_out'
+    assert presence.current_status(local_today()) == 'absent'
+
+def test_concurrent_first_scans_do_not_collide(app, monkeypatch, headers, children):
+    # أول مسح لنفس الطفل من عدة أجهزة: لا يجد أي منها حالة سابقة
+    qr_codes = [child.qr_code for child in children[:2]] * 3
+    hold_writes_until_all_read(monkeypatch, len(qr_codes))
+
+    assert concurrent_scans(app, headers['staff'], qr_codes) == [200] * len(qr_codes)
+    assert ChildPresence.query.count() == 2
+
+def configure(monkeypatch, tmp_path, url):
+    if url is None:
+        monkeypatch.delenv('DATABASE_URL', raising=False)
+    else:
+        monkeypatch.setenv('DATABASE_URL', url)
+    app = Flask(__name__)
+    configure_database(app, str(tmp_path / 'database' / 'app.db'))
+    return app.config['SQLALCHEMY_DATABASE_URI']
+
+def test_default_database_is_local_sqlite(monkeypatch, tmp_path):
+    assert configure(monkeypatch, tmp_path, None) == f"sqlite:///{tmp_path / 'database' / 'app.db'}"
+
+def test_legacy_postgres_scheme_is_accepted(monkeypatch, tmp_path):
+    assert configure(monkeypatch, tmp_path, 'postgres://user:pass@db/app') == 'postgresql://user:pass@db/app'
+
+def test_unsupported_backend_is_rejected_at_startup(monkeypatch, tmp_path):
+    with pytest.raises(RuntimeError, match='mysql'):
+        configure(monkeypatch, tmp_path, 'mysql://user:pass@db/app')
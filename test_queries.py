@@ -0,0 +1,71 @@
+import pytest
+from src.models.user import db, User, Child, DailyUpdate
+from src.utils.database import query_count_header
+from conftest import scan
+
+@pytest.fixture
+def counted(app):
+    app.config['QUERY_COUNT_HEADER'] = True
+    query_count_header(app)
+    return app.test_client()
+
+def add_families(count, staff):
+    """أطفال لأولياء أمور مختلفين (معتمد مع تحديث اليوم، وآخر بانتظار الموافقة)"""
+    start = User.query.count()
+    for i in range(start, start + count):
+        parent = User(name=f'parent {i}', email=f'family{i}@example.com', role='parent', password_hash='-')
+        db.session.add(parent)
+        db.session.flush()
+        child = Child(name=f'child {i}', parent_id=parent.id, is_approved=True)
+        db.session.add_all([child, Child(name=f'pending {i}', parent_id=parent.id)])
+        db.session.flush()
+        child.generate_qr_code()
+        db.session.add(DailyUpdate(child_id=child.id, staff_id=staff.id, note=f'note {i}', activity_type='play'))
+    db.session.commit()
+
+def query_count(client, url, headers):
+    client.get(url, headers=headers)  # تسخين ذاكرة المستخدمين المؤقتة
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+def test_header_is_off_by_default(client, headers):
+    response = client.get('/api/children/all', headers=headers['admin'])
+
+    assert 'X-Query-Count' not in response.headers
+
+def test_header_in_debug_mode(app, headers):
+    query_count_header(app)
+    app.debug = True
+
+    assert 'X-Query-Count' in app.test_client().get('/api/children/all', headers=headers['admin']).headers
+
+@pytest.mark.parametrize('url, role', [
+    ('/api/children/all', 'admin'),
+    ('/api/children/pending-approval', 'admin'),
+    ('/api/attendance/today', 'staff'),
+    ('/api/daily-updates/today', 'staff'),
+])
+def test_list_queries_do_not_grow_with_rows(counted, users, headers, url, role):
+    add_families(2, users['staff'])
+    few = query_count(counted, url, headers[role])
+
+    add_families(8, users['staff'])
+    assert query_count(counted, url, headers[role]) == few
+
+def test_parent_updates_do_not_grow_with_children(counted, users, headers, children):
+    for child in children[:1]:
+        db.session.add(DailyUpdate(child_id=child.id, staff_id=users['staff'].id, note='x'))
+    db.session.commit()
+    few = query_count(counted, '/api/daily-updates/my-children/today', headers['parent'])
+
+    for child in children[1:]:
+        db.session.add(DailyUpdate(child_id=child.id, staff_id=users['staff'].id, note='y'))
+    db.session.commit()
+    assert query_count(counted, '/api/daily-updates/my-children/today', headers['parent']) == few
+
+def test_scan_query_count_is_fixed(counted, headers, children):
+    first = scan(counted, headers['staff'], children[0].qr_code)
+    second = scan(counted, headers['staff'], children[1].qr_code)
+
+    assert int(second.headers['X-Query-Count']) <= int(first.headers['X-Query-Count'])
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from sqlalchemy.orm import Query
+from src.models.user import Registration, RegistrationStatusCount
+
+# المسارات مكررة البادئة كما في main.py
+BASE = '/api/registration/api/registration'
+
+def submit(client, child_name='محمد علي', phone='0501234567', email='parent@example.com'):
+    response = client.post(f'{BASE}/submit', data={
+        'childName': child_name, 'parentName': 'علي', 'phoneNumber': phone, 'email': email
+    })
+    assert response.status_code == 200
+    return response.get_json()['registration_number']
+
+def test_submitted_registration_is_found_by_number(client):
+    number = submit(client)
+
+    response = client.get(f'{BASE}/{number}')
+
+    registration = response.get_json()['registration']
+    assert registration['child_data']['name'] == 'محمد علي'
+    assert registration['status'] == 'pending_review'
+
+def test_unknown_registration_number(client):
+    assert client.get(f'{BASE}/BK-000000').status_code == 404
+
+def test_each_submission_is_its_own_row(client):
+    numbers = {submit(client) for _ in range(3)}
+
+    assert len(numbers) == 3
+    assert Registration.query.count() == 3
+
+def legacy_record(number, status='pending_review'):
+    return {
+        'registration_number': number,
+        'submission_date': '2024-05-01T10:00:00',
+        'status': status,
+        'child_data': {'name': 'سارة'},
+        'parent_data': {'phone': '0509999999', 'email': 'legacy@example.com'},
+        'uploaded_files': [],
+    }
+
+def test_import_json_skips_already_imported_numbers(app):
+    os.makedirs('data')
+    with open('data/registrations.json', 'w', encoding='utf-8') as f:
+        json.dump([legacy_record('BK-AAAAAA'), legacy_record('BK-BBBBBB', 'approved')], f)
+    runner = app.test_cli_runner()
+
+    assert 'Imported 2 of 2' in runner.invoke(args=['registration', 'import-json']).output
+    assert 'Imported 0 of 2' in runner.invoke(args=['registration', 'import-json']).output
+
+    registration = Registration.query.filter_by(registration_number='BK-AAAAAA').one()
+    assert registration.phone_normalized is not None
+    assert {counter.status: counter.count for counter in RegistrationStatusCount.query.all()} == {
+        'pending_review': 1, 'approved': 1
+    }
+
+def test_import_json_without_a_file(app):
+    result = app.test_cli_runner().invoke(args=['registration', 'import-json'])
+
+    assert 'nothing to import' in result.output
+
+def test_duplicates_match_normalized_name_and_contact(client, headers):
+    first = submit(client, child_name='محمد  علي', phone='+966 50 123 4567')
+    submit(client, child_name='سارة')
+
+    response = client.get(f'{BASE}/duplicates?child_name=محمد علي&phone=0501234567', headers=headers['staff'])
+
+    assert [registration['registration_number'] for registration in response.get_json()['duplicates']] == [first]
+
+def test_duplicates_of_a_registration_exclude_itself(client, headers):
+    first = submit(client)
+    second = submit(client)
+
+    response = client.get(f'{BASE}/{second}/duplicates', headers=headers['admin'])
+
+    assert [registration['registration_number'] for registration in response.get_json()['duplicates']] == [first]
+
+def test_duplicates_require_staff(client, headers):
+    number = submit(client)
+
+    assert client.get(f'{BASE}/{number}/duplicates').status_code == 401
+    assert client.get(f'{BASE}/{number}/duplicates', headers=headers['parent']).status_code == 403
+    assert client.get(f'{BASE}/duplicates?child_name=x&phone=1', headers=headers['parent']).status_code == 403
+
+def test_list_filters_by_status(client):
+    number = submit(client)
+    submit(client)
+    client.put(f'{BASE}/{number}/status', json={'status': 'approved'})
+
+    response = client.get(f'{BASE}/list?status=approved')
+
+    assert [registration['registration_number'] for registration in response.get_json()['registrations']] == [number]
+
+def test_list_filters_on_normalized_contact_and_name(client):
+    number = submit(client, child_name='سارة أحمد', phone='+966 50 111 2222', email='Mother@Example.com')
+    submit(client, child_name='سارة', phone='0503334444')
+
+    def numbers(query):
+        return [registration['registration_number']
+                for registration in client.get(f'{BASE}/list?{query}').get_json()['registrations']]
+
+    assert numbers('phone=0501112222') == [number]
+    assert numbers('email=mother@example.com') == [number]
+    assert numbers('child_name=ساره احمد') == [number]
+
+def test_list_is_sorted_and_paginated(client):
+    numbers = [submit(client, phone=f'050000000{i}') for i in range(3)]
+
+    first = client.get(f'{BASE}/list?sort=submission_date&limit=2').get_json()
+    second = client.get(f'{BASE}/list?sort=submission_date&limit=2&cursor={first["next_cursor"]}').get_json()
+
+    assert [registration['registration_number'] for registration in first['registrations'] + second['registrations']] == numbers
+    assert first['total'] == 3 and second['next_cursor'] is None
+    assert client.get(f'{BASE}/list?sort=name').status_code == 400
+
+def stats(client):
+    return client.get(f'{BASE}/stats').get_json()['stats']
+
+def test_stats_follow_submissions_and_status_changes(client):
+    numbers = [submit(client) for _ in range(3)]
+    client.put(f'{BASE}/{numbers[0]}/status', json={'status': 'approved'})
+    client.put(f'{BASE}/{numbers[0]}/status', json={'status': 'approved', 'notes': 'تم الاتصال'})
+
+    result = stats(client)
+    assert (result['total'], result['pending'], result['approved']) == (3, 2, 1)
+    assert result['today'] == result['this_week'] == result['this_month'] == 3
+
+def test_concurrent_status_changes_move_the_counters_once(app, monkeypatch, client):
+    number = submit(client)
+    # الطلبان يقرآن الحالة نفسها قبل أن يكتب أي منهما
+    barrier = threading.Barrier(2, timeout=10)
+    update = Query.update
+
+    def update_after_both_read(self, *args, **kwargs):
+        barrier.wait()
+        return update(self, *args, **kwargs)
+
+    monkeypatch.setattr(Query, 'update', update_after_both_read)
+    statuses = []
+
+    def change(status):
+        response = app.test_client().put(f'{BASE}/{number}/status', json={'status': status})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=change, args=(status,)) for status in ('approved', 'rejected')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200, 409]
+    result = stats(client)
+    assert result['pending'] == 0
+    assert result['approved'] + result['rejected'] == 1
@@ -0,0 +1,54 @@
+from src.models.user import db, AttendanceDailyRollup, local_today
+from conftest import scan, hold_writes_until_all_read, concurrent_scans
+
+def today_stats(client, headers):
+    response = client.get('/api/attendance/stats?days=1', headers=headers['admin'])
+    assert response.status_code == 200
+    return response.get_json()['daily_stats'][0]
+
+def test_days_without_scans_report_the_current_roster(client, headers, children):
+    stats = today_stats(client, headers)
+
+    assert stats['date'] == local_today().isoformat()
+    assert (stats['present'], stats['total_children']) == (0, 3)
+
+def test_child_is_counted_once_per_day(client, headers, children):
+    for _ in range(3):
+        scan(client, headers['staff'], children[0].qr_code)  # دخول، خروج، دخول
+    scan(client, headers['staff'], children[1].qr_code)
+
+    stats = today_stats(client, headers)
+    assert (stats['present'], stats['absent']) == (2, 1)
+    assert stats['attendance_rate'] == round(2 / 3 * 100, 2)
+
+def test_rollup_tracks_first_and_last_scan(client, headers, children):
+    first = scan(client, headers['staff'], children[0].qr_code).get_json()['attendance']
+    last = scan(client, headers['staff'], children[1].qr_code).get_json()['attendance']
+
+    rollup = db.session.get(AttendanceDailyRollup, local_today())
+    db.session.refresh(rollup)
+    assert rollup.first_scan_at.isoformat() == first['timestamp']
+    assert rollup.last_scan_at.isoformat() == last['timestamp']
+    assert rollup.total_enrolled == 3
+
+def test_concurrent_first_scans_of_the_day(app, monkeypatch, client, headers, children):
+    # لا يوجد ملخص لليوم بعد، وكل الطلبات تنشئه أو تحدثه في نفس اللحظة
+    qr_codes = [child.qr_code for child in children]
+    hold_writes_until_all_read(monkeypatch, len(qr_codes))
+
+    assert concurrent_scans(app, headers['staff'], qr_codes) == [200] * len(qr_codes)
+
+    stats = today_stats(client, headers)
+    assert (stats['present'], stats['total_children']) == (3, 3)
+
+def test_weekly_granularity_groups_days(client, headers, children):
+    scan(client, headers['staff'], children[0].qr_code)
+
+    response = client.get('/api/attendance/stats?days=14&granularity=week', headers=headers['admin'])
+
+    periods = response.get_json()['period_stats']
+    assert sum(period['days'] for period in periods) == 14
+    assert sum(period['present_days'] for period in periods) == 1
+
+def test_stats_require_admin(client, headers):
+    assert client.get('/api/attendance/stats', headers=headers['staff']).status_code == 403
@@ -0,0 +1,88 @@
+import pytest
+from src.models.user import db, User, Child, DailyUpdate
+
+def add_update(child, staff, note, activity_type=None):
+    update = DailyUpdate(child_id=child.id, staff_id=staff.id, note=note, activity_type=activity_type)
+    db.session.add(update)
+    db.session.commit()
+    return update
+
+def search(client, headers, q, **params):
+    response = client.get('/api/search', headers=headers, query_string={'q': q, **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+def result_ids(body):
+    return [result['id'] for result in body['results']]
+
+@pytest.mark.parametrize('q', ['الحديقة', 'حديقه', 'الحَدِيقَةِ', 'بالحديقة', 'حدي'])
+def test_spelling_variants_match_the_same_note(client, users, headers, children, q):
+    update = add_update(children[0], users['staff'], 'لعب في الحديقة مع أصدقائه')
+
+    assert result_ids(search(client, headers['staff'], q)) == [update.id]
+
+def test_hamza_and_digits_are_normalized(client, users, headers, children):
+    update = add_update(children[0], users['staff'], 'إستمتع بالرسم ونام ٣ ساعات')
+
+    assert result_ids(search(client, headers['staff'], 'استمتع')) == [update.id]
+    assert result_ids(search(client, headers['staff'], '3 ساعات')) == [update.id]
+
+def test_edited_and_deleted_notes_are_reindexed(client, users, headers, children):
+    update = add_update(children[0], users['staff'], 'أكل الفطور')
+    update.note = 'شرب الحليب'
+    db.session.commit()
+
+    assert search(client, headers['staff'], 'فطور')['results'] == []
+    assert result_ids(search(client, headers['staff'], 'حليب')) == [update.id]
+
+    db.session.delete(update)
+    db.session.commit()
+    assert search(client, headers['staff'], 'حليب')['results'] == []
+
+def test_parents_only_find_their_children(client, users, headers, children):
+    other_parent = User(name='other', email='other@example.com', phone='0500000001', role='parent', password_hash='-')
+    db.session.add(other_parent)
+    db.session.flush()
+    other_child = Child(name='محمد سالم', parent_id=other_parent.id, is_approved=True)
+    db.session.add(other_child)
+    db.session.commit()
+    own = add_update(children[0], users['staff'], 'رسم شجرة')
+    add_update(other_child, users['staff'], 'رسم بيت')
+
+    assert result_ids(search(client, headers['parent'], 'رسم')) == [own.id]
+    assert result_ids(search(client, headers['parent'], 'محمد', type='children')) == [children[0].id]
+    assert len(search(client, headers['staff'], 'محمد', type='children')['results']) == 2
+
+def test_filters_and_pagination(client, users, headers, children):
+    ids = [add_update(children[0], users['staff'], f'لعب بالكرة {i}', 'play').id for i in range(3)]
+    add_update(children[1], users['staff'], 'لعب بالكرة', 'play')
+    add_update(children[0], users['staff'], 'لعب بالكرة', 'food')
+    params = {'child_id': children[0].id, 'activity_type': 'play', 'limit': 2}
+
+    first = search(client, headers['staff'], 'كره', **params)
+    second = search(client, headers['staff'], 'كره', cursor=first['next_cursor'], **params)
+
+    assert sorted(result_ids(first) + result_ids(second)) == ids
+    assert second['next_cursor'] is None
+    assert first['results'][0]['child'] == {'id': children[0].id, 'name': children[0].name}
+
+def test_children_search_ignores_diacritics_and_hamza(client, headers, children):
+    assert result_ids(search(client, headers['staff'], 'سَارَه', type='children')) == [children[1].id]
+    assert result_ids(search(client, headers['staff'], 'احمد', type='children')) == [children[1].id]
+
+@pytest.mark.parametrize('params', [{'q': ''}, {'q': 'ـــ'}, {'q': 'رسم', 'type': 'staff'},
+                                    {'q': 'رسم', 'cursor': 'nope'}, {'q': 'رسم', 'from': 'yesterday'}])
+def test_invalid_requests(client, headers, params):
+    assert client.get('/api/search', headers=headers['staff'], query_string=params).status_code == 400
+
+def test_rebuild_command_reindexes_rows_changed_outside_the_models(app, client, users, headers, children):
+    update = add_update(children[0], users['staff'], 'قرأ قصة')
+    # تعديل مباشر لا يمر بمستمعي النماذج
+    db.session.execute(DailyUpdate.__table__.update().where(DailyUpdate.id == update.id).values(note='غنى أنشودة'))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['search', 'rebuild'])
+
+    assert 'daily_updates_fts: indexed 1 rows' in result.output
+    assert result_ids(search(client, headers['staff'], 'انشوده')) == [update.id]
+    assert search(client, headers['staff'], 'قصة')['results'] == []
@@ -0,0 +1,36 @@
+from datetime import date
+from flask import jsonify
+import pytest
+from src.models.user import db, User, Child, DailyUpdate
+from src.utils.serialization import RowSerializer, json_response
+
+@pytest.mark.parametrize('model', [User, Child, DailyUpdate])
+def test_row_serializer_matches_to_dict(users, children, model):
+    if model is DailyUpdate:
+        db.session.add(DailyUpdate(child_id=children[0].id, staff_id=users['staff'].id, note='أكل جيداً'))
+    children[0].birthdate = date(2021, 3, 4)
+    db.session.commit()
+    serialize = RowSerializer(model.dict_columns())
+
+    for instance in model.query.all():
+        row = db.session.query(*model.dict_columns()).filter(model.id == instance.id).one()
+        assert serialize(row) == instance.to_dict()
+
+def test_json_response_matches_jsonify_bytes(app, users):
+    payload = {'user': users['parent'].to_dict(), 'note': 'نام جيداً', 'items': [1, None, True]}
+
+    with app.test_request_context():
+        assert json_response(payload).get_data() == jsonify(payload).get_data()
+
+def test_children_list_matches_to_dict(client, users, headers, children):
+    response = client.get('/api/children/all', headers=headers['admin'])
+
+    expected = [dict(child.to_dict(), parent=users['parent'].to_dict()) for child in children]
+    assert response.get_json()['children'] == expected
+
+def test_today_matches_to_dict(client, users, headers, children):
+    response = client.get('/api/attendance/today', headers=headers['staff'])
+
+    expected = [dict(child.to_dict(), parent=users['parent'].to_dict(),
+                     current_status='absent', last_action_time=None) for child in children]
+    assert response.get_json()['children'] == expected
@@ -0,0 +1,78 @@
+from flask import Flask
+from werkzeug.http import http_date
+import gzip
+import pytest
+from src.utils import static_assets
+from src.utils.static_assets import StaticManifest
+
+SCRIPT = b'console.log("bright kids");\n' * 100
+
+@pytest.fixture
+def static_client(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'index-4f3a9c2b.js').write_bytes(SCRIPT)
+    (tmp_path / 'index.html').write_bytes(b'<html></html>')
+    manifest = StaticManifest(str(tmp_path)).build()
+
+    app = Flask(__name__)
+
+    @app.route('/<path:path>')
+    def serve(path):
+        return manifest.respond(manifest.get(path))
+
+    return app.test_client()
+
+def test_asset_is_served_with_validators(static_client):
+    response = static_client.get('/assets/index-4f3a9c2b.js')
+
+    assert response.status_code == 200
+    assert response.data == SCRIPT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Last-Modified']
+    assert response.headers['Cache-Control'] == static_assets.IMMUTABLE_CACHE_CONTROL
+
+def test_gzip_is_chosen_from_accept_encoding(static_client):
+    response = static_client.get('/assets/index-4f3a9c2b.js', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == SCRIPT
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_if_none_match(static_client):
+    etag = static_client.get('/index.html').headers['ETag']
+
+    response = static_client.get('/index.html', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_if_modified_since(static_client):
+    last_modified = static_client.get('/index.html').headers['Last-Modified']
+
+    assert static_client.get('/index.html', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert static_client.get('/index.html', headers={'If-Modified-Since': http_date(0)}).status_code == 200
+
+def test_range_request(static_client):
+    response = static_client.get('/assets/index-4f3a9c2b.js', headers={'Range': 'bytes=0-10'})
+
+    assert response.status_code == 206
+    assert response.data == SCRIPT[:11]
+    assert response.headers['Content-Range'] == f'bytes 0-10/{len(SCRIPT)}'
+
+def test_if_range_with_a_stale_etag_returns_the_whole_file(static_client):
+    response = static_client.get('/assets/index-4f3a9c2b.js', headers={'Range': 'bytes=0-10', 'If-Range': '"old"'})
+
+    assert response.status_code == 200
+    assert response.data == SCRIPT
+
+def test_large_files_are_served_from_disk(monkeypatch, tmp_path):
+    (tmp_path / 'video.mp4').write_bytes(b'0123456789' * 20)
+    monkeypatch.setattr(static_assets, 'MAX_INLINE_SIZE', 100)
+    manifest = StaticManifest(str(tmp_path)).build()
+    asset = manifest.get('video.mp4')
+
+    assert asset.bodies == {}
+    with Flask(__name__).test_request_context(headers={'Range': 'bytes=10-19'}):
+        response = manifest.respond(asset)
+        response.direct_passthrough = False
+        assert (response.status_code, response.get_data()) == (206, b'0123456789')
@@ -0,0 +1,53 @@
+import hashlib
+import io
+import os
+from werkzeug.exceptions import RequestEntityTooLarge
+import pytest
+from src.models.user import RegistrationFile
+from src.routes.registration import MAX_FILE_SIZE
+from src.utils.storage import BlobStore
+
+BASE = '/api/registration/api/registration'
+
+def stored_files(root):
+    return [name for _, _, names in os.walk(root) for name in names]
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+
+    first = store.save_stream(io.BytesIO(b'birth certificate'))
+    second = store.save_stream(io.BytesIO(b'birth certificate'))
+
+    assert first == second
+    assert first[0] == hashlib.sha256(b'birth certificate').hexdigest()
+    assert stored_files(tmp_path / 'blobs') == [first[0]]
+
+def test_oversized_stream_leaves_no_temporary_file(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+
+    with pytest.raises(RequestEntityTooLarge):
+        store.save_stream(io.BytesIO(b'x' * 100), max_size=10)
+
+    assert stored_files(tmp_path / 'blobs') == []
+
+def submit_with_file(client, content, filename='id.pdf'):
+    return client.post(f'{BASE}/submit', data={
+        'childName': 'محمد', 'idDocument': (io.BytesIO(content), filename)
+    }, content_type='multipart/form-data')
+
+def test_uploaded_files_are_content_addressed(client):
+    for _ in range(2):
+        assert submit_with_file(client, b'%PDF same document').status_code == 200
+
+    files = RegistrationFile.query.all()
+    assert len(files) == 2
+    assert files[0].storage_path == files[1].storage_path
+    assert files[0].sha256 == hashlib.sha256(b'%PDF same document').hexdigest()
+    assert len(stored_files('uploads/blobs')) == 1
+
+def test_file_over_the_limit_is_rejected(client):
+    response = submit_with_file(client, b'x' * (MAX_FILE_SIZE + 1))
+
+    assert response.status_code == 413
+    assert RegistrationFile.query.count() == 0
+    assert stored_files('uploads/blobs') == []
@@ -0,0 +1,23 @@
+import pytest
+from src.utils.text import normalize_arabic, search_terms, search_document
+
+@pytest.mark.parametrize('text, expected', [
+    ('أحمد', 'احمد'),
+    ('إسراء', 'اسراء'),
+    ('آمنة', 'امنه'),
+    ('مُحَمَّد', 'محمد'),
+    ('مـــريم', 'مريم'),
+    ('مصطفى', 'مصطفي'),
+    ('لؤلؤة', 'لولوه'),
+    ('نام ٣ ساعات', 'نام 3 ساعات'),
+    ('  Ali\t\nأحمد ', 'ali احمد'),
+    (None, ''),
+])
+def test_normalize_arabic(text, expected):
+    assert normalize_arabic(text) == expected
+
+def test_search_terms_drop_the_article_but_keep_short_words():
+    assert search_terms('الحديقة بالرسم والماء لله ال') == ['حديقه', 'رسم', 'ماء', 'لله', 'ال']
+
+def test_document_has_both_forms_of_words_with_an_article():
+    assert search_document('لعب في الحديقة') == 'لعب في الحديقه حديقه'
@@ -0,0 +1,77 @@
+import hashlib
+from src.models.user import Registration
+from src.utils.storage import chunk_lock, partial_path
+
+BASE = '/api/registration/api/registration'
+CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+def start(client, size=len(CONTENT)):
+    response = client.post(f'{BASE}/uploads', json={'filename': 'passport.pdf', 'size': size, 'file_type': 'passport'})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+def put(client, upload_id, start, stop, total=len(CONTENT)):
+    return client.put(f'{BASE}/uploads/{upload_id}', data=CONTENT[start:stop],
+                      headers={'Content-Range': f'bytes {start}-{stop - 1}/{total}'})
+
+def complete(client, upload_id, sha256=None):
+    return client.post(f'{BASE}/uploads/{upload_id}/complete', json={'sha256': sha256} if sha256 else {})
+
+def test_upload_resumes_from_the_reported_offset(client):
+    upload_id = start(client)
+    assert put(client, upload_id, 0, 500).headers['Upload-Offset'] == '500'
+
+    # بعد انقطاع الاتصال يسأل العميل عن الموضع ويكمل منه
+    offset = int(client.get(f'{BASE}/uploads/{upload_id}').headers['Upload-Offset'])
+    assert put(client, upload_id, offset, len(CONTENT)).status_code == 200
+
+    response = complete(client, upload_id, hashlib.sha256(CONTENT).hexdigest())
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'complete'
+
+def test_chunk_must_start_at_the_received_offset(client):
+    upload_id = start(client)
+    put(client, upload_id, 0, 500)
+
+    response = put(client, upload_id, 200, 700)
+
+    assert response.status_code == 409
+    assert response.headers['Upload-Offset'] == '500'
+
+def test_hash_mismatch_restarts_the_upload(client):
+    upload_id = start(client)
+    put(client, upload_id, 0, len(CONTENT))
+
+    response = complete(client, upload_id, hashlib.sha256(b'other').hexdigest())
+
+    assert response.status_code == 422
+    assert response.headers['Upload-Offset'] == '0'
+    assert put(client, upload_id, 0, len(CONTENT)).status_code == 200
+    assert complete(client, upload_id).status_code == 200
+
+def test_incomplete_upload_cannot_be_completed(client):
+    upload_id = start(client)
+    put(client, upload_id, 0, 100)
+
+    assert complete(client, upload_id).status_code == 409
+
+def test_complete_waits_for_a_chunk_in_progress(client):
+    upload_id = start(client)
+    put(client, upload_id, 0, len(CONTENT))
+
+    with chunk_lock(partial_path(upload_id)):
+        assert complete(client, upload_id).status_code == 409
+
+    assert complete(client, upload_id).status_code == 200
+    assert complete(client, upload_id).get_json()['status'] == 'complete'
+
+def test_completed_upload_is_attached_to_a_registration(client):
+    upload_id = start(client)
+    put(client, upload_id, 0, len(CONTENT))
+    complete(client, upload_id)
+
+    response = client.post(f'{BASE}/submit', data={'childName': 'سارة', 'upload_ids': upload_id})
+
+    assert response.status_code == 200
+    files = Registration.query.one().files
+    assert [(file.file_type, file.sha256) for file in files] == [('passport', hashlib.sha256(CONTENT).hexdigest())]
@@ -0,0 +1,58 @@
+import re
+import unicodedata
+
+# التشكيل وعلامات القرآن والتطويل
+ARABIC_DIACRITICS = re.compile('[ؐ-ًؚ-ٰٟۖ-ۭـ]')
+ARABIC_LETTER_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+# الأرقام العربية الهندية والفارسية إلى أرقام لاتينية
+DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_arabic(text):
+    """توحيد النص للبحث والمقارنة: إزالة التشكيل وتوحيد أشكال الألف والياء والتاء المربوطة"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = ARABIC_DIACRITICS.sub('', text)
+    text = text.translate(ARABIC_LETTER_VARIANTS).translate(DIGITS)
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+# أداة التعريف وما يسبقها من حروف العطف والجر (بعد التوحيد)
+ARABIC_ARTICLES = ('وال', 'بال', 'فال', 'كال', 'لل', 'ال')
+
+def strip_arabic_article(word):
+    """إزالة "ال" وما يسبقها من بداية الكلمة إذا بقي بعدها جذر معقول"""
+    for article in ARABIC_ARTICLES:
+        if word.startswith(article) and len(word) - len(article) >= 2:
+            return word[len(article):]
+    return word
+
+def search_terms(text):
+    """كلمات البحث بعد التوحيد وإزالة أداة التعريف"""
+    return [strip_arabic_article(word) for word in normalize_arabic(text).split()]
+
+def search_document(text):
+    """النص المفهرس: النص الموحد مع الكلمات بدون أداة التعريف ليطابقها البحث بالحالتين"""
+    words = normalize_arabic(text).split()
+    stripped = [strip_arabic_article(word) for word in words]
+    return ' '.join(words + [word for word, original in zip(stripped, words) if word != original])
+
+def normalize_phone(phone):
+    """توحيد رقم الجوال إلى الرقم الوطني بدون مفتاح الدولة أو الصفر البادئ"""
+    if not phone:
+        return ''
+    digits = re.sub(r'\D', '', phone.translate(DIGITS))
+    for prefix in ('00966', '966', '0'):
+        if digits.startswith(prefix) and len(digits) > len(prefix) + 6:
+            digits = digits[len(prefix):]
+            break
+    return digits
+
+def normalize_email(email):
+    """توحيد البريد الإلكتروني للمقارنة"""
+    return (email or '').strip().lower()
@@ -1,10 +1,107 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
+import threading
 import uuid
+import os
+from src.utils.text import normalize_arabic, normalize_phone, normalize_email, search_document
+from src.utils.database import upsert
 
 db = SQLAlchemy()
 
+# فرق توقيت الحضانة عن UTC بالدقائق: الأوقات تحفظ بتوقيت UTC، والأيام (عمود day) بالتوقيت المحلي
+# تغييره لا يعدل السجلات القائمة، أعد حسابها بـ: flask attendance rebuild-days
+UTC_OFFSET_MINUTES = int(os.environ.get('NURSERY_UTC_OFFSET_MINUTES', 0))
+
+def local_day(timestamp):
+    """اليوم المحلي لوقت مخزن بتوقيت UTC"""
+    return (timestamp + timedelta(minutes=UTC_OFFSET_MINUTES)).date()
+
+def local_today():
+    """اليوم الحالي بالتوقيت المحلي للحضانة"""
+    return local_day(datetime.utcnow())
+
+class PasswordHashingBusy(Exception):
+    """طابور تشفير كلمات المرور ممتلئ"""
+
+class PasswordHasher:
+    """تشفير كلمات المرور والتحقق منها في مجموعة عمليات محدودة خارج خيوط الطلبات"""
+    
+    def __init__(self, method, workers, max_pending, timeout):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._target = None
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+    
+    def _run(self, fn, *args):
+        # رفض فوري بدلاً من الانتظار عند امتلاء الطابور
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy('Password hashing queue is full')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHashingBusy('Password hashing timed out')
+    
+    def hash(self, password):
+        if self.method is None:
+            return self._run(generate_password_hash, password)
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+    
+    def target_parameters(self):
+        """معاملات الإعدادات الحالية بعد توسيع الاختصارات (scrypt و pbkdf2) كما يخزنها werkzeug"""
+        if self._target is None:
+            # werkzeug هو من يوسع الاختصار، فنأخذ البادئة من تشفير فعلي مرة واحدة
+            sample = generate_password_hash('') if self.method is None else generate_password_hash('', self.method)
+            self._target = hash_parameters(sample)
+        return self._target
+    
+    def needs_rehash(self, password_hash):
+        """هل تم التشفير بخوارزمية مختلفة أو بتكلفة أضعف من الإعدادات الحالية؟ (التكلفة الأعلى لا تخفض)"""
+        algorithm, cost = hash_parameters(password_hash)
+        target_algorithm, target_cost = self.target_parameters()
+        if algorithm != target_algorithm or len(cost) != len(target_cost):
+            return True
+        return any(value < target for value, target in zip(cost, target_cost))
+
+def hash_parameters(password_hash):
+    """(الخوارزمية، معاملات التكلفة) من بادئة التشفير، مثل scrypt:32768:8:1 أو pbkdf2:sha256:1000000"""
+    algorithm, *args = password_hash.split('$', 1)[0].split(':')
+    if algorithm == 'pbkdf2' and args:
+        # دالة التجزئة جزء من الخوارزمية، والتكلفة عدد التكرارات
+        algorithm, args = f'pbkdf2:{args[0]}', args[1:]
+    try:
+        return algorithm, tuple(int(arg) for arg in args)
+    except ValueError:
+        return algorithm, ()
+
+password_hasher = PasswordHasher(
+    # بدون قيمة تستخدم الطريقة الافتراضية في werkzeug
+    method=os.environ.get('PASSWORD_HASH_METHOD') or None,
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16)),
+    timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -29,11 +126,15 @@ class User(db.Model):
     
     def set_password(self, password):
         """تشفير كلمة المرور"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """التحقق من كلمة المرور"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """هل تحتاج كلمة المرور المخزنة إلى إعادة تشفير بالإعدادات الحالية؟"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def generate_verification_token(self):
         """توليد رمز التحقق"""
@@ -46,6 +147,12 @@ class User(db.Model):
         self.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
         return self.reset_token
     
+    @classmethod
+    def dict_columns(cls):
+        """أعمدة to_dict بنفس الترتيب (لمسار القراءة المسقط)"""
+        return [cls.id, cls.name, cls.email, cls.phone, cls.role, cls.is_active,
+                cls.is_verified, cls.created_at, cls.updated_at]
+    
     def to_dict(self):
         """تحويل البيانات إلى قاموس"""
         return {
@@ -78,6 +185,22 @@ class Child(db.Model):
     attendance_records = db.relationship('Attendance', backref='child', lazy=True)
     daily_updates = db.relationship('DailyUpdate', backref='child', lazy=True)
     
+    @classmethod
+    def roster_filter(cls):
+        """شرط الأطفال المعتمدين والنشطين (مطابق لشرط الفهرس الجزئي)"""
+        return db.and_(cls.is_approved.is_(True), cls.is_active.is_(True))
+    
+    @classmethod
+    def pending_filter(cls):
+        """شرط الأطفال المنتظرين الموافقة (مطابق لشرط الفهرس الجزئي)"""
+        return db.and_(cls.is_approved.is_(False), cls.is_active.is_(True))
+    
+    @classmethod
+    def dict_columns(cls):
+        """أعمدة to_dict بنفس الترتيب (لمسار القراءة المسقط)"""
+        return [cls.id, cls.name, cls.birthdate, cls.parent_id, cls.qr_code, cls.photo_url,
+                cls.is_approved, cls.is_active, cls.created_at, cls.updated_at]
+    
     def generate_qr_code(self):
         """توليد QR Code للطفل"""
         self.qr_code = f"CHILD_{self.id}_{str(uuid.uuid4())[:8]}"
@@ -106,7 +229,16 @@ class Attendance(db.Model):
     staff_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     status = db.Column(db.Enum('check_in', 'check_out', name='attendance_status'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    day = db.Column(db.Date, nullable=True)  # يوم السجل، يُحسب من timestamp
     notes = db.Column(db.Text, nullable=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # مفتاح من جهاز المسح لتجاهل الإرسال المكرر
+    
+    __table_args__ = (
+        db.Index('ix_attendance_child_day_ts', 'child_id', 'day', 'timestamp'),
+        # يغطي قراءة التحليلات (day, status, child_id, timestamp) دون الرجوع إلى الجدول
+        db.Index('ix_attendance_day_status_child_ts', 'day', 'status', 'child_id', 'timestamp'),
+        db.Index('ux_attendance_idempotency_key', 'idempotency_key', unique=True),
+    )
     
     def to_dict(self):
         """تحويل البيانات إلى قاموس"""
@@ -119,6 +251,105 @@ class Attendance(db.Model):
             'notes': self.notes
         }
 
+class ChildPresence(db.Model):
+    """الحالة الحالية لكل طفل (آخر عملية دخول/خروج) يتم تحديثها مع كل مسح"""
+    __tablename__ = 'child_presence'
+    
+    child_id = db.Column(db.Integer, db.ForeignKey('children.id'), primary_key=True)
+    status = db.Column(db.Enum('check_in', 'check_out', name='presence_status'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    last_action_time = db.Column(db.DateTime, nullable=False)
+    last_staff_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    last_attendance_id = db.Column(db.Integer, db.ForeignKey('attendance.id'), nullable=True)
+    
+    child = db.relationship('Child', backref=db.backref('presence', uselist=False, lazy=True))
+    
+    @staticmethod
+    def state_from(attendance):
+        """قيم الحالة المأخوذة من سجل حضور"""
+        return {
+            'status': attendance.status,
+            'day': attendance.day or local_day(attendance.timestamp),
+            'last_action_time': attendance.timestamp,
+            'last_staff_id': attendance.staff_id,
+            'last_attendance_id': attendance.id
+        }
+    
+    def apply(self, attendance):
+        """تحديث الحالة من سجل حضور جديد"""
+        for key, value in self.state_from(attendance).items():
+            setattr(self, key, value)
+    
+    @classmethod
+    def record(cls, attendance, only_if_newer=False):
+        """تحديث حالة الطفل أو إنشاؤها بأمر upsert واحد (أول مسحين متزامنين لا يتعارضان على المفتاح)
+        
+        only_if_newer للمسح المتأخر (من جهاز غير متصل): لا يغير الحالة إن كانت آخر عملية معروفة أحدث منه
+        """
+        table = cls.__table__
+        state = cls.state_from(attendance)
+        where = table.c.last_action_time <= attendance.timestamp if only_if_newer else None
+        upsert(db.session, table, dict(state, child_id=attendance.child_id), ['child_id'], state, where=where)
+    
+    def current_status(self, today):
+        """حالة الطفل في اليوم المحدد (present أو absent)"""
+        return 'present' if self.day == today and self.status == 'check_in' else 'absent'
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'child_id': self.child_id,
+            'status': self.status,
+            'day': self.day.isoformat() if self.day else None,
+            'last_action_time': self.last_action_time.isoformat() if self.last_action_time else None,
+            'last_staff_id': self.last_staff_id,
+            'last_attendance_id': self.last_attendance_id
+        }
+
+class AttendanceDailyRollup(db.Model):
+    """ملخص الحضور اليومي، يتم تحديثه تدريجياً مع كل مسح"""
+    __tablename__ = 'attendance_daily_rollup'
+    
+    day = db.Column(db.Date, primary_key=True)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    total_enrolled = db.Column(db.Integer, nullable=False, default=0)
+    first_scan_at = db.Column(db.DateTime, nullable=True)
+    last_scan_at = db.Column(db.DateTime, nullable=True)
+    
+    @classmethod
+    def record(cls, attendance, first_check_in, total_enrolled):
+        """تحديث ملخص اليوم أو إنشاؤه بأمر upsert واحد (أول مسحين متزامنين في اليوم لا يتعارضان)"""
+        table = cls.__table__
+        timestamp = attendance.timestamp
+        increment = 1 if first_check_in else 0
+        upsert(db.session, table, {
+            'day': attendance.day,
+            'present_count': increment,
+            'total_enrolled': total_enrolled,
+            'first_scan_at': timestamp,
+            'last_scan_at': timestamp
+        }, ['day'], {
+            'present_count': table.c.present_count + increment,
+            'first_scan_at': db.case(
+                (db.or_(table.c.first_scan_at.is_(None), table.c.first_scan_at > timestamp), timestamp),
+                else_=table.c.first_scan_at
+            ),
+            'last_scan_at': db.case(
+                (db.or_(table.c.last_scan_at.is_(None), table.c.last_scan_at < timestamp), timestamp),
+                else_=table.c.last_scan_at
+            )
+        })
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'day': self.day.isoformat(),
+            'present_count': self.present_count,
+            'total_enrolled': self.total_enrolled,
+            'first_scan_at': self.first_scan_at.isoformat() if self.first_scan_at else None,
+            'last_scan_at': self.last_scan_at.isoformat() if self.last_scan_at else None
+        }
+
 class DailyUpdate(db.Model):
     __tablename__ = 'daily_updates'
     
@@ -130,6 +361,18 @@ class DailyUpdate(db.Model):
     video_url = db.Column(db.String(255), nullable=True)
     activity_type = db.Column(db.String(50), nullable=True)  # أكل، نوم، لعب، تعلم
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    day = db.Column(db.Date, nullable=True)  # يوم التحديث، يُحسب من created_at
+    
+    __table_args__ = (
+        db.Index('ix_daily_updates_child_day_created', 'child_id', 'day', 'created_at'),
+        db.Index('ix_daily_updates_day_created', 'day', 'created_at'),
+    )
+    
+    @classmethod
+    def dict_columns(cls):
+        """أعمدة to_dict بنفس الترتيب (لمسار القراءة المسقط)"""
+        return [cls.id, cls.child_id, cls.staff_id, cls.note, cls.photo_url,
+                cls.video_url, cls.activity_type, cls.created_at]
     
     def to_dict(self):
         """تحويل البيانات إلى قاموس"""
@@ -144,3 +387,399 @@ class DailyUpdate(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class NotificationOutbox(db.Model):
+    """إشعار لولي الأمر يكتب في نفس معاملة الحدث ويرسله عامل منفصل"""
+    __tablename__ = 'notification_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    child_id = db.Column(db.Integer, db.ForeignKey('children.id'), nullable=True)
+    event_type = db.Column(db.String(50), nullable=False)  # attendance, daily_update
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # sending: حجزه عامل حتى available_at، وبعدها يعاد حجزه إن توقف العامل قبل الإرسال
+    status = db.Column(db.Enum('pending', 'sending', 'sent', 'dead', name='outbox_status'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # لا يرسل قبل هذا الوقت
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_available', 'status', 'available_at'),
+        db.Index('ix_notification_outbox_parent_status', 'parent_id', 'status'),
+    )
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'child_id': self.child_id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class LiveEvent(db.Model):
+    """حدث مباشر للوحات المتابعة، المعرف التسلسلي هو مؤشر الاستئناف"""
+    __tablename__ = 'live_events'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(50), nullable=False)  # check_in, check_out, daily_update(_edited/_deleted), child_approved
+    child_id = db.Column(db.Integer, db.ForeignKey('children.id'), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_live_events_parent_id', 'parent_id', 'id'),
+        {'sqlite_autoincrement': True},  # لا يعاد استخدام المعرفات بعد الحذف
+    )
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'id': self.id,
+            'type': self.event_type,
+            'child_id': self.child_id,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class MediaAsset(db.Model):
+    """صورة أو فيديو مرفوع للتحديثات اليومية مع نسخه المصغرة"""
+    __tablename__ = 'media_assets'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.Enum('image', 'video', name='media_kind'), nullable=False)
+    original_name = db.Column(db.String(255), nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    storage_path = db.Column(db.String(255), nullable=False)
+    variants = db.Column(db.JSON, nullable=False, default=dict)  # {اسم النسخة: {path, sha256, size, content_type}}
+    status = db.Column(db.Enum('processing', 'ready', 'failed', name='media_status'), nullable=False, default='processing')
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def variant(self, name):
+        """بيانات ملف نسخة معينة، أو None إن لم تنشأ بعد"""
+        if name == 'original':
+            return {
+                'path': self.storage_path,
+                'sha256': self.sha256,
+                'size': self.size,
+                'content_type': self.content_type
+            }
+        return (self.variants or {}).get(name)
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'original_name': self.original_name,
+            'content_type': self.content_type,
+            'size': self.size,
+            'status': self.status,
+            'variants': sorted(self.variants or {}),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Registration(db.Model):
+    """طلب تسجيل طفل جديد من استمارة التسجيل العامة"""
+    __tablename__ = 'registrations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    registration_number = db.Column(db.String(20), unique=True, nullable=False)
+    status = db.Column(db.String(30), nullable=False, default='pending_review')
+    submission_date = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    child_data = db.Column(db.JSON, nullable=False)
+    parent_data = db.Column(db.JSON, nullable=False)
+    uploaded_files = db.Column(db.JSON, nullable=False, default=list)  # الطلبات المستوردة فقط، الجديدة في registration_files
+    notes = db.Column(db.JSON, nullable=True)
+    # مفاتيح موحدة للتصفية واكتشاف الطلبات المكررة
+    child_name_normalized = db.Column(db.String(100), nullable=True)
+    phone_normalized = db.Column(db.String(20), nullable=True)
+    email_normalized = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_registrations_submission', 'submission_date', 'id'),
+        db.Index('ix_registrations_status_submission', 'status', 'submission_date', 'id'),
+        db.Index('ix_registrations_phone', 'phone_normalized', 'submission_date'),
+        db.Index('ix_registrations_email', 'email_normalized', 'submission_date'),
+        db.Index('ix_registrations_child_phone', 'child_name_normalized', 'phone_normalized'),
+        db.Index('ix_registrations_child_email', 'child_name_normalized', 'email_normalized'),
+    )
+    
+    def refresh_search_keys(self):
+        """تحديث المفاتيح الموحدة من بيانات الطفل وولي الأمر"""
+        child_data = self.child_data or {}
+        parent_data = self.parent_data or {}
+        self.child_name_normalized = normalize_arabic(child_data.get('name')) or None
+        self.phone_normalized = normalize_phone(parent_data.get('phone')) or None
+        self.email_normalized = normalize_email(parent_data.get('email')) or None
+    
+    def add_note(self, note):
+        """إضافة ملاحظة (يعاد إسناد القائمة لأن أعمدة JSON لا تتتبع التعديل الداخلي)"""
+        self.notes = (self.notes or []) + [{
+            'note': note,
+            'timestamp': datetime.now().isoformat()
+        }]
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس بنفس شكل السجلات السابقة في registrations.json"""
+        data = {
+            'registration_number': self.registration_number,
+            'submission_date': self.submission_date.isoformat() if self.submission_date else None,
+            'status': self.status,
+            'child_data': self.child_data,
+            'parent_data': self.parent_data,
+            'uploaded_files': (self.uploaded_files or []) + [f.to_dict() for f in self.files],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if self.notes:
+            data['notes'] = self.notes
+        return data
+
+class RegistrationFile(db.Model):
+    """ملف مرفق بطلب تسجيل، محتواه مخزن حسب بصمة SHA-256"""
+    __tablename__ = 'registration_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    registration_id = db.Column(db.Integer, db.ForeignKey('registrations.id'), nullable=False, index=True)
+    file_type = db.Column(db.String(50), nullable=True)  # اسم الحقل في النموذج
+    original_name = db.Column(db.String(255), nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    storage_path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    registration = db.relationship('Registration', backref=db.backref(
+        'files', lazy='selectin', order_by='RegistrationFile.id'
+    ))
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس (بنفس مفاتيح uploaded_files السابقة)"""
+        return {
+            'original_name': self.original_name,
+            'saved_name': self.sha256,
+            'file_path': self.storage_path,
+            'file_type': self.file_type,
+            'content_type': self.content_type,
+            'size': self.size,
+            'sha256': self.sha256
+        }
+
+class UploadSession(db.Model):
+    """جلسة رفع ملف على دفعات يمكن استئنافها بعد انقطاع الاتصال"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    file_type = db.Column(db.String(50), nullable=True)  # اسم الحقل في النموذج
+    original_name = db.Column(db.String(255), nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    total_size = db.Column(db.Integer, nullable=False)
+    received_size = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.Enum('uploading', 'complete', 'attached', name='upload_status'), nullable=False, default='uploading')
+    sha256 = db.Column(db.String(64), nullable=True)
+    storage_path = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+    
+    def to_dict(self):
+        """تحويل البيانات إلى قاموس"""
+        return {
+            'upload_id': self.id,
+            'file_type': self.file_type,
+            'original_name': self.original_name,
+            'total_size': self.total_size,
+            'offset': self.received_size,
+            'status': self.status,
+            'sha256': self.sha256,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class RegistrationDailyCount(db.Model):
+    """عدد طلبات التسجيل المقدمة في كل يوم"""
+    __tablename__ = 'registration_daily_counts'
+    
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class RegistrationStatusCount(db.Model):
+    """عدد طلبات التسجيل في كل حالة"""
+    __tablename__ = 'registration_status_counts'
+    
+    status = db.Column(db.String(30), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# فهارس جزئية لأن أغلب الاستعلامات تصفي على حالة الموافقة والتفعيل
+db.Index('ix_children_roster', Child.id,
+         sqlite_where=Child.roster_filter(), postgresql_where=Child.roster_filter())
+db.Index('ix_children_pending', Child.id,
+         sqlite_where=Child.pending_filter(), postgresql_where=Child.pending_filter())
+db.Index('ix_children_parent_active', Child.parent_id, Child.is_active)
+
+@event.listens_for(Attendance, 'before_insert')
+@event.listens_for(Attendance, 'before_update')
+def _set_attendance_day(mapper, connection, target):
+    """تخزين يوم السجل المحلي ليمكن استخدام الفهرس بدلاً من func.date()"""
+    if target.timestamp is None:
+        target.timestamp = datetime.utcnow()
+    target.day = local_day(target.timestamp)
+
+@event.listens_for(Registration, 'before_insert')
+@event.listens_for(Registration, 'before_update')
+def _set_registration_search_keys(mapper, connection, target):
+    """إبقاء المفاتيح الموحدة متوافقة مع بيانات الطلب"""
+    target.refresh_search_keys()
+
+@event.listens_for(DailyUpdate, 'before_insert')
+@event.listens_for(DailyUpdate, 'before_update')
+def _set_daily_update_day(mapper, connection, target):
+    """تخزين يوم التحديث المحلي ليمكن استخدام الفهرس بدلاً من func.date()"""
+    if target.created_at is None:
+        target.created_at = datetime.utcnow()
+    target.day = local_day(target.created_at)
+
+# فهارس البحث النصي (SQLite FTS5): rowid هو معرف الصف الأصلي والنص محفوظ بعد التوحيد (search_document)
+SEARCH_INDEXES = {
+    'daily_updates_fts': ('daily_updates', 'note'),
+    'children_fts': ('children', 'name'),
+}
+SEARCH_REBUILD_BATCH = 1000
+
+def search_supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+def _index_text(connection, fts_table, row_id, value):
+    if not search_supported(connection):
+        return
+    connection.execute(text(f'DELETE FROM {fts_table} WHERE rowid = :id'), {'id': row_id})
+    value = search_document(value)
+    if value:
+        connection.execute(
+            text(f'INSERT INTO {fts_table} (rowid, body) VALUES (:id, :body)'),
+            {'id': row_id, 'body': value}
+        )
+
+def _unindex(connection, fts_table, row_id):
+    if search_supported(connection):
+        connection.execute(text(f'DELETE FROM {fts_table} WHERE rowid = :id'), {'id': row_id})
+
+@event.listens_for(DailyUpdate, 'after_insert')
+@event.listens_for(DailyUpdate, 'after_update')
+def _index_daily_update(mapper, connection, target):
+    """مزامنة فهرس البحث مع الملاحظة"""
+    if inspect(target).attrs.note.history.has_changes():
+        _index_text(connection, 'daily_updates_fts', target.id, target.note)
+
+@event.listens_for(Child, 'after_insert')
+@event.listens_for(Child, 'after_update')
+def _index_child(mapper, connection, target):
+    """مزامنة فهرس البحث مع اسم الطفل"""
+    if inspect(target).attrs.name.history.has_changes():
+        _index_text(connection, 'children_fts', target.id, target.name)
+
+@event.listens_for(DailyUpdate, 'after_delete')
+def _unindex_daily_update(mapper, connection, target):
+    _unindex(connection, 'daily_updates_fts', target.id)
+
+@event.listens_for(Child, 'after_delete')
+def _unindex_child(mapper, connection, target):
+    _unindex(connection, 'children_fts', target.id)
+
+def rebuild_search_index(connection):
+    """إعادة بناء فهارس البحث من الجداول (التوحيد يتم في Python فلا يمكن تعبئتها بـ SQL فقط)"""
+    counts = {}
+    for fts_table, (table, column) in SEARCH_INDEXES.items():
+        connection.execute(text(f'DELETE FROM {fts_table}'))
+        counts[fts_table] = 0
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                text(f'SELECT id, {column} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit'),
+                {'last_id': last_id, 'limit': SEARCH_REBUILD_BATCH}
+            ).fetchall()
+            if not rows:
+                break
+            values = [{'id': row_id, 'body': search_document(value)} for row_id, value in rows]
+            values = [value for value in values if value['body']]
+            if values:
+                connection.execute(text(f'INSERT INTO {fts_table} (rowid, body) VALUES (:id, :body)'), values)
+            counts[fts_table] += len(values)
+            last_id = rows[-1][0]
+    return counts
+
+def create_search_indexes(connection):
+    """إنشاء جداول FTS5 عند غيابها وتعبئتها من البيانات الحالية"""
+    if not search_supported(connection):
+        return False
+    existing = {row[0] for row in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    missing = [fts_table for fts_table in SEARCH_INDEXES if fts_table not in existing]
+    for fts_table in missing:
+        # remove_diacritics للأحرف اللاتينية، والتشكيل العربي يزال مسبقاً بـ normalize_arabic
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    if missing:
+        rebuild_search_index(connection)
+    return True
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_indexes(target, connection, **kw):
+    """إنشاء جداول البحث مع create_all، فمزامنة الفهرس تكتب فيها مع أول إدراج"""
+    create_search_indexes(connection)
+
+# أعمدة أضيفت بعد إنشاء الجداول: (الجدول، العمود، نوع SQL، تعبير التعبئة)
+ADDED_COLUMNS = [
+    # التعبئة بيوم UTC، ومع فرق توقيت غير صفري: flask attendance rebuild-days
+    ('attendance', 'day', 'DATE', 'DATE(timestamp)'),
+    ('daily_updates', 'day', 'DATE', 'DATE(created_at)'),
+    # تعبأ عبر: flask registration reindex
+    ('registrations', 'child_name_normalized', 'VARCHAR(100)', None),
+    ('registrations', 'phone_normalized', 'VARCHAR(20)', None),
+    ('registrations', 'email_normalized', 'VARCHAR(120)', None),
+    ('attendance', 'idempotency_key', 'VARCHAR(64)', None),
+]
+
+# قيم أضيفت إلى أنواع Enum في PostgreSQL (SQLite يخزنها نصاً دون قيد)
+ADDED_ENUM_VALUES = [
+    ('outbox_status', 'sending'),
+]
+
+# فهارس استبدلت بفهارس أشمل
+DROPPED_INDEXES = [
+    'ix_attendance_day_status_child',
+]
+
+def upgrade_schema():
+    """إضافة الأعمدة والفهارس الجديدة إلى قاعدة بيانات قائمة (create_all لا يعدل الجداول الموجودة)"""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table, column, column_type, backfill in ADDED_COLUMNS:
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            if column in existing:
+                continue
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+            if backfill:
+                connection.execute(text(f'UPDATE {table} SET {column} = {backfill}'))
+        
+        if connection.dialect.name == 'postgresql':
+            for enum_name, value in ADDED_ENUM_VALUES:
+                connection.execute(text(f"ALTER TYPE {enum_name} ADD VALUE IF NOT EXISTS '{value}'"))
+        
+        for index_name in DROPPED_INDEXES:
+            connection.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+        
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+        create_search_indexes(connection)